@@ -0,0 +1,536 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from eth_abi import decode_abi, encode_abi, encode_single
+from eth_account import Account as EthAccount
+from eth_account.internal.transactions import Transaction
+from eth_utils import (
+    encode_hex,
+    event_abi_to_log_topic,
+    function_abi_to_4byte_selector,
+    keccak,
+    to_checksum_address
+)
+from ocean_utils.ddo.ddo import DDO
+from ocean_utils.did import did_to_id_bytes
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+NET_VERSION = '1337'
+FAKE_AQUARIUS_URL = 'http://fake-aquarius/api/v1/aquarius/assets/ddo'
+CONDITION_UNFULFILLED = 1
+CONDITION_FULFILLED = 2
+
+
+def _to_int(value):
+    if isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+def _function_abi(contract, name):
+    return next(item for item in contract.contract.abi
+                if item.get('type') == 'function' and item['name'] == name)
+
+
+def _event_abi(contract, name):
+    return getattr(contract.events, name)._get_event_abi()
+
+
+class FakeKeeperNode:
+    """In-process stand-in for a keeper node producing agreements at a configurable rate.
+
+    Every block creates `agreements_per_block` `AgreementCreated` events for the provider,
+    and `consumer_delay` blocks later the consumer's `LockRewardCondition.Fulfilled` event.
+    Fulfill transactions sent by the provider are mined `mine_delay` blocks after they
+    were received and emit the `Fulfilled` event of their condition, so the real
+    monitor and handlers run the whole agreement flow. Only the JSON-RPC methods the
+    events handler uses are implemented, see `handle`.
+    """
+
+    def __init__(self, agreements_per_block=10, num_agreements=100, block_time=1.0,
+                 consumer_delay=1, mine_delay=1):
+        """
+
+        :param agreements_per_block: int AgreementCreated events per block
+        :param num_agreements: int total number of agreements to create
+        :param block_time: float seconds between blocks
+        :param consumer_delay: int blocks between AgreementCreated and the consumer's
+            lock reward
+        :param mine_delay: int blocks between receiving and mining a transaction
+        """
+        self.agreements_per_block = agreements_per_block
+        self.num_agreements = num_agreements
+        self.block_time = block_time
+        self.consumer_delay = consumer_delay
+        self.mine_delay = mine_delay
+
+        self._lock = threading.RLock()
+        self._blocks = []
+        self._logs = defaultdict(list)
+        self._condition_states = {}
+        self._agreements = {}
+        self._agreements_by_block = defaultdict(list)
+        self._pending_txs = []
+        self._transactions = {}
+        self._receipts = {}
+        self._nonces = Counter()
+        # transactions with a nonce gap wait here until the missing nonces arrive, like
+        # the queued part of a node's transaction pool
+        self._queued_txs = {}
+        self._filters = {}
+        self._filter_ids = itertools.count(1)
+        self._ddos = []
+        self._calls = {}
+        self._fulfill_functions = {}
+        self._eth_account = EthAccount()
+        self._consumer = to_checksum_address(keccak(b'benchmark-consumer')[:20])
+        self._keeper = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.num_events = 0
+        self._new_block()
+
+    def setup(self, keeper, ddos):
+        """Deploy the stand-in contracts of `keeper` and register the DIDs of `ddos`.
+
+        :param keeper: Keeper instance whose contract ABIs and addresses are used
+        :param ddos: list of DDO of the assets agreements are created for, the publisher
+            of an asset is the provider of its agreements
+        """
+        self._keeper = keeper
+        self._ddos = list(ddos)
+        for contract, name, handler in (
+                (keeper.condition_manager, 'getConditionState', self._get_condition_state),
+                (keeper.agreement_manager, 'getAgreementDIDOwner', self._get_did_owner),
+                (keeper.did_registry, 'getBlockNumberUpdated', self._get_block_number_updated)):
+            fn_abi = _function_abi(contract, name)
+            self._calls[(contract.address.lower(), function_abi_to_4byte_selector(fn_abi))] = (
+                fn_abi, handler)
+
+        for contract in (keeper.lock_reward_condition, keeper.access_secret_store_condition,
+                         keeper.escrow_reward_condition, keeper.compute_execution_condition):
+            fn_abi = _function_abi(contract, 'fulfill')
+            self._fulfill_functions[
+                (contract.address.lower(), function_abi_to_4byte_selector(fn_abi))] = (
+                contract, fn_abi)
+
+        with self._lock:
+            block_number = self._new_block()
+            for ddo in self._ddos:
+                self._emit(keeper.did_registry, 'DIDAttributeRegistered', block_number, {
+                    '_did': did_to_id_bytes(ddo.did),
+                    '_owner': ddo.publisher,
+                    '_checksum': did_to_id_bytes(ddo.did),
+                    '_value': FAKE_AQUARIUS_URL,
+                    '_lastUpdatedBy': ddo.publisher,
+                    '_blockNumberUpdated': block_number,
+                })
+            self._did_block = block_number
+
+    @property
+    def block_number(self):
+        with self._lock:
+            return len(self._blocks) - 1
+
+    @property
+    def agreements(self):
+        """dict agreement id -> timing dict of the agreements created so far."""
+        with self._lock:
+            return {agreement_id: dict(agreement['times'])
+                    for agreement_id, agreement in self._agreements.items()}
+
+    @property
+    def num_completed(self):
+        with self._lock:
+            return sum(1 for agreement in self._agreements.values()
+                       if 'escrowReward' in agreement['times'])
+
+    @property
+    def is_done(self):
+        with self._lock:
+            return (len(self._agreements) >= self.num_agreements and
+                    self.num_completed >= self.num_agreements)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='fake-keeper')
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.block_time):
+            self.mine_block()
+
+    def _new_block(self):
+        number = len(self._blocks)
+        self._blocks.append({
+            'number': number,
+            'hash': encode_hex(keccak(b'fake-keeper-block-%d' % number)),
+            'timestamp': int(time.time()),
+            'time': time.time(),
+        })
+        return number
+
+    def mine_block(self):
+        """Produce one block: new agreements, consumer lock rewards and mined transactions."""
+        with self._lock:
+            block_number = self._new_block()
+            num_new = min(self.agreements_per_block, self.num_agreements - len(self._agreements))
+            for _ in range(max(num_new, 0)):
+                self._create_agreement(block_number)
+
+            for agreement_id in self._agreements_by_block.get(
+                    block_number - self.consumer_delay, []):
+                self._lock_reward(agreement_id, block_number)
+
+            pending, self._pending_txs = self._pending_txs, []
+            for tx in pending:
+                if tx['mine_at'] <= block_number:
+                    self._mine_transaction(tx, block_number)
+                else:
+                    self._pending_txs.append(tx)
+            return block_number
+
+    def _create_agreement(self, block_number):
+        index = len(self._agreements)
+        agreement_id = encode_hex(keccak(b'benchmark-agreement-%d' % index))
+        ddo = self._ddos[index % len(self._ddos)]
+        service = ddo.get_service('access')
+        access_id, lock_id, escrow_id = service.generate_agreement_condition_ids(
+            agreement_id, ddo.asset_id, self._consumer, ddo.publisher, self._keeper)
+        keeper = self._keeper
+        conditions = {
+            keeper.access_secret_store_condition.address.lower(): ('accessSecretStore', access_id),
+            keeper.lock_reward_condition.address.lower(): ('lockReward', lock_id),
+            keeper.escrow_reward_condition.address.lower(): ('escrowReward', escrow_id),
+        }
+        for _, condition_id in conditions.values():
+            self._condition_states[condition_id.lower()] = CONDITION_UNFULFILLED
+
+        self._agreements[agreement_id] = {
+            'ddo': ddo,
+            'price': service.get_price(),
+            'conditions': conditions,
+            'times': {'agreementCreated': time.time()},
+        }
+        self._agreements_by_block[block_number].append(agreement_id)
+        self._emit(keeper.escrow_access_secretstore_template, 'AgreementCreated', block_number, {
+            '_agreementId': Web3.toBytes(hexstr=agreement_id),
+            '_did': did_to_id_bytes(ddo.did),
+            '_accessConsumer': self._consumer,
+            '_accessProvider': ddo.publisher,
+            '_timeLocks': [0, 0, 0],
+            '_timeOuts': [0, 0, 0],
+        })
+
+    def _lock_reward(self, agreement_id, block_number):
+        agreement = self._agreements[agreement_id]
+        contract = self._keeper.lock_reward_condition
+        _, condition_id = agreement['conditions'][contract.address.lower()]
+        self._condition_states[condition_id.lower()] = CONDITION_FULFILLED
+        agreement['times']['lockReward'] = time.time()
+        self._emit(contract, 'Fulfilled', block_number, {
+            '_agreementId': Web3.toBytes(hexstr=agreement_id),
+            '_rewardAddress': self._keeper.escrow_reward_condition.address,
+            '_conditionId': Web3.toBytes(hexstr=condition_id),
+            '_amount': agreement['price'],
+        })
+
+    def _emit(self, contract, event_name, block_number, values, tx_hash=None):
+        event_abi = _event_abi(contract, event_name)
+        indexed = [arg for arg in event_abi['inputs'] if arg['indexed']]
+        not_indexed = [arg for arg in event_abi['inputs'] if not arg['indexed']]
+        block_logs = self._logs[block_number]
+        log = {
+            'address': contract.address,
+            'topics': [encode_hex(event_abi_to_log_topic(event_abi))] + [
+                encode_hex(encode_single(arg['type'], values[arg['name']])) for arg in indexed],
+            'data': encode_hex(encode_abi([arg['type'] for arg in not_indexed],
+                                          [values[arg['name']] for arg in not_indexed])),
+            'blockNumber': hex(block_number),
+            'blockHash': self._blocks[block_number]['hash'],
+            'transactionHash': tx_hash or encode_hex(
+                keccak(b'fake-keeper-log-%d-%d' % (block_number, len(block_logs)))),
+            'transactionIndex': hex(len(block_logs)),
+            'logIndex': hex(len(block_logs)),
+            'removed': False,
+        }
+        block_logs.append(log)
+        self.num_events += 1
+        return log
+
+    def _mine_transaction(self, tx, block_number):
+        contract, fn_abi = tx['function']
+        args = dict(zip([arg['name'] for arg in fn_abi['inputs']], tx['args']))
+        agreement_id = encode_hex(args['_agreementId'])
+        agreement = self._agreements.get(agreement_id)
+        logs = []
+        status = 0
+        if agreement is not None:
+            name, condition_id = agreement['conditions'][contract.address.lower()]
+            if self._condition_states.get(condition_id.lower()) == CONDITION_UNFULFILLED:
+                self._condition_states[condition_id.lower()] = CONDITION_FULFILLED
+                agreement['times'][name] = time.time()
+                args['_conditionId'] = Web3.toBytes(hexstr=condition_id)
+                logs.append(self._emit(contract, 'Fulfilled', block_number, args, tx['hash']))
+                status = 1
+
+        self._receipts[tx['hash']] = {
+            'transactionHash': tx['hash'],
+            'transactionIndex': '0x0',
+            'blockHash': self._blocks[block_number]['hash'],
+            'blockNumber': hex(block_number),
+            'from': tx['from'],
+            'to': contract.address,
+            'cumulativeGasUsed': hex(50000),
+            'gasUsed': hex(50000),
+            'contractAddress': None,
+            'logs': logs,
+            'logsBloom': '0x' + '00' * 256,
+            'status': hex(status),
+        }
+        self._transactions[tx['hash']].update(
+            blockHash=self._blocks[block_number]['hash'], blockNumber=hex(block_number))
+
+    def _block_number_param(self, value):
+        if value in (None, 'latest', 'pending'):
+            return len(self._blocks) - 1
+        if value == 'earliest':
+            return 0
+        return _to_int(value)
+
+    def _get_block(self, params):
+        with self._lock:
+            number = self._block_number_param(params[0])
+            if number >= len(self._blocks):
+                return None
+            block = self._blocks[number]
+        return {
+            'number': hex(block['number']),
+            'hash': block['hash'],
+            'parentHash': self._blocks[number - 1]['hash'] if number else '0x' + '00' * 32,
+            'timestamp': hex(block['timestamp']),
+            'gasLimit': hex(8000000),
+            'gasUsed': '0x0',
+            'miner': '0x' + '00' * 20,
+            'transactions': [],
+        }
+
+    def _get_logs(self, log_filter):
+        with self._lock:
+            from_block = self._block_number_param(log_filter.get('fromBlock', 'latest'))
+            to_block = min(self._block_number_param(log_filter.get('toBlock', 'latest')),
+                           len(self._blocks) - 1)
+            addresses = log_filter.get('address')
+            if isinstance(addresses, str):
+                addresses = [addresses]
+            addresses = {address.lower() for address in addresses} if addresses else None
+            topics = log_filter.get('topics') or []
+
+            result = []
+            for block_number in range(from_block, to_block + 1):
+                for log in self._logs.get(block_number, []):
+                    if addresses is not None and log['address'].lower() not in addresses:
+                        continue
+                    if self._topics_match(log['topics'], topics):
+                        result.append(log)
+            return result
+
+    @staticmethod
+    def _topics_match(log_topics, topics):
+        for index, expected in enumerate(topics):
+            if expected is None:
+                continue
+            if index >= len(log_topics):
+                return False
+            options = expected if isinstance(expected, list) else [expected]
+            if log_topics[index].lower() not in {option.lower() for option in options}:
+                return False
+        return True
+
+    def _call(self, params):
+        tx = params[0]
+        data = Web3.toBytes(hexstr=tx['data'])
+        call = self._calls.get((tx['to'].lower(), data[:4]))
+        if call is None:
+            raise ValueError(f'call to {tx["to"]} is not supported by the fake keeper')
+
+        fn_abi, handler = call
+        args = decode_abi([arg['type'] for arg in fn_abi['inputs']], data[4:])
+        outputs = [arg['type'] for arg in fn_abi['outputs']]
+        return encode_hex(encode_abi(outputs, [handler(*args)]))
+
+    def _get_condition_state(self, condition_id):
+        with self._lock:
+            return self._condition_states.get(encode_hex(condition_id), 0)
+
+    def _get_did_owner(self, agreement_id):
+        with self._lock:
+            agreement = self._agreements.get(encode_hex(agreement_id))
+        return agreement['ddo'].publisher if agreement else '0x' + '00' * 20
+
+    def _get_block_number_updated(self, did_bytes):
+        return self._did_block if any(
+            did_to_id_bytes(ddo.did) == did_bytes for ddo in self._ddos) else 0
+
+    def _send_raw_transaction(self, params):
+        raw = Web3.toBytes(hexstr=params[0])
+        tx = Transaction.from_bytes(raw)
+        sender = self._eth_account.recoverTransaction(raw)
+        tx_hash = encode_hex(keccak(raw))
+        function = self._fulfill_functions.get((encode_hex(tx.to).lower(), tx.data[:4]))
+        if function is None:
+            raise ValueError(f'transaction to {encode_hex(tx.to)} is not supported '
+                             f'by the fake keeper')
+
+        args = decode_abi([arg['type'] for arg in function[1]['inputs']], tx.data[4:])
+        with self._lock:
+            if tx.nonce < self._nonces[sender] or (sender, tx.nonce) in self._queued_txs:
+                raise ValueError(f'nonce too low: {tx.nonce} for {sender}')
+            self._transactions[tx_hash] = {
+                'hash': tx_hash, 'nonce': hex(tx.nonce), 'blockHash': None,
+                'blockNumber': None, 'transactionIndex': '0x0', 'from': sender,
+                'to': to_checksum_address(tx.to), 'value': hex(tx.value), 'gas': hex(tx.gas),
+                'gasPrice': hex(tx.gasPrice), 'input': encode_hex(tx.data),
+            }
+            self._queued_txs[(sender, tx.nonce)] = {
+                'hash': tx_hash, 'from': sender, 'function': function, 'args': args,
+            }
+            while (sender, self._nonces[sender]) in self._queued_txs:
+                pending = self._queued_txs.pop((sender, self._nonces[sender]))
+                pending['mine_at'] = len(self._blocks) - 1 + self.mine_delay
+                self._pending_txs.append(pending)
+                self._nonces[sender] += 1
+        return tx_hash
+
+    def _get_transaction_count(self, params):
+        with self._lock:
+            return hex(self._nonces[to_checksum_address(params[0])])
+
+    def _new_filter(self, params):
+        with self._lock:
+            filter_id = hex(next(self._filter_ids))
+            self._filters[filter_id] = params[0]
+        return filter_id
+
+    def handle(self, method, params):
+        """Return the JSON-RPC result of `method`, raise ValueError if it is not supported."""
+        if method == 'eth_blockNumber':
+            return hex(self.block_number)
+        if method == 'eth_getBlockByNumber':
+            return self._get_block(params)
+        if method == 'eth_getLogs':
+            return self._get_logs(params[0])
+        if method == 'eth_call':
+            return self._call(params)
+        if method == 'eth_sendRawTransaction':
+            return self._send_raw_transaction(params)
+        if method == 'eth_getTransactionReceipt':
+            with self._lock:
+                return self._receipts.get(params[0])
+        if method == 'eth_getTransactionByHash':
+            with self._lock:
+                return self._transactions.get(params[0])
+        if method == 'eth_getTransactionCount':
+            return self._get_transaction_count(params)
+        if method == 'eth_newFilter':
+            return self._new_filter(params)
+        if method in ('eth_getFilterLogs', 'eth_getFilterChanges'):
+            with self._lock:
+                log_filter = self._filters.get(params[0])
+            if log_filter is None:
+                raise ValueError('Filter not found')
+            return self._get_logs(log_filter)
+        if method == 'eth_uninstallFilter':
+            with self._lock:
+                return self._filters.pop(params[0], None) is not None
+        if method == 'eth_estimateGas':
+            return hex(200000)
+        if method == 'eth_gasPrice':
+            return hex(10 ** 9)
+        if method == 'net_version':
+            return NET_VERSION
+        if method == 'eth_chainId':
+            return hex(int(NET_VERSION))
+        if method == 'eth_accounts':
+            return []
+        raise ValueError(f'method {method} is not supported by the fake keeper')
+
+
+class FakeKeeperProvider(BaseProvider):
+    """Web3 provider answering from a `FakeKeeperNode` after a simulated network latency.
+
+    Calls are counted per JSON-RPC method in `call_counts`; a batch counts once in
+    `num_round_trips` and once per request in `call_counts`.
+    """
+
+    def __init__(self, node, latency=0.0):
+        """
+
+        :param node: FakeKeeperNode
+        :param latency: float seconds added to every round trip
+        """
+        super().__init__()
+        self._node = node
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.call_counts = Counter()
+        self.num_round_trips = 0
+
+    def isConnected(self):
+        return True
+
+    def _count(self, methods):
+        with self._lock:
+            self.num_round_trips += 1
+            self.call_counts.update(methods)
+
+    def _response(self, method, params, request_id=0):
+        try:
+            return {'jsonrpc': '2.0', 'id': request_id,
+                    'result': self._node.handle(method, params)}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': request_id,
+                    'error': {'code': -32000, 'message': str(e)}}
+
+    def make_request(self, method, params):
+        self._count([method])
+        if self._latency:
+            time.sleep(self._latency)
+        return self._response(method, params)
+
+    def make_batch_request(self, requests):
+        self._count([method for method, _ in requests])
+        if self._latency:
+            time.sleep(self._latency)
+        return [self._response(method, params, i) for i, (method, params) in enumerate(requests)]
+
+
+class FakeAquarius:
+    """Aquarius stand-in serving the DDOs registered in `ddos`, for `AquariusProvider`."""
+    ddos = {}
+    latency = 0.0
+    num_requests = 0
+
+    def __init__(self, url):
+        self.url = url
+
+    def get_asset_ddo(self, did):
+        FakeAquarius.num_requests += 1
+        if FakeAquarius.latency:
+            time.sleep(FakeAquarius.latency)
+        ddo = FakeAquarius.ddos.get(did)
+        # parse the document like the real client does
+        return DDO(json_text=ddo.as_text()) if ddo else {}
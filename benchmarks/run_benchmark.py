@@ -0,0 +1,382 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+"""Synthetic load benchmark of the provider events monitor.
+
+Runs the real `ProviderEventsMonitor`, `AgreementsStorage` and event handlers against a
+`FakeKeeperNode` and writes events/sec, fulfillment latencies, threads, peak RSS and
+RPC call counts as JSON, e.g.::
+
+    python -m benchmarks.run_benchmark --agreements 500 --agreements-per-block 25 \\
+        --output benchmark-results.json --baseline previous-results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from eth_account import Account as EthAccount
+from eth_utils import encode_hex, keccak
+from ocean_keeper.account import Account
+from ocean_keeper.contract_handler import ContractHandler
+from ocean_keeper.keeper import Keeper
+from ocean_keeper.web3_provider import Web3Provider
+from ocean_utils.agreements.service_factory import ServiceDescriptor, ServiceFactory
+from ocean_utils.agreements.service_types import ServiceTypes
+from ocean_utils.aquarius.aquarius_provider import AquariusProvider
+from ocean_utils.ddo.ddo import DDO
+from ocean_utils.did import DID
+from ocean_utils.utils.utilities import checksum
+from web3 import Web3
+
+from benchmarks.fake_keeper import FAKE_AQUARIUS_URL, FakeAquarius, FakeKeeperNode, \
+    FakeKeeperProvider
+from ocean_events_handler.agreement_store.agreements import AGREEMENT_CREATED_STAGE
+from ocean_events_handler.nonce_manager import NonceManager
+from ocean_events_handler.provider_events_monitor import ProviderEventsMonitor
+from ocean_events_handler.rpc_batch import ConditionStateReader
+from ocean_events_handler.util import get_config, get_keeper_path
+
+logger = logging.getLogger('benchmark')
+
+# lifecycle stages of an access agreement in the order they happen
+ACCESS_STAGES = [AGREEMENT_CREATED_STAGE, 'lockReward', 'accessSecretStore', 'escrowReward']
+# seconds to wait for the monitor to record the last completed agreements
+MONITOR_DRAIN_TIMEOUT = 10
+# (result key, True if higher is better) of the values compared against a baseline
+COMPARED_RESULTS = (
+    (('throughput', 'events_per_sec'), True),
+    (('throughput', 'agreements_per_sec'), True),
+    (('latency', 'end_to_end', 'p95'), False),
+    (('latency', 'lockReward->accessSecretStore', 'p95'), False),
+    (('rpc', 'calls_per_agreement'), False),
+    (('process', 'peak_rss_kb'), False),
+)
+
+
+def _summary(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+
+    def percentile(p):
+        return values[min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)]
+
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': values[-1],
+    }
+
+
+def build_ddo(keeper, publisher_account, index, price=10):
+    """Return an access asset DDO published by `publisher_account`, without Aquarius."""
+    metadata = {
+        'main': {
+            'name': f'benchmark asset {index}',
+            'dateCreated': '2019-02-08T08:13:49Z',
+            'author': 'benchmark',
+            'license': 'CC-BY',
+            'price': str(price),
+            'type': 'dataset',
+            'files': [{'index': 0, 'contentType': 'text/csv', 'checksum': str(index)}],
+        },
+        'encryptedFiles': encode_hex(keccak(b'benchmark-files-%d' % index)),
+    }
+    access_attributes = {
+        'main': {
+            'name': 'dataAssetAccessServiceAgreement',
+            'creator': publisher_account.address,
+            'price': price,
+            'timeout': 3600,
+            'datePublished': metadata['main']['dateCreated'],
+        }
+    }
+    services = ServiceFactory.build_services([
+        ServiceDescriptor.metadata_service_descriptor(metadata, FAKE_AQUARIUS_URL),
+        ServiceDescriptor.access_service_descriptor(
+            access_attributes, 'http://localhost:8030',
+            keeper.escrow_access_secretstore_template.address),
+    ])
+
+    ddo = DDO()
+    ddo.add_proof({str(service.index): checksum(service.main) for service in services},
+                  publisher_account)
+    did = ddo.assign_did(DID.did(ddo.proof['checksum']))
+    name_to_address = {name: contract.address
+                       for name, contract in keeper.contract_name_to_instance.items()}
+    for service in services:
+        if service.type == ServiceTypes.ASSET_ACCESS:
+            service.init_conditions_values(did, contract_name_to_address=name_to_address)
+        ddo.add_service(service)
+    return ddo
+
+
+def _provider_account(index):
+    private_key = encode_hex(keccak(b'benchmark-provider' + (b'-%d' % index if index else b'')))
+    return Account(EthAccount().privateKeyToAccount(private_key).address,
+                   private_key=private_key)
+
+
+def _num_observed_completions(monitor):
+    last_stage = ACCESS_STAGES[-1]
+    monitor.fill_block_timestamps()
+    report = monitor.db.get_stage_latency_report([last_stage])
+    return report[f'{last_stage}.observed']['count']
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+class _ThreadSampler:
+    """Track the peak number of live threads while the benchmark runs."""
+
+    def __init__(self, interval=0.1):
+        self._interval = interval
+        self._stopped = threading.Event()
+        self.peak = threading.active_count()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='thread-sampler')
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+def run_benchmark(num_agreements=100, agreements_per_block=10, block_time=1.0,
+                  consumer_delay=1, mine_delay=1, rpc_latency=0.0, aquarius_latency=0.0,
+                  num_assets=10, num_accounts=1, timeout=300, storage_path=None):
+    """Run the monitor against a fake keeper node until all agreements are completed.
+
+    :param num_agreements: int number of agreements created by the fake node
+    :param agreements_per_block: int AgreementCreated events per block
+    :param block_time: float seconds between blocks
+    :param consumer_delay: int blocks between AgreementCreated and the lock reward
+    :param mine_delay: int blocks until a fulfill transaction is mined
+    :param rpc_latency: float seconds added to every JSON-RPC round trip
+    :param aquarius_latency: float seconds added to every DDO request
+    :param num_assets: int number of distinct assets the agreements are spread over
+    :param num_accounts: int number of provider accounts served by the monitor, the assets
+        are spread over them
+    :param timeout: float max seconds to wait for the agreements to complete
+    :param storage_path: str path of the agreements database, a temporary file if None
+    :return: dict of results
+    """
+    config = dict(
+        num_agreements=num_agreements, agreements_per_block=agreements_per_block,
+        block_time=block_time, consumer_delay=consumer_delay, mine_delay=mine_delay,
+        rpc_latency=rpc_latency, aquarius_latency=aquarius_latency, num_assets=num_assets,
+        num_accounts=num_accounts, timeout=timeout
+    )
+    node = FakeKeeperNode(agreements_per_block, num_agreements, block_time, consumer_delay,
+                          mine_delay)
+    provider = FakeKeeperProvider(node, latency=rpc_latency)
+    web3 = Web3(provider)
+    previous_web3, previous_aquarius = Web3Provider._web3, AquariusProvider._aquarius_class
+    _use_web3(web3)
+    temp_dir = None
+    if storage_path is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix='events-monitor-benchmark-')
+        storage_path = os.path.join(temp_dir.name, 'agreements.db')
+
+    try:
+        return _run(node, provider, web3, storage_path, config)
+    finally:
+        _use_web3(previous_web3)
+        AquariusProvider.set_aquarius_class(previous_aquarius)
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+def _use_web3(web3):
+    Web3Provider.set_web3(web3)
+    ContractHandler.set_artifacts_path(get_keeper_path(get_config()))
+    # contracts and shared readers are bound to the web3 instance they were created with
+    ContractHandler._contracts.clear()
+    ConditionStateReader._instance = None
+    with NonceManager._managers_lock:
+        NonceManager._managers.clear()
+
+
+def _run(node, provider, web3, storage_path, config):
+    monitor = None
+    sampler = _ThreadSampler()
+    try:
+        keeper = Keeper.get_instance()
+        accounts = [_provider_account(i) for i in range(config['num_accounts'])]
+        ddos = [build_ddo(keeper, accounts[i % len(accounts)], i)
+                for i in range(config['num_assets'])]
+        FakeAquarius.ddos = {ddo.did: ddo for ddo in ddos}
+        FakeAquarius.latency = config['aquarius_latency']
+        FakeAquarius.num_requests = 0
+        AquariusProvider.set_aquarius_class(FakeAquarius)
+        node.setup(keeper, ddos)
+
+        monitor = ProviderEventsMonitor(keeper, web3, storage_path, accounts)
+        sampler.start()
+        setup_calls = provider.call_counts.copy()
+        start = time.time()
+        node.start()
+        monitor.start_agreement_events_monitor()
+        while not node.is_done and time.time() - start < config['timeout']:
+            time.sleep(0.1)
+        duration = time.time() - start
+        # the last fulfillments are mined, give the monitor time to record them
+        deadline = time.time() + MONITOR_DRAIN_TIMEOUT
+        while _num_observed_completions(monitor) < node.num_completed \
+                and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        node.stop()
+        if monitor is not None:
+            monitor.stop_monitor()
+        sampler.stop()
+
+    agreements = node.agreements
+    completed = [times for times in agreements.values() if 'escrowReward' in times]
+    latency = {'end_to_end': _summary(
+        times['escrowReward'] - times[AGREEMENT_CREATED_STAGE] for times in completed)}
+    for previous, stage in zip(ACCESS_STAGES, ACCESS_STAGES[1:]):
+        latency[f'{previous}->{stage}'] = _summary(
+            times[stage] - times[previous] for times in agreements.values()
+            if stage in times and previous in times)
+
+    calls = provider.call_counts - setup_calls
+    num_calls = sum(calls.values())
+    results = {
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'revision': _git_revision(),
+            'timestamp': time.time(),
+        },
+        'duration_seconds': duration,
+        'timed_out': not node.is_done,
+        'agreements': {'created': len(agreements), 'completed': len(completed)},
+        'throughput': {
+            'events': node.num_events,
+            'events_per_sec': node.num_events / duration,
+            'agreements_per_sec': len(completed) / duration,
+        },
+        'latency': latency,
+        'monitor_stage_latency': monitor.db.get_stage_latency_report(ACCESS_STAGES),
+        'process': {
+            'peak_threads': sampler.peak,
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (
+                1024 if sys.platform == 'darwin' else 1),
+        },
+        'rpc': {
+            'round_trips': provider.num_round_trips,
+            'calls': num_calls,
+            'calls_per_agreement': num_calls / max(len(agreements), 1),
+            'calls_by_method': dict(calls),
+            'ddo_requests': FakeAquarius.num_requests,
+        },
+    }
+    return results
+
+
+def _get(results, path):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+
+def compare_results(baseline, results, tolerance=0.2):
+    """Return a description of each compared value that regressed by more than `tolerance`.
+
+    :param baseline: dict results of a previous run
+    :param results: dict results of this run
+    :param tolerance: float accepted relative change, e.g. 0.2 for 20%
+    :return: list of str
+    """
+    regressions = []
+    for path, higher_is_better in COMPARED_RESULTS:
+        before, after = _get(baseline, path), _get(results, path)
+        if not before or after is None:
+            continue
+
+        change = (after - before) / before
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append(f'{".".join(path)}: {before:.4g} -> {after:.4g} ({change:+.1%})')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agreements', type=int, default=100)
+    parser.add_argument('--agreements-per-block', type=int, default=10)
+    parser.add_argument('--block-time', type=float, default=1.0)
+    parser.add_argument('--consumer-delay', type=int, default=1,
+                        help='blocks between AgreementCreated and the lock reward')
+    parser.add_argument('--mine-delay', type=int, default=1,
+                        help='blocks until a fulfill transaction is mined')
+    parser.add_argument('--rpc-latency', type=float, default=0.0,
+                        help='seconds added to every JSON-RPC round trip')
+    parser.add_argument('--aquarius-latency', type=float, default=0.0,
+                        help='seconds added to every DDO request')
+    parser.add_argument('--assets', type=int, default=10)
+    parser.add_argument('--provider-accounts', type=int, default=1,
+                        help='provider accounts served by the monitor')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change accepted before a regression is reported')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_benchmark(
+        num_agreements=args.agreements, agreements_per_block=args.agreements_per_block,
+        block_time=args.block_time, consumer_delay=args.consumer_delay,
+        mine_delay=args.mine_delay, rpc_latency=args.rpc_latency,
+        aquarius_latency=args.aquarius_latency, num_assets=args.assets,
+        num_accounts=args.provider_accounts, timeout=args.timeout
+    )
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    print(f'{results["agreements"]["completed"]}/{results["agreements"]["created"]} agreements '
+          f'completed in {results["duration_seconds"]:.1f}s, '
+          f'{results["throughput"]["events_per_sec"]:.1f} events/s, end-to-end p95 '
+          f'{results["latency"]["end_to_end"].get("p95", 0):.2f}s, '
+          f'{results["rpc"]["calls_per_agreement"]:.1f} RPC calls per agreement, '
+          f'results written to {args.output}')
+
+    status = 0 if not results['timed_out'] else 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        status = status or (2 if regressions else 0)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
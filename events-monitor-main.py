@@ -1,14 +1,44 @@
+import logging
 import os
 import time
 
 from ocean_keeper.contract_handler import ContractHandler
-from ocean_keeper.utils import get_account
 from ocean_keeper.web3_provider import Web3Provider
 from ocean_keeper.keeper import Keeper
 
 from ocean_events_handler.log import setup_logging
+from ocean_events_handler.metrics import MetricsRegistry, start_metrics_server
 from ocean_events_handler.provider_events_monitor import ProviderEventsMonitor
-from ocean_events_handler.util import get_config, get_keeper_path, init_account_envvars
+from ocean_events_handler.util import (
+    get_config,
+    get_keeper_path,
+    get_provider_accounts,
+    get_web3_provider,
+    init_account_envvars
+)
+
+logger = logging.getLogger('events-monitor')
+
+# seconds between two reports of the keeper node transport stats
+TRANSPORT_STATS_INTERVAL = 60
+
+
+def register_transport_metrics(registry, stats):
+    """Expose the keeper node `TransportStats` through the metrics registry."""
+    registry.counter('events_monitor_rpc_requests_total',
+                     'Requests sent to the keeper node.').set_function(
+        lambda: stats.num_requests)
+    registry.counter('events_monitor_rpc_errors_total',
+                     'Failed requests to the keeper node.').set_function(
+        lambda: stats.num_errors)
+    registry.gauge('events_monitor_rpc_in_flight',
+                   'Requests to the keeper node in flight.').set_function(
+        lambda: stats.in_flight)
+    latency = registry.gauge('events_monitor_rpc_latency_seconds',
+                             'Recent keeper node request latency percentiles.', ('quantile',))
+    for quantile in (50, 95, 99):
+        latency.labels(quantile / 100).set_function(
+            lambda q=quantile: stats.latency_percentile(q) or 0)
 
 
 def run_events_monitor():
@@ -19,30 +49,47 @@ def run_events_monitor():
     storage_path = config.get('resources', 'storage.path', fallback='./provider-events-monitor.db')
 
     ContractHandler.set_artifacts_path(artifacts_path)
-    web3 = Web3Provider.get_web3(keeper_url)
+    web3 = Web3Provider.get_web3(provider=get_web3_provider(keeper_url))
     keeper = Keeper.get_instance()
     init_account_envvars()
 
-    account = get_account(0)
-    if account is None:
+    accounts = get_provider_accounts()
+    if not accounts:
         raise AssertionError(f'Provider events monitor cannot run without a valid '
                              f'ethereum account. Account address was not found in the environment'
                              f'variable `PROVIDER_ADDRESS`. Please set the following environment '
                              f'variables and try again: `PROVIDER_ADDRESS`, [`PROVIDER_PASSWORD`, '
                              f'and `PROVIDER_KEYFILE` or `PROVIDER_ENCRYPTED_KEY`] or `PROVIDER_KEY`.')
 
-    if not account._private_key and not (account.password and account._encrypted_key):
-        raise AssertionError(f'Provider events monitor cannot run without a valid '
-                             f'ethereum account with either a `PROVIDER_PASSWORD` '
-                             f'and `PROVIDER_KEYFILE`/`PROVIDER_ENCRYPTED_KEY` '
-                             f'or private key `PROVIDER_KEY`. Current account has password {account.password}, '
-                             f'keyfile {account.key_file}, encrypted-key {account._encrypted_key} '
-                             f'and private-key {account._private_key}.')
+    for account in accounts:
+        if not account._private_key and not (account.password and account._encrypted_key):
+            raise AssertionError(f'Provider events monitor cannot run without a valid '
+                                 f'ethereum account with either a `PROVIDER_PASSWORD` '
+                                 f'and `PROVIDER_KEYFILE`/`PROVIDER_ENCRYPTED_KEY` '
+                                 f'or private key `PROVIDER_KEY`. Account {account.address} has '
+                                 f'password {account.password}, keyfile {account.key_file}, '
+                                 f'encrypted-key {account._encrypted_key} '
+                                 f'and private-key {account._private_key}.')
+
+    monitor = ProviderEventsMonitor(keeper, web3, storage_path, accounts)
+    # a replayed traffic file has no transport to report on
+    transport_stats = getattr(web3.providers[0], 'stats', None)
+    metrics_port = os.getenv('OCN_EVENTS_MONITOR_METRICS_PORT')
+    if metrics_port:
+        registry = MetricsRegistry.get_instance()
+        if transport_stats is not None:
+            register_transport_metrics(registry, transport_stats)
+        start_metrics_server(
+            int(metrics_port), os.getenv('OCN_EVENTS_MONITOR_METRICS_HOST', '127.0.0.1'))
 
-    monitor = ProviderEventsMonitor(keeper, web3, storage_path, account)
     monitor.start_agreement_events_monitor()
+    last_report = time.time()
     while True:
         time.sleep(5)
+        if transport_stats is not None and \
+                time.time() - last_report >= TRANSPORT_STATS_INTERVAL:
+            logger.info(f'keeper node transport: {transport_stats.as_dict()}')
+            last_report = time.time()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+
+from eth_abi import encode_single
+from eth_utils import encode_hex, event_abi_to_log_topic
+from web3.exceptions import CannotHandleRequest
+from web3.middleware import abi_middleware
+from web3.middleware.pythonic import log_entry_formatter
+from web3.utils.abi import get_indexed_event_inputs
+from web3.utils.events import get_event_data
+
+logger = logging.getLogger(__name__)
+
+
+class AgreementCreatedLogFetcher:
+    """Fetch `AgreementCreated` logs of all agreement templates with a single `eth_getLogs`.
+
+    The request filters on every registered template address and on the `AgreementCreated`
+    topic, so the number of RPC calls per block range does not depend on the number of
+    templates. Logs are decoded locally using the ABI of the template that emitted them.
+    Several provider addresses share the request as alternatives of the `_accessProvider`
+    topic, so it does not depend on the number of provider accounts either.
+    """
+    AGREEMENT_CREATED_EVENT = 'AgreementCreated'
+
+    def __init__(self, web3, templates, provider_address=None):
+        """
+
+        :param web3: Web3 instance
+        :param templates: list of keeper agreement template contracts (`TemplateBase`)
+        :param provider_address: hex str ethereum address or list of addresses used to
+            filter on `_accessProvider`
+        """
+        self._web3 = web3
+        self._address_to_template = {}
+        self._address_to_abi = {}
+        for template in templates:
+            event = getattr(template.events, self.AGREEMENT_CREATED_EVENT)
+            self._address_to_template[template.address] = template
+            self._address_to_abi[template.address] = event._get_event_abi()
+
+        self._topics = None
+        self.set_provider_addresses(provider_address)
+
+    def set_provider_addresses(self, provider_address):
+        """Filter on `_accessProvider` being `provider_address` or any address of a list."""
+        self._topics = self._build_topics(
+            next(iter(self._address_to_abi.values())),
+            {'_accessProvider': provider_address} if provider_address else {}
+        )
+
+    @property
+    def template_addresses(self):
+        return list(self._address_to_template.keys())
+
+    @property
+    def log_filter(self):
+        """The `address` and `topics` filter of the logs, e.g. for a `logs` subscription."""
+        return {'address': self.template_addresses, 'topics': self._topics}
+
+    def get_template(self, address):
+        return self._address_to_template.get(address)
+
+    def decode_log(self, log):
+        """Decode an `AgreementCreated` log with the ABI of the template that emitted it.
+
+        :param log: log entry as returned by `eth.getLogs` or a raw JSON-RPC log
+        :return: AttributeDict event log or None if the log is not from a known template
+        """
+        if isinstance(log.get('blockNumber'), str):
+            log = log_entry_formatter(log)
+
+        event_abi = self._address_to_abi.get(log['address'])
+        if not event_abi:
+            logger.debug(f'skipping log from unknown template address {log["address"]}')
+            return None
+
+        return get_event_data(event_abi, log)
+
+    @staticmethod
+    def _build_topics(event_abi, argument_filters):
+        topics = [encode_hex(event_abi_to_log_topic(event_abi))]
+        for arg in get_indexed_event_inputs(event_abi):
+            value = argument_filters.get(arg['name'])
+            if isinstance(value, (list, tuple)):
+                topics.append([encode_hex(encode_single(arg['type'], v)) for v in value])
+            else:
+                topics.append(encode_hex(encode_single(arg['type'], value)) if value else None)
+
+        while topics[-1] is None:
+            topics.pop()
+        return topics
+
+    def get_logs(self, from_block, to_block):
+        """Return decoded `AgreementCreated` logs emitted by any template in the block range.
+
+        :param from_block: int
+        :param to_block: int
+        :return: list of AttributeDict event logs, each with `address` set to the template
+        """
+        raw_logs = self._make_request('eth_getLogs', [{
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': self.template_addresses,
+            'topics': self._topics
+        }])
+        logs = [self.decode_log(log) for log in raw_logs]
+        return [log for log in logs if log is not None]
+
+    def _make_request(self, method, params):
+        """Send a request through the middlewares of the web3 request manager.
+
+        web3's `abi` middleware validates the filter `address` as a single address although
+        nodes accept a list, so it is left out; every other configured middleware, e.g. the
+        result formatters, applies as for `eth.getLogs`.
+        """
+        manager = self._web3.manager
+        middlewares = tuple(middleware for middleware in manager.middleware_stack
+                            if middleware is not abi_middleware)
+        for provider in manager.providers:
+            try:
+                response = provider.request_func(self._web3, middlewares)(method, params)
+            except CannotHandleRequest:
+                continue
+            if 'error' in response:
+                raise ValueError(response['error'])
+            return response['result']
+
+        raise ValueError(f'no provider handled the {method} request')
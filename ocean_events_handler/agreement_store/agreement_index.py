@@ -0,0 +1,98 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import logging
+import math
+
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Compact probabilistic set: no false negatives, false positives at `error_rate`."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+
+        :param capacity: int expected number of keys
+        :param error_rate: float acceptable false positive probability at `capacity` keys
+        """
+        capacity = max(1, int(capacity))
+        self._num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self._num_hashes = max(1, int(round(self._num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self._num_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return ((h1 + i * h2) % self._num_bits for i in range(self._num_hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class KnownAgreementIndex:
+    """In-memory index of the agreement ids already recorded in the agreements store.
+
+    The index is loaded once and kept up to date with `add`, so checking whether an
+    `AgreementCreated` event was already processed is a set lookup without any I/O.
+
+    For very large histories only the agreements since `since_block_number` are kept
+    in the exact set; all older ids go into a bloom filter. A bloom filter hit on an id
+    missing from the set is confirmed with a primary key lookup in the store.
+    """
+    BLOOM_THRESHOLD = 200000
+    BLOOM_ERROR_RATE = 0.001
+
+    def __init__(self, storage_path, since_block_number=0, bloom_threshold=None):
+        """
+
+        :param storage_path: str path of the agreements sqlite database
+        :param since_block_number: int agreements at or after this block are kept in the
+            exact set when the bloom filter is used
+        :param bloom_threshold: int number of recorded agreements above which older ids
+            are only kept in the bloom filter
+        """
+        self._storage_path = storage_path
+        self._bloom = None
+        self._ids = set()
+
+        db = AgreementsStorage(self._storage_path)
+        count = db.get_agreement_count(include_archive=True) or 0
+        threshold = bloom_threshold if bloom_threshold is not None else self.BLOOM_THRESHOLD
+        if count > threshold:
+            self._bloom = BloomFilter(2 * count, self.BLOOM_ERROR_RATE)
+            for agreement_id in db.iter_agreement_ids(include_archive=True):
+                self._bloom.add(agreement_id)
+            self._ids = db.get_agreement_ids(since_block_number)
+        else:
+            self._ids = set(db.iter_agreement_ids(include_archive=True))
+
+        logger.debug(f'loaded known agreements index: {count} agreements, '
+                     f'bloom filter {"enabled" if self._bloom else "disabled"}')
+
+    def __contains__(self, agreement_id):
+        if agreement_id in self._ids:
+            return True
+
+        if self._bloom is None or agreement_id not in self._bloom:
+            return False
+
+        return AgreementsStorage(self._storage_path).has_agreement(agreement_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, agreement_id):
+        self._ids.add(agreement_id)
+
+    def discard(self, agreement_id):
+        """Forget `agreement_id`; an id still in the bloom filter is checked in the store."""
+        self._ids.discard(agreement_id)
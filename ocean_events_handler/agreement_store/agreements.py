@@ -5,8 +5,21 @@ import logging
 
 from ocean_utils.data_store.storage_base import StorageBase
 
+from ocean_events_handler.agreement_store.connection_manager import ConnectionManager
+
 logger = logging.getLogger(__name__)
 
+# stage recorded for the AgreementCreated event, the other stages are condition names
+AGREEMENT_CREATED_STAGE = 'agreementCreated'
+
+AgreementRecord = collections.namedtuple(
+    'AgreementRecord',
+    ('agreement_id', 'did', 'service_index', 'price', 'urls', 'consumer', 'start_time',
+     'block_number', 'type', 'conditions', 'provider')
+)
+# `provider` is None for agreements recorded before the provider column was added
+AgreementRecord.__new__.__defaults__ = (None,)
+
 
 class DatabaseSchema:
     agreement_table = f'''
@@ -24,24 +37,240 @@ class DatabaseSchema:
              PRIMARY KEY (agreement_id, condition_name));
     '''
 
+    block_checkpoint_table = f'''
+        CREATE TABLE IF NOT EXISTS block_checkpoint
+            (name VARCHAR(100) PRIMARY KEY,
+             block_number INTEGER);
+    '''
+
+    agreement_block_number_index = '''
+        CREATE INDEX IF NOT EXISTS agreement_block_number_idx
+            ON agreement(block_number, agreement_id);
+    '''
+
+    agreement_condition_status_index = '''
+        CREATE INDEX IF NOT EXISTS agreement_condition_status_idx
+            ON agreement_condition(status, agreement_id);
+    '''
+
+    agreement_archive_table = '''
+        CREATE TABLE IF NOT EXISTS agreement_archive
+            (agreement_id VARCHAR(70) PRIMARY KEY, did VARCHAR, service_index INTEGER,
+             price VARCHAR, urls VARCHAR, consumer VARCHAR(70), start_time INTEGER,
+             block_number INTEGER, type VARCHAR(100));
+    '''
+
+    agreement_condition_archive_table = '''
+        CREATE TABLE IF NOT EXISTS agreement_condition_archive
+            (agreement_id VARCHAR(70),
+             condition_name VARCHAR(100),
+             status INTEGER,
+             PRIMARY KEY (agreement_id, condition_name));
+    '''
+
+    agreement_stage_timing_table = '''
+        CREATE TABLE IF NOT EXISTS agreement_stage_timing
+            (agreement_id VARCHAR(70),
+             stage VARCHAR(100),
+             block_number INTEGER,
+             block_timestamp INTEGER,
+             local_time REAL,
+             tx_hash VARCHAR(70),
+             tx_submit_time REAL,
+             tx_mined_time REAL,
+             PRIMARY KEY (agreement_id, stage));
+    '''
+
+    agreement_stage_timing_index = '''
+        CREATE INDEX IF NOT EXISTS agreement_stage_timing_local_time_idx
+            ON agreement_stage_timing(stage, local_time);
+    '''
+
+    # provider account of the agreement, the partition a multi-account monitor reads
+    agreement_provider_column = 'ALTER TABLE agreement ADD COLUMN provider VARCHAR(70);'
+
+    agreement_archive_provider_column = \
+        'ALTER TABLE agreement_archive ADD COLUMN provider VARCHAR(70);'
+
+    agreement_provider_index = '''
+        CREATE INDEX IF NOT EXISTS agreement_provider_idx
+            ON agreement(provider, block_number, agreement_id);
+    '''
+
+    # transitions are recorded without their block timestamp, filled in for reports
+    agreement_stage_timing_block_timestamp_index = '''
+        CREATE INDEX IF NOT EXISTS agreement_stage_timing_block_timestamp_idx
+            ON agreement_stage_timing(block_timestamp, block_number);
+    '''
+
     SCHEMA = {
         'agreement': agreement_table,
-        'agreement_condition': agreement_condition_table
+        'agreement_condition': agreement_condition_table,
+        'block_checkpoint': block_checkpoint_table
+    }
+
+    # MIGRATIONS[n] upgrades a database from `user_version` n to n + 1, append only
+    MIGRATIONS = [
+        list(SCHEMA.values()),
+        [agreement_block_number_index, agreement_condition_status_index],
+        [agreement_archive_table, agreement_condition_archive_table],
+        [agreement_stage_timing_table, agreement_stage_timing_index],
+        [agreement_provider_column, agreement_archive_provider_column, agreement_provider_index],
+        [agreement_stage_timing_block_timestamp_index],
+    ]
+    VERSION = len(MIGRATIONS)
+
+
+class WriteStatements:
+    insert_agreement = (
+        'INSERT OR REPLACE INTO '
+        'agreement(agreement_id, did, service_index, price, urls, consumer, '
+        '          start_time, block_number, type, provider) '
+        'VALUES (?,?,?,?,?,?,?,?,?,?) '
+    )
+
+    insert_condition = (
+        'INSERT OR REPLACE INTO '
+        'agreement_condition(agreement_id, condition_name, status) '
+        'VALUES(?,?,?) '
+    )
+
+    update_condition_status = (
+        'UPDATE agreement_condition '
+        'SET status=? '
+        'WHERE agreement_id=? AND condition_name=?'
+    )
+
+    update_checkpoint = (
+        'INSERT OR REPLACE INTO block_checkpoint(name, block_number) VALUES (?,?)'
+    )
+
+    insert_stage = (
+        'INSERT OR IGNORE INTO agreement_stage_timing(agreement_id, stage) VALUES (?,?)'
+    )
+
+    # the first observation of a transition wins, e.g. over a replayed event
+    update_stage_transition = (
+        'UPDATE agreement_stage_timing '
+        'SET block_number=COALESCE(block_number, ?), '
+        '    block_timestamp=COALESCE(block_timestamp, ?), '
+        '    local_time=COALESCE(local_time, ?) '
+        'WHERE agreement_id=? AND stage=?'
+    )
+
+    update_stage_transaction = (
+        'UPDATE agreement_stage_timing '
+        'SET tx_hash=?, tx_submit_time=?, tx_mined_time=? '
+        'WHERE agreement_id=? AND stage=?'
+    )
+
+    # flush order of the write-behind queue, a row must exist before its updates
+    WRITE_BEHIND = (insert_agreement, insert_condition, update_condition_status,
+                    insert_stage, update_stage_transition, update_stage_transaction)
+
+
+def _percentile(sorted_values, percentile):
+    """Nearest-rank `percentile` (0-100) of a sorted list, None if it is empty."""
+    if not sorted_values:
+        return None
+    index = min(int(round(percentile / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _latency_summary(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': _percentile(values, 50),
+        'p95': _percentile(values, 95),
+        'p99': _percentile(values, 99),
     }
 
 
 class AgreementsStorage(StorageBase):
     """
     Provide storage for SEA service agreements in an sqlite3 database.
+
+    Large result sets can be streamed with the `iter_*` methods, which fetch rows from
+    the cursor `PAGE_SIZE` at a time and yield one `AgreementRecord` per agreement.
+
+    All instances on the same database file share the process wide connections of its
+    `ConnectionManager`, so creating an instance is cheap and does not open a connection.
+
+    With `write_behind` enabled, agreement and condition status writes are queued and
+    written in batches. Reads and checkpoint updates flush the queue first, so the store
+    never exposes a checkpoint ahead of the agreements it covers.
     """
 
+    PAGE_SIZE = 500
+
+    def __init__(self, storage_path, write_behind=False, max_batch_size=None,
+                 flush_interval=None):
+        """
+
+        :param storage_path: str path of the sqlite database file
+        :param write_behind: bool queue writes and apply them in batches
+        :param max_batch_size: int number of queued rows that triggers a flush
+        :param flush_interval: float max seconds a write stays queued
+        """
+        # connections are owned by the ConnectionManager instead of `StorageBase`
+        self._storage_path = storage_path
+        self._conn = None
+        self._connections = ConnectionManager.get(storage_path)
+        if write_behind:
+            self._connections.enable_write_behind(
+                WriteStatements.WRITE_BEHIND,
+                max_batch_size=max_batch_size,
+                flush_interval=flush_interval
+            )
+
+    @property
+    def write_behind(self):
+        """The WriteBehindQueue shared by all instances on this database, or None."""
+        return self._connections.write_behind
+
+    def _write(self, statement, args):
+        if self.write_behind is not None:
+            self.write_behind.add(statement, args)
+        else:
+            self._run_query(statement, args)
+
+    def flush(self):
+        """Write all queued rows to the database."""
+        if self.write_behind is not None:
+            self.write_behind.flush()
+
+    def _run_query(self, query, args=None):
+        return self._connections.execute(query, args)
+
     def create_tables(self):
-        for create_table_query in DatabaseSchema.SCHEMA.values():
-            self._run_query(create_table_query)
+        self.migrate()
+
+    def get_schema_version(self):
+        return self._run_query('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self):
+        """Bring the database schema up to `DatabaseSchema.VERSION`.
+
+        Each pending migration runs in its own transaction together with the bump of
+        the `user_version` pragma, so an interrupted upgrade resumes where it stopped.
+
+        :return: int schema version of the database
+        """
+        version = self.get_schema_version()
+        for next_version in range(version + 1, DatabaseSchema.VERSION + 1):
+            with self._connections.transaction() as conn:
+                for statement in DatabaseSchema.MIGRATIONS[next_version - 1]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version={next_version}')
+            logger.info(f'migrated agreements db {self._storage_path} '
+                        f'to schema version {next_version}')
+            version = next_version
+        return version
 
     def record_service_agreement(self, agreement_id, did, service_index, price,
                                  urls, consumer, start_time, block_number,
-                                 agreement_type, conditions):
+                                 agreement_type, conditions, provider=None):
         """
         Records the given pending service agreement.
 
@@ -54,26 +283,19 @@ class AgreementsStorage(StorageBase):
         :param block_number: int
         :param agreement_type: str type of agreement such as 'Access`, `Compute`, ...
         :param conditions: list of str represent names of conditions associated with this agreement
+        :param provider: hex str address of the provider account serving the agreement
         :return:
         """
         logger.debug(f'Recording agreement info to `service_agreements` storage: '
                      f'agreementId={agreement_id}, did={did},'
                      f'service_index={service_index}, price={price}')
-        self._run_query(
-            'INSERT OR REPLACE INTO '
-            'agreement(agreement_id, did, service_index, price, urls, consumer, '
-            '          start_time, block_number, type) '
-            'VALUES (?,?,?,?,?,?,?,?,?) ',
+        self._write(
+            WriteStatements.insert_agreement,
             (agreement_id, did, service_index,
-             str(price), urls, consumer, start_time, block_number, agreement_type),
+             str(price), urls, consumer, start_time, block_number, agreement_type, provider),
         )
         for cond in conditions:
-            self._run_query(
-                'INSERT OR REPLACE INTO '
-                'agreement_condition(agreement_id, condition_name, status) '
-                'VALUES(?,?,?) ',
-                (agreement_id, cond, 1)
-            )
+            self._write(WriteStatements.insert_condition, (agreement_id, cond, 1))
 
     def update_condition_status(self, agreement_id, condition_name, status):
         """
@@ -87,13 +309,197 @@ class AgreementsStorage(StorageBase):
         assert 1 <= status <= 3
 
         logger.debug(f'Updating agreement {agreement_id} status to {status}')
-        self._run_query(
-            f'UPDATE agreement_condition '
-            f'SET status=? '
-            f'WHERE agreement_id=? AND condition_name=?',
+        self._write(
+            WriteStatements.update_condition_status,
             (status, agreement_id, condition_name),
         )
 
+    def record_stage_transition(self, agreement_id, stage, block_number, block_timestamp,
+                                local_time):
+        """Record when an agreement reached `stage`, e.g. a condition was fulfilled.
+
+        :param agreement_id: hex str the id of the service agreement
+        :param stage: str `AGREEMENT_CREATED_STAGE` or a condition name
+        :param block_number: int block of the event marking the transition
+        :param block_timestamp: int timestamp of that block, None if unknown
+        :param local_time: float local time at which the event was handled
+        """
+        self._write(WriteStatements.insert_stage, (agreement_id, stage))
+        self._write(
+            WriteStatements.update_stage_transition,
+            (block_number, block_timestamp, local_time, agreement_id, stage)
+        )
+
+    def record_stage_transaction(self, agreement_id, stage, tx_hash, submit_time, mined_time):
+        """Record the transaction sent by the provider to fulfill condition `stage`.
+
+        :param agreement_id: hex str the id of the service agreement
+        :param stage: str condition name
+        :param tx_hash: hex str hash of the fulfill transaction
+        :param submit_time: float local time at which the node accepted the transaction
+        :param mined_time: float local time at which its receipt was seen, None if never
+        """
+        self._write(WriteStatements.insert_stage, (agreement_id, stage))
+        self._write(
+            WriteStatements.update_stage_transaction,
+            (tx_hash, submit_time, mined_time, agreement_id, stage)
+        )
+
+    def get_blocks_without_timestamp(self):
+        """Return the block numbers of recorded stage transitions missing their timestamp."""
+        self.flush()
+        return [row[0] for row in self._run_query(
+            'SELECT DISTINCT block_number FROM agreement_stage_timing '
+            'WHERE block_timestamp IS NULL AND block_number IS NOT NULL'
+        )]
+
+    def set_block_timestamps(self, block_timestamps):
+        """Fill in the block timestamp of the stage transitions recorded without one.
+
+        :param block_timestamps: dict int block number -> int timestamp of the block
+        """
+        if not block_timestamps:
+            return
+
+        with self._connections.transaction() as conn:
+            conn.executemany(
+                'UPDATE agreement_stage_timing SET block_timestamp=? '
+                'WHERE block_timestamp IS NULL AND block_number=?',
+                [(timestamp, block_number)
+                 for block_number, timestamp in block_timestamps.items()]
+            )
+
+    def get_stage_timings(self, agreement_id):
+        """Return dict stage -> (block_number, block_timestamp, local_time, tx_hash,
+        tx_submit_time, tx_mined_time) of one agreement."""
+        self.flush()
+        rows = self._run_query(
+            'SELECT stage, block_number, block_timestamp, local_time, tx_hash, '
+            '       tx_submit_time, tx_mined_time '
+            'FROM agreement_stage_timing WHERE agreement_id=?',
+            (agreement_id,)
+        )
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def get_stage_latency_report(self, stages, since=None, until=None):
+        """Return p50/p95/p99 latencies of the agreement lifecycle stages in a time window.
+
+        Only agreements that reached a stage within `[since, until)` (local time) are
+        used for it, found through the `(stage, local_time)` index. Reported entries:
+
+        - `<previous stage>-><stage>`: seconds between the block timestamps of two
+          consecutive stages in `stages`
+        - `<stage>.observed`: seconds between the block timestamp of a stage and the
+          time the monitor handled it
+        - `<stage>.tx`: seconds between submitting the fulfill transaction of a
+          condition and seeing it mined
+
+        :param stages: list of str stage names in lifecycle order, e.g.
+            `[AGREEMENT_CREATED_STAGE, 'lockReward', 'accessSecretStore', 'escrowReward']`
+        :param since: float local time where the window starts, unbounded if None
+        :param until: float local time where the window ends, unbounded if None
+        :return: dict of entry name -> dict with `count`, `p50`, `p95` and `p99`
+        """
+        self.flush()
+        since = since if since is not None else float('-inf')
+        until = until if until is not None else float('inf')
+        report = {}
+        for i, stage in enumerate(stages):
+            if i > 0:
+                previous = stages[i - 1]
+                rows = self._run_query('''
+                    SELECT t.block_timestamp - f.block_timestamp
+                    FROM agreement_stage_timing AS t CROSS JOIN agreement_stage_timing AS f
+                    WHERE t.stage=? AND t.local_time>=? AND t.local_time<?
+                      AND f.agreement_id=t.agreement_id AND f.stage=?
+                      AND t.block_timestamp IS NOT NULL AND f.block_timestamp IS NOT NULL
+                ''', (stage, since, until, previous))
+                report[f'{previous}->{stage}'] = _latency_summary(row[0] for row in rows)
+
+            rows = list(self._run_query('''
+                SELECT local_time - block_timestamp, tx_mined_time - tx_submit_time
+                FROM agreement_stage_timing
+                WHERE stage=? AND local_time>=? AND local_time<?
+            ''', (stage, since, until)))
+            report[f'{stage}.observed'] = _latency_summary(
+                row[0] for row in rows if row[0] is not None)
+            report[f'{stage}.tx'] = _latency_summary(
+                row[1] for row in rows if row[1] is not None)
+
+        return report
+
+    def _iter_agreement_records(self, query, args, page_size):
+        """Stream the rows of `query` as one AgreementRecord per agreement.
+
+        `query` must select the agreement columns followed by the condition name, the
+        condition status and the provider, with the rows of each agreement next to each
+        other.
+        """
+        cursor = self._run_query(query, args)
+        record = None
+        while True:
+            rows = cursor.fetchmany(page_size or self.PAGE_SIZE)
+            if not rows:
+                break
+
+            for row in rows:
+                if record is None or record.agreement_id != row[0]:
+                    if record is not None:
+                        yield record
+                    record = AgreementRecord(*row[:9], {}, row[11])
+                record.conditions[row[9]] = row[10]
+
+        if record is not None:
+            yield record
+
+    @staticmethod
+    def _provider_filter(provider, args):
+        if provider is None:
+            return '', args
+        return 'AND a.provider=? ', args + (provider,)
+
+    def iter_agreements(self, since_block_number=0, page_size=None, provider=None):
+        """Iterate over agreements and all their conditions without loading them in memory.
+
+        :param since_block_number: int
+        :param page_size: int number of rows fetched from the cursor at a time
+        :param provider: hex str only agreements of this provider account, all if None
+        :return: iterator of AgreementRecord ordered by block number
+        """
+        provider_filter, args = self._provider_filter(provider, (since_block_number,))
+        # CROSS JOIN keeps `agreement` as the outer loop so rows stay grouped per agreement
+        query = f'''
+            SELECT a.agreement_id, did, service_index, price, urls, consumer, start_time, 
+                block_number, type, ac.condition_name, ac.status, a.provider 
+            FROM agreement AS a CROSS JOIN agreement_condition AS ac
+            WHERE a.agreement_id = ac.agreement_id 
+              AND a.block_number>=? 
+              {provider_filter}
+            ORDER BY a.block_number, a.agreement_id
+        '''
+        return self._iter_agreement_records(query, args, page_size)
+
+    def iter_pending_agreements(self, since_block_number=0, page_size=None, provider=None):
+        """Iterate over agreements with their unfulfilled conditions (status < 2).
+
+        :param since_block_number: int
+        :param page_size: int number of rows fetched from the cursor at a time
+        :param provider: hex str only agreements of this provider account, all if None
+        :return: iterator of AgreementRecord ordered by block number
+        """
+        provider_filter, args = self._provider_filter(provider, (since_block_number,))
+        query = f'''
+            SELECT a.agreement_id, did, service_index, price, urls, consumer, start_time, 
+                block_number, type, ac.condition_name, ac.status, a.provider 
+            FROM agreement AS a CROSS JOIN agreement_condition AS ac
+            WHERE a.agreement_id = ac.agreement_id 
+              AND a.block_number>=? 
+              AND ac.status<2
+              {provider_filter}
+            ORDER BY a.block_number, a.agreement_id
+        '''
+        return self._iter_agreement_records(query, args, page_size)
+
     def get_agreements(self, since_block_number=0):
         """
         Get service agreements matching the given status.
@@ -108,7 +514,8 @@ class AgreementsStorage(StorageBase):
                 block_number, type, ac.condition_name, ac.status 
 
             FROM agreement AS a, agreement_condition AS ac
-            WHERE a.block_number>=?;
+            WHERE a.agreement_id = ac.agreement_id 
+              AND a.block_number>=?;
         '''
 
         for row in self._run_query(query, (since_block_number,)):
@@ -172,6 +579,110 @@ class AgreementsStorage(StorageBase):
             logger.warning(f'db error getting agreement ids: {e}')
             return set()
 
+    def iter_agreement_ids(self, include_archive=False):
+        """Iterate over all known agreement ids without loading them all in memory.
+
+        :param include_archive: bool also yield the ids of archived agreements
+        """
+        query = 'SELECT agreement_id FROM agreement'
+        if include_archive:
+            query += ' UNION ALL SELECT agreement_id FROM agreement_archive'
+        for row in self._run_query(query):
+            yield row[0]
+
+    def has_agreement(self, agreement_id):
+        """Return True if `agreement_id` is recorded in the store, archived or not.
+
+        :param agreement_id: hex str the id of the service agreement
+        """
+        result = self._run_query(
+            'SELECT 1 FROM agreement WHERE agreement_id=? '
+            'UNION ALL '
+            'SELECT 1 FROM agreement_archive WHERE agreement_id=? ',
+            (agreement_id, agreement_id))
+        return result.fetchone() is not None
+
+    def archive_agreements(self, before_block_number, limit):
+        """Move up to `limit` finished agreements out of the hot tables.
+
+        An agreement is finished when none of its conditions is still unfulfilled
+        (status < 2), i.e. all were fulfilled or aborted. The agreement and its
+        conditions move to the archive tables in one short transaction.
+
+        :param before_block_number: int only agreements created before this block
+        :param limit: int max number of agreements to move
+        :return: int number of agreements archived
+        """
+        self.flush()
+        with self._connections.transaction() as conn:
+            agreement_ids = [row[0] for row in conn.execute(
+                '''
+                SELECT agreement_id 
+                FROM agreement AS a 
+                WHERE a.block_number<? 
+                  AND NOT EXISTS (
+                    SELECT 1 FROM agreement_condition AS ac 
+                    WHERE ac.agreement_id = a.agreement_id AND ac.status<2) 
+                LIMIT ?
+                ''',
+                (before_block_number, limit)
+            )]
+            if not agreement_ids:
+                return 0
+
+            id_list = ','.join('?' * len(agreement_ids))
+            conn.execute(
+                f'INSERT OR REPLACE INTO '
+                f'agreement_archive(agreement_id, did, service_index, price, urls, consumer, '
+                f'                  start_time, block_number, type, provider) '
+                f'SELECT agreement_id, did, service_index, price, urls, consumer, '
+                f'       start_time, block_number, type, provider '
+                f'FROM agreement WHERE agreement_id IN ({id_list})',
+                agreement_ids
+            )
+            conn.execute(
+                f'INSERT OR REPLACE INTO '
+                f'agreement_condition_archive(agreement_id, condition_name, status) '
+                f'SELECT agreement_id, condition_name, status '
+                f'FROM agreement_condition WHERE agreement_id IN ({id_list})',
+                agreement_ids
+            )
+            conn.execute(
+                f'DELETE FROM agreement_condition WHERE agreement_id IN ({id_list})',
+                agreement_ids)
+            conn.execute(
+                f'DELETE FROM agreement WHERE agreement_id IN ({id_list})', agreement_ids)
+
+        logger.debug(f'archived {len(agreement_ids)} agreements '
+                     f'created before block {before_block_number}')
+        return len(agreement_ids)
+
+    def rollback_agreements(self, from_block_number):
+        """Delete the agreements created at or after `from_block_number`, e.g. after a reorg.
+
+        :param from_block_number: int first block whose agreements are removed
+        :return: list of the removed agreement ids
+        """
+        self.flush()
+        with self._connections.transaction() as conn:
+            agreement_ids = [row[0] for row in conn.execute(
+                'SELECT agreement_id FROM agreement WHERE block_number>=?',
+                (from_block_number,)
+            )]
+            conn.execute(
+                'DELETE FROM agreement_condition WHERE agreement_id IN '
+                '(SELECT agreement_id FROM agreement WHERE block_number>=?)',
+                (from_block_number,)
+            )
+            conn.execute(
+                'DELETE FROM agreement_stage_timing WHERE agreement_id IN '
+                '(SELECT agreement_id FROM agreement WHERE block_number>=?)',
+                (from_block_number,)
+            )
+            conn.execute('DELETE FROM agreement WHERE block_number>=?', (from_block_number,))
+
+        return agreement_ids
+
     def get_agreement_ids_with_condition_status(self):
         try:
             agr_id_to_conditions = collections.defaultdict(dict)
@@ -181,7 +692,7 @@ class AgreementsStorage(StorageBase):
             '''
 
             for row in self._run_query(query, ()):
-                agr_id_to_conditions[row[0]][row[8]] = row[9]
+                agr_id_to_conditions[row[0]][row[1]] = row[2]
 
             return agr_id_to_conditions
         except Exception as e:
@@ -199,9 +710,48 @@ class AgreementsStorage(StorageBase):
         except Exception as e:
             logger.debug(f'error finding latest block number from db: {e}')
 
-    def get_agreement_count(self):
+    def get_checkpoint(self, name):
+        """Return the last block number recorded for the checkpoint `name`.
+
+        :param name: str name of the checkpoint, e.g. the event being tracked
+        :return: int block number or None if the checkpoint was never recorded
+        """
+        try:
+            result = self._run_query(
+                'SELECT block_number FROM block_checkpoint WHERE name=?', (name,))
+            row = result.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.debug(f'error reading block checkpoint {name}: {e}')
+
+    def update_checkpoint(self, name, block_number):
+        """Record `block_number` as the last fully processed block for checkpoint `name`.
+
+        Queued writes are flushed in the same transaction so the checkpoint only moves
+        once everything recorded before it is on disk.
+
+        :param name: str name of the checkpoint
+        :param block_number: int
+        """
+        args = (name, block_number)
+        if self.write_behind is not None:
+            self.write_behind.flush((WriteStatements.update_checkpoint, args))
+        else:
+            self._run_query(WriteStatements.update_checkpoint, args)
+
+    def get_agreement_count(self, include_archive=False, provider=None):
         try:
-            result = self._run_query('SELECT COUNT(agreement_id) FROM agreement ')
+            query = 'SELECT COUNT(agreement_id) FROM agreement '
+            archive_query = 'SELECT COUNT(agreement_id) FROM agreement_archive '
+            args = ()
+            if provider is not None:
+                query += 'WHERE provider=? '
+                archive_query += 'WHERE provider=? '
+                args = (provider,)
+            if include_archive:
+                query = f'SELECT ({query}) + ({archive_query})'
+                args = args * 2
+            result = self._run_query(query, args)
             return list(result)[0][0]
         except Exception as e:
             logger.debug(f'error counting agreements: {e}')
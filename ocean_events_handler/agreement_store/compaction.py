@@ -0,0 +1,89 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import threading
+
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+
+logger = logging.getLogger(__name__)
+
+
+class AgreementCompactor:
+    """Background job moving finished agreements from the hot tables to the archive.
+
+    Agreements whose conditions are all fulfilled or aborted and that were created more
+    than `min_block_age` blocks before the current block are archived in batches of
+    `batch_size`, one short transaction per batch, so the monitor's own writes are
+    never held up for long.
+    """
+    MIN_BLOCK_AGE = 5000
+    BATCH_SIZE = 200
+    INTERVAL = 300
+    STOP_TIMEOUT = 30
+
+    def __init__(self, storage_path, get_block_number, min_block_age=None, batch_size=None,
+                 interval=None):
+        """
+
+        :param storage_path: str path of the agreements sqlite database
+        :param get_block_number: callable returning the current block number
+        :param min_block_age: int number of blocks a finished agreement stays in the hot tables
+        :param batch_size: int max number of agreements archived per transaction
+        :param interval: float seconds between compaction runs
+        """
+        self._db = AgreementsStorage(storage_path)
+        self._get_block_number = get_block_number
+        self._min_block_age = int(min_block_age or self.MIN_BLOCK_AGE)
+        self._batch_size = int(batch_size or self.BATCH_SIZE)
+        self._interval = float(interval or self.INTERVAL)
+        self._stopped = threading.Event()
+        self._thread = None
+        self.num_archived = 0
+
+    def run_once(self):
+        """Archive all agreements that are due, one batch per transaction.
+
+        :return: int number of agreements archived
+        """
+        before_block = self._get_block_number() - self._min_block_age
+        if before_block <= 0:
+            return 0
+
+        total = 0
+        while not self._stopped.is_set():
+            num_archived = self._db.archive_agreements(before_block, self._batch_size)
+            total += num_archived
+            if num_archived < self._batch_size:
+                break
+
+        self.num_archived += total
+        if total:
+            logger.info(f'archived {total} finished agreements created before block '
+                        f'{before_block}')
+        return total
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f'agreements compaction failed: {e}')
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='agreements-compaction')
+        self._thread.start()
+
+    def stop(self):
+        """Stop the compaction thread and wait for a running batch to be committed."""
+        self._stopped.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(self.STOP_TIMEOUT)
+            if thread.is_alive():
+                logger.warning(f'agreements compaction did not stop within '
+                               f'{self.STOP_TIMEOUT} seconds')
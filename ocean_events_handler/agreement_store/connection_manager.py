@@ -0,0 +1,141 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from ocean_events_handler.agreement_store.write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Long-lived sqlite connections to one database file, shared by all threads of a process.
+
+    Writes go through a single writer connection guarded by a lock, reads use one
+    connection per thread. The database runs in WAL mode so readers do not block the
+    writer and vice versa. Connections are opened once and keep their prepared
+    statement cache for the lifetime of the process.
+    """
+    READ_STATEMENTS = ('SELECT', 'WITH', 'EXPLAIN')
+    CACHED_STATEMENTS = 256
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA cache_size=-16000',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA busy_timeout=5000',
+    )
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, storage_path):
+        self._storage_path = storage_path
+        self._in_memory = storage_path == ':memory:'
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._writer = self._open()
+        self.write_behind = None
+
+    @classmethod
+    def get(cls, storage_path):
+        """Return the process wide ConnectionManager of the database at `storage_path`."""
+        key = storage_path if storage_path == ':memory:' else os.path.abspath(storage_path)
+        with cls._managers_lock:
+            manager = cls._managers.get(key)
+            if manager is None:
+                manager = cls(storage_path)
+                cls._managers[key] = manager
+            return manager
+
+    @classmethod
+    def close_all(cls):
+        with cls._managers_lock:
+            managers = list(cls._managers.values())
+            cls._managers.clear()
+        for manager in managers:
+            manager.close()
+
+    def enable_write_behind(self, statements, max_batch_size=None, flush_interval=None):
+        """Buffer the given write statements in a `WriteBehindQueue` shared by all users.
+
+        :return: WriteBehindQueue
+        """
+        with self._write_lock:
+            if self.write_behind is None:
+                self.write_behind = WriteBehindQueue(
+                    self, statements, max_batch_size=max_batch_size,
+                    flush_interval=flush_interval
+                )
+            return self.write_behind
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self._storage_path,
+            check_same_thread=False,
+            cached_statements=self.CACHED_STATEMENTS
+        )
+        if not self._in_memory:
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+        return conn
+
+    def _reader(self):
+        if self._in_memory:
+            return self._writer
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._readers.append(conn)
+        return conn
+
+    @classmethod
+    def is_read_query(cls, query):
+        return query.lstrip().upper().startswith(cls.READ_STATEMENTS)
+
+    def execute(self, query, args=None):
+        """Run `query`, on the thread's reader connection if it is a read statement.
+
+        Pending write-behind rows are flushed first so reads always see earlier writes.
+
+        :return: cursor on the resulting rows
+        """
+        if self.write_behind is not None and len(self.write_behind):
+            self.write_behind.flush()
+
+        if self.is_read_query(query) and not self._in_memory:
+            return self._reader().execute(query, args or ())
+
+        with self._write_lock:
+            cursor = self._writer.execute(query, args or ())
+            self._writer.commit()
+            return cursor
+
+    @contextmanager
+    def transaction(self):
+        """Hold the writer connection for several statements committed together."""
+        with self._write_lock:
+            try:
+                if not self._writer.in_transaction:
+                    self._writer.execute('BEGIN')
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        if self.write_behind is not None:
+            self.write_behind.stop()
+        with self._write_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self._writer.close()
@@ -0,0 +1,105 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Buffer write statements and apply them with `executemany` in a single transaction.
+
+    Rows are grouped per statement and flushed in the order the statements were declared
+    (e.g. inserts before the updates that depend on them). A flush happens when
+    `max_batch_size` rows are pending, every `flush_interval` seconds, at exit, and
+    whenever the owner asks for it, e.g. before reading or advancing a checkpoint.
+    """
+    MAX_BATCH_SIZE = 500
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, connections, statements, max_batch_size=None, flush_interval=None):
+        """
+
+        :param connections: ConnectionManager of the database
+        :param statements: list of str sql statements accepted by `add`, in flush order
+        :param max_batch_size: int number of pending rows that triggers a flush
+        :param flush_interval: float max seconds a row stays in the queue
+        """
+        self._connections = connections
+        self._statements = list(statements)
+        self._max_batch_size = int(max_batch_size or self.MAX_BATCH_SIZE)
+        self._flush_interval = float(flush_interval or self.FLUSH_INTERVAL)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = self._new_batches()
+        self._num_pending = 0
+        self.num_flushes = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='write-behind')
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _new_batches(self):
+        return OrderedDict((statement, []) for statement in self._statements)
+
+    def __len__(self):
+        return self._num_pending
+
+    def add(self, statement, args):
+        assert statement in self._pending, f'unknown write-behind statement: {statement}'
+        with self._lock:
+            self._pending[statement].append(tuple(args))
+            self._num_pending += 1
+            is_full = self._num_pending >= self._max_batch_size
+
+        if is_full:
+            self.flush()
+
+    def flush(self, *extra_statements):
+        """Write all pending rows in one transaction.
+
+        :param extra_statements: (statement, args) tuples executed in the same transaction
+            after the pending rows, e.g. to advance a checkpoint atomically with them
+        """
+        with self._flush_lock:
+            with self._lock:
+                batches, self._pending = self._pending, self._new_batches()
+                num_rows, self._num_pending = self._num_pending, 0
+
+            if not num_rows and not extra_statements:
+                return
+
+            try:
+                with self._connections.transaction() as conn:
+                    for statement, rows in batches.items():
+                        if rows:
+                            conn.executemany(statement, rows)
+                    for statement, args in extra_statements:
+                        conn.execute(statement, args)
+            except Exception:
+                self._requeue(batches, num_rows)
+                raise
+
+            self.num_flushes += 1
+            logger.debug(f'write-behind flushed {num_rows} rows')
+
+    def _requeue(self, batches, num_rows):
+        with self._lock:
+            for statement, rows in self._pending.items():
+                batches[statement].extend(rows)
+            self._pending = batches
+            self._num_pending += num_rows
+
+    def _run(self):
+        while not self._stopped.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f'write-behind flush failed: {e}')
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
@@ -0,0 +1,86 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BlockRangeScanner:
+    """Scan a block range in adaptive windows instead of one large `eth_getLogs` span.
+
+    The window grows while calls come back quickly with few results and shrinks when
+    a call is slow, returns too many logs or fails. A failing window is retried with a
+    smaller size before the error is raised, so the caller can persist progress per
+    window and resume from the last completed one.
+    """
+    MIN_CHUNK_SIZE = 10
+    MAX_CHUNK_SIZE = 5000
+    INITIAL_CHUNK_SIZE = 500
+    TARGET_RESULTS = 200
+    TARGET_DURATION = 2.0
+    MAX_RETRIES = 3
+
+    def __init__(self, fetch_logs, min_chunk_size=None, max_chunk_size=None,
+                 initial_chunk_size=None, target_results=None, target_duration=None):
+        """
+
+        :param fetch_logs: callable(from_block, to_block) returning a list of event logs
+        :param min_chunk_size: int smallest number of blocks requested in one call
+        :param max_chunk_size: int largest number of blocks requested in one call
+        :param initial_chunk_size: int window size used for the first call
+        :param target_results: int number of logs per call above which the window shrinks
+        :param target_duration: float seconds per call above which the window shrinks
+        """
+        self._fetch_logs = fetch_logs
+        self._min_chunk_size = max(1, int(min_chunk_size or self.MIN_CHUNK_SIZE))
+        self._max_chunk_size = max(self._min_chunk_size,
+                                   int(max_chunk_size or self.MAX_CHUNK_SIZE))
+        self._target_results = int(target_results or self.TARGET_RESULTS)
+        self._target_duration = float(target_duration or self.TARGET_DURATION)
+        self._chunk_size = self._clamp(int(initial_chunk_size or self.INITIAL_CHUNK_SIZE))
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    def _clamp(self, size):
+        return max(self._min_chunk_size, min(self._max_chunk_size, size))
+
+    def _shrink(self):
+        self._chunk_size = self._clamp(self._chunk_size // 2)
+
+    def _adjust(self, num_results, duration):
+        if num_results > self._target_results or duration > self._target_duration:
+            self._shrink()
+        elif num_results < self._target_results // 2 and duration < self._target_duration / 2:
+            self._chunk_size = self._clamp(self._chunk_size * 2)
+
+    def scan(self, from_block, to_block):
+        """Generate `(chunk_from, chunk_to, logs)` for consecutive windows covering the range.
+
+        :param from_block: int first block to scan (inclusive)
+        :param to_block: int last block to scan (inclusive)
+        :return: generator of tuples, one per window
+        """
+        current = from_block
+        retries = 0
+        while current <= to_block:
+            chunk_to = min(current + self._chunk_size - 1, to_block)
+            start = time.time()
+            try:
+                logs = self._fetch_logs(current, chunk_to)
+            except Exception as e:
+                retries += 1
+                if retries > self.MAX_RETRIES or self._chunk_size == self._min_chunk_size:
+                    raise
+                self._shrink()
+                logger.debug(f'getting logs in range {current} to {chunk_to} failed ({e}), '
+                             f'retrying with window size {self._chunk_size}')
+                continue
+
+            retries = 0
+            self._adjust(len(logs), time.time() - start)
+            yield current, chunk_to, logs
+            current = chunk_to + 1
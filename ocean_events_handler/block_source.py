@@ -0,0 +1,222 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import itertools
+import json
+import logging
+import socket
+import threading
+import time
+from collections import deque
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+class PollingBlockSource:
+    """Block source that asks the node for the block number and sleeps between polls."""
+
+    def __init__(self, web3):
+        """
+
+        :param web3: Web3 instance
+        """
+        self._web3 = web3
+
+    @property
+    def is_subscribed(self):
+        return False
+
+    def get_block_number(self):
+        return self._web3.eth.blockNumber
+
+    def wait_for_new_block(self, after_block, timeout):
+        """Wait until a block after `after_block` may be available.
+
+        :param after_block: int last block processed by the caller
+        :param timeout: float max seconds to wait
+        """
+        time.sleep(timeout)
+
+    def pop_logs(self):
+        """Return the logs pushed by the node since the last call."""
+        return []
+
+    def stop(self):
+        pass
+
+
+class SubscriptionBlockSource(PollingBlockSource):
+    """Block source fed by `eth_subscribe` notifications over a WebSocket or IPC connection.
+
+    New block headers (`newHeads`) wake up waiters as soon as the node imports a block,
+    and logs matching `log_filter` are queued for `pop_logs` as they are emitted. While
+    the connection is down the source behaves like `PollingBlockSource` and keeps
+    reconnecting in the background.
+    """
+    RECONNECT_INTERVAL = 5
+    MAX_PENDING_LOGS = 10000
+
+    def __init__(self, web3, uri, log_filter=None):
+        """
+
+        :param web3: Web3 instance used while the subscription is not available
+        :param uri: str `ws://` or `wss://` url, or path of the node IPC socket
+        :param log_filter: dict with `address` and `topics` of the logs to subscribe to
+        """
+        super().__init__(web3)
+        self._uri = uri
+        self._log_filter = log_filter
+        self._request_ids = itertools.count(1)
+        self._subscriptions = {}
+        self._latest_block = None
+        self._logs = deque(maxlen=self.MAX_PENDING_LOGS)
+        self._connected = False
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='block-subscription')
+        self._thread.start()
+
+    @property
+    def is_subscribed(self):
+        return self._connected
+
+    @property
+    def latest_block(self):
+        return self._latest_block
+
+    def get_block_number(self):
+        if self._connected and self._latest_block is not None:
+            return self._latest_block
+        return super().get_block_number()
+
+    def wait_for_new_block(self, after_block, timeout):
+        if not self._connected:
+            return super().wait_for_new_block(after_block, timeout)
+
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._logs or not self._connected or (
+                    self._latest_block is not None and self._latest_block > after_block),
+                timeout
+            )
+
+    def pop_logs(self):
+        with self._cond:
+            logs = list(self._logs)
+            self._logs.clear()
+        return logs
+
+    def stop(self):
+        self._stopped.set()
+
+    def _subscribe_requests(self):
+        requests = {next(self._request_ids): ['newHeads']}
+        if self._log_filter:
+            requests[next(self._request_ids)] = ['logs', self._log_filter]
+        return requests
+
+    def _handle_message(self, message, pending_requests):
+        if message.get('method') == 'eth_subscription':
+            params = message['params']
+            kind = self._subscriptions.get(params['subscription'])
+            result = params['result']
+            with self._cond:
+                if kind == 'newHeads':
+                    self._latest_block = int(result['number'], 16)
+                elif kind == 'logs' and not result.get('removed'):
+                    self._logs.append(result)
+                self._cond.notify_all()
+            return
+
+        request = pending_requests.pop(message.get('id'), None)
+        if request is None:
+            return
+        if 'error' in message:
+            raise ConnectionError(f'eth_subscribe {request[0]} failed: {message["error"]}')
+
+        self._subscriptions[message['result']] = request[0]
+        if not pending_requests:
+            self._set_connected(True)
+            logger.info(f'subscribed to {", ".join(self._subscriptions.values())} '
+                        f'at {self._uri}')
+
+    def _set_connected(self, connected):
+        with self._cond:
+            self._connected = connected
+            self._cond.notify_all()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._subscriptions = {}
+            try:
+                if self._uri.startswith(('ws://', 'wss://')):
+                    loop = asyncio.new_event_loop()
+                    try:
+                        loop.run_until_complete(self._run_websocket())
+                    finally:
+                        loop.close()
+                else:
+                    self._run_ipc()
+            except Exception as e:
+                logger.warning(f'block subscription at {self._uri} unavailable, '
+                               f'falling back to polling: {e}')
+
+            self._set_connected(False)
+            self._stopped.wait(self.RECONNECT_INTERVAL)
+
+    async def _run_websocket(self):
+        async with websockets.connect(self._uri) as ws:
+            requests = self._subscribe_requests()
+            for request_id, params in requests.items():
+                await ws.send(json.dumps({
+                    'jsonrpc': '2.0', 'id': request_id, 'method': 'eth_subscribe',
+                    'params': params
+                }))
+            while not self._stopped.is_set():
+                self._handle_message(json.loads(await ws.recv()), requests)
+
+    def _run_ipc(self):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self._uri)
+            requests = self._subscribe_requests()
+            for request_id, params in requests.items():
+                conn.sendall(json.dumps({
+                    'jsonrpc': '2.0', 'id': request_id, 'method': 'eth_subscribe',
+                    'params': params
+                }).encode('utf-8'))
+
+            # the IPC stream is a sequence of JSON documents without delimiters
+            decoder = json.JSONDecoder()
+            buffer = ''
+            while not self._stopped.is_set():
+                data = conn.recv(65536)
+                if not data:
+                    raise ConnectionError('connection closed by the node')
+                buffer += data.decode('utf-8')
+                while buffer:
+                    buffer = buffer.lstrip()
+                    try:
+                        message, end = decoder.raw_decode(buffer)
+                    except ValueError:
+                        break
+                    buffer = buffer[end:]
+                    self._handle_message(message, requests)
+        finally:
+            conn.close()
+
+
+def create_block_source(web3, uri=None, log_filter=None):
+    """Return a subscription based block source if `uri` is set, a polling one otherwise.
+
+    :param web3: Web3 instance
+    :param uri: str WebSocket url or IPC socket path of the node
+    :param log_filter: dict with `address` and `topics` of the logs to subscribe to
+    """
+    if not uri:
+        return PollingBlockSource(web3)
+
+    return SubscriptionBlockSource(web3, uri, log_filter=log_filter)
@@ -0,0 +1,274 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+from collections import defaultdict, namedtuple
+from threading import Event, Lock, Thread
+
+from eth_utils import encode_hex, event_abi_to_log_topic
+from web3 import Web3
+from web3.utils.events import get_event_data
+
+from ocean_events_handler.poll_scheduler import AdaptivePollScheduler
+
+logger = logging.getLogger(__name__)
+
+Subscription = namedtuple(
+    'Subscription', ('agreement_id', 'callback', 'args', 'timeout_callback', 'expires_at'))
+
+
+class ConditionEventDispatcher:
+    """Watch the `Fulfilled` event of one condition contract on behalf of all agreements.
+
+    Instead of one polling watcher per agreement condition, a single thread polls the
+    condition contract logs once per new block range and routes each log through an
+    agreement id lookup table to the callbacks registered with `subscribe`. The number
+    of threads and RPC calls does not depend on the number of open agreements.
+
+    Subscriptions starting at a block that was already polled are caught up with one
+    extra `eth_getLogs` per poll filtered on all of their agreement ids.
+
+    The chain head is pushed with `set_head` by the agreement events monitor, which
+    already reads it on every loop, so the dispatcher only queries the node when a new
+    block is known. Until a head is pushed the dispatcher reads `eth.blockNumber` itself
+    and waits between polls as told by an `AdaptivePollScheduler`.
+    """
+    # seconds between subscription timeout checks while waiting for a new head
+    POLL_INTERVAL = 0.5
+    MAX_IDS_PER_BACKFILL = 100
+    STOP_TIMEOUT = 10
+
+    def __init__(self, web3, condition_contract, callback_executor=None, poll_interval=None,
+                 poll_scheduler=None):
+        """
+
+        :param web3: Web3 instance
+        :param condition_contract: keeper condition contract (`ConditionBase`)
+        :param callback_executor: optional `concurrent.futures.Executor` running the callbacks,
+            callbacks run on the dispatcher thread when not given
+        :param poll_interval: float seconds between timeout checks while waiting for a head
+        :param poll_scheduler: `AdaptivePollScheduler` used until a head is pushed
+        """
+        self._web3 = web3
+        self._contract = condition_contract
+        self._executor = callback_executor
+        self._poll_interval = poll_interval or self.POLL_INTERVAL
+        self._poll_scheduler = poll_scheduler or AdaptivePollScheduler()
+        self._event_abi = getattr(
+            condition_contract.events, condition_contract.FULFILLED_EVENT)._get_event_abi()
+        self._topic = encode_hex(event_abi_to_log_topic(self._event_abi))
+
+        self._lock = Lock()
+        self._subscriptions = defaultdict(list)
+        self._backfill = {}
+        self._next_block = None
+        self._head = None
+        self._new_head = Event()
+        self._thread = None
+        self._is_running = False
+
+    @property
+    def name(self):
+        return self._contract.CONTRACT_NAME
+
+    @property
+    def num_subscriptions(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+    def set_head(self, block_number):
+        """Record the latest chain head and wake up the dispatcher if it moved.
+
+        :param block_number: int latest block number
+        """
+        with self._lock:
+            if self._head is not None and block_number <= self._head:
+                return
+            self._head = block_number
+        self._new_head.set()
+
+    def subscribe(self, agreement_id, timeout, callback, args, from_block=None,
+                  timeout_callback=None):
+        """Register `callback` for the next `Fulfilled` event of `agreement_id`.
+
+        Mirrors `ConditionBase.subscribe_condition_fulfilled`: the callback is called as
+        `callback(event, *args)`, and on timeout `timeout_callback(*args)` is called if
+        given, otherwise `callback(None, *args)`.
+
+        :param agreement_id: hex str id of the agreement
+        :param timeout: int seconds to wait for the event
+        :param callback: callable
+        :param args: tuple of extra arguments passed to the callback
+        :param from_block: int first block where the event can be found
+        :param timeout_callback: callable
+        """
+        agreement_id = agreement_id.lower()
+        subscription = Subscription(
+            agreement_id, callback, tuple(args or ()), timeout_callback,
+            time.time() + timeout if timeout else None
+        )
+        with self._lock:
+            self._subscriptions[agreement_id].append(subscription)
+            if from_block is not None and \
+                    (self._next_block is None or from_block < self._next_block):
+                self._backfill[agreement_id] = min(
+                    from_block, self._backfill.get(agreement_id, from_block))
+
+        self.start()
+
+    def unsubscribe(self, agreement_id):
+        """Drop all subscriptions of `agreement_id` without calling their callbacks.
+
+        :return: int number of subscriptions removed
+        """
+        agreement_id = agreement_id.lower()
+        with self._lock:
+            self._backfill.pop(agreement_id, None)
+            return len(self._subscriptions.pop(agreement_id, []))
+
+    def start(self):
+        with self._lock:
+            if self._is_running:
+                return
+
+            self._is_running = True
+            self._thread = Thread(target=self._run, daemon=True,
+                                  name=f'{self.name}-dispatcher')
+            self._thread.start()
+
+    def stop(self):
+        """Stop the dispatcher thread and drop all subscriptions without calling them."""
+        with self._lock:
+            self._is_running = False
+            thread, self._thread = self._thread, None
+            self._subscriptions.clear()
+            self._backfill.clear()
+        self._new_head.set()
+        if thread is not None:
+            thread.join(self.STOP_TIMEOUT)
+        self._new_head.clear()
+
+    def _run(self):
+        while self._is_running:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.debug(f'{self.name} dispatcher: error getting condition events: {e}')
+
+            if self._head is None:
+                time.sleep(self._poll_scheduler.next_delay())
+            elif self._new_head.wait(self._poll_interval):
+                self._new_head.clear()
+
+    def poll(self):
+        """Fetch new `Fulfilled` logs once and dispatch them to the subscribed callbacks."""
+        with self._lock:
+            has_subscriptions = bool(self._subscriptions)
+        if has_subscriptions:
+            to_block = self._head
+            if to_block is None:
+                to_block = self._web3.eth.blockNumber
+                self._poll_scheduler.observe(to_block)
+            with self._lock:
+                if self._next_block is None:
+                    self._next_block = to_block
+                from_block = self._next_block
+
+            self._process_backfill(from_block - 1)
+            if from_block <= to_block:
+                events = self._get_logs(from_block, to_block)
+                # advance before dispatching so later subscriptions get backfilled
+                with self._lock:
+                    self._next_block = to_block + 1
+                self._dispatch(events)
+
+        self._expire_subscriptions()
+
+    def _process_backfill(self, to_block):
+        with self._lock:
+            pending = list(self._backfill.items())[:self.MAX_IDS_PER_BACKFILL]
+            for agreement_id, _ in pending:
+                del self._backfill[agreement_id]
+
+        if not pending or to_block < 0:
+            return
+
+        from_block = min(block for _, block in pending)
+        if from_block > to_block:
+            return
+
+        agreement_topics = [encode_hex(Web3.toBytes(hexstr=_id)) for _id, _ in pending]
+        try:
+            self._dispatch(self._get_logs(from_block, to_block, agreement_topics))
+        except Exception:
+            with self._lock:
+                for agreement_id, block in pending:
+                    self._backfill.setdefault(agreement_id, block)
+            raise
+
+    def _get_logs(self, from_block, to_block, agreement_topics=None):
+        topics = [self._topic]
+        if agreement_topics:
+            topics.append(agreement_topics)
+
+        return [
+            get_event_data(self._event_abi, log)
+            for log in self._web3.eth.getLogs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': self._contract.address,
+                'topics': topics
+            })
+        ]
+
+    def _dispatch(self, events):
+        for event in events:
+            agreement_id = Web3.toHex(event.args['_agreementId']).lower()
+            with self._lock:
+                subscriptions = self._subscriptions.pop(agreement_id, [])
+                self._backfill.pop(agreement_id, None)
+
+            for subscription in subscriptions:
+                self._call(subscription.callback, event, *subscription.args)
+
+    def _expire_subscriptions(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for agreement_id in list(self._subscriptions.keys()):
+                subscriptions = self._subscriptions[agreement_id]
+                active = [s for s in subscriptions if not s.expires_at or s.expires_at > now]
+                if len(active) == len(subscriptions):
+                    continue
+
+                expired.extend(s for s in subscriptions if s.expires_at and s.expires_at <= now)
+                if active:
+                    self._subscriptions[agreement_id] = active
+                else:
+                    del self._subscriptions[agreement_id]
+                    self._backfill.pop(agreement_id, None)
+
+        for subscription in expired:
+            logger.debug(f'{self.name} dispatcher: subscription for agreement '
+                         f'{subscription.agreement_id} timed out.')
+            if subscription.timeout_callback is not None:
+                self._call(subscription.timeout_callback, *subscription.args)
+            elif subscription.callback is not None:
+                self._call(subscription.callback, None, *subscription.args)
+
+    def _call(self, fn, *args):
+        if fn is None:
+            return
+
+        if self._executor is not None:
+            self._executor.submit(self._safe_call, fn, *args)
+        else:
+            self._safe_call(fn, *args)
+
+    def _safe_call(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f'{self.name} dispatcher: error in event callback {fn}: {e}',
+                         exc_info=1)
@@ -0,0 +1,79 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class DDOCache:
+    """Size bounded LRU cache of resolved DDOs keyed by DID, with a time-to-live.
+
+    Entries are dropped when they expire, when the cache is full and they are the least
+    recently used, or when `invalidate` is called for their DID (e.g. after the
+    DIDRegistry emitted a new attribute for it).
+    """
+    MAX_SIZE = 1000
+    TTL = 600
+
+    def __init__(self, resolve, max_size=None, ttl=None):
+        """
+
+        :param resolve: callable(did) returning the DDO for a DID, called on cache misses
+        :param max_size: int max number of cached DDOs
+        :param ttl: float seconds a cached DDO stays valid
+        """
+        self._resolve = resolve
+        self._max_size = int(max_size or self.MAX_SIZE)
+        self._ttl = float(ttl or self.TTL)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, did):
+        with self._lock:
+            entry = self._entries.get(did)
+            return bool(entry and entry[1] > time.time())
+
+    def get(self, did):
+        """Return the DDO of `did`, resolving it if it is not cached or has expired.
+
+        :param did: DID, str in the format `did:op:0xXXX`
+        :return: DDO instance
+        """
+        with self._lock:
+            entry = self._entries.get(did)
+            if entry and entry[1] > time.time():
+                self._entries.move_to_end(did)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        ddo = self._resolve(did)
+        if ddo is not None:
+            with self._lock:
+                self._entries[did] = (ddo, time.time() + self._ttl)
+                self._entries.move_to_end(did)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+        return ddo
+
+    def invalidate(self, did):
+        with self._lock:
+            if self._entries.pop(did, None) is not None:
+                logger.debug(f'invalidated cached ddo of {did}')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -1,14 +1,33 @@
 #  Copyright 2018 Ocean Protocol Foundation
 #  SPDX-License-Identifier: Apache-2.0
 
+from collections import namedtuple
+
+from ocean_utils.agreements.service_types import ServiceTypes
+
 from ocean_events_handler.event_handlers import (
     accessSecretStore,
-    escrowRewardCondition,
-    lockRewardCondition
+    lockRewardCondition,
+    lockRewardExecutionCondition
 )
 
+# `handler` fulfills the `fulfills` condition, `delay` seconds after the event it handles
+ConditionHandler = namedtuple('ConditionHandler', ('fulfills', 'handler', 'delay'))
+
+# agreement type -> name of the condition whose `Fulfilled` event triggers the handler
 event_handlers_map = {
-    'accessSecretStore': accessSecretStore,
-    'escrowRewardCondition': escrowRewardCondition,
-    'lockRewardCondition': lockRewardCondition
-}
\ No newline at end of file
+    ServiceTypes.ASSET_ACCESS: {
+        'lockReward': ConditionHandler(
+            'accessSecretStore', lockRewardCondition.fulfillAccessSecretStoreCondition, 0),
+        'accessSecretStore': ConditionHandler(
+            'escrowReward', accessSecretStore.fulfillEscrowRewardCondition,
+            accessSecretStore.ESCROW_REWARD_DELAY),
+    },
+    ServiceTypes.CLOUD_COMPUTE: {
+        'lockReward': ConditionHandler(
+            'execCompute', lockRewardExecutionCondition.fulfillExecComputeCondition, 0),
+        'execCompute': ConditionHandler(
+            'escrowReward', accessSecretStore.fulfillEscrowRewardCondition,
+            accessSecretStore.ESCROW_REWARD_DELAY),
+    }
+}
@@ -3,14 +3,19 @@
 #  SPDX-License-Identifier: Apache-2.0
 
 import logging
-import time
 
 from ocean_keeper.keeper import Keeper
-from ocean_keeper.utils import process_fulfill_condition
 from ocean_keeper.web3_provider import Web3Provider
 
+from ocean_events_handler.event_handlers.utils import process_fulfill_condition
+from ocean_events_handler.rpc_batch import ConditionStateReader
+
 logger = logging.getLogger(__name__)
 
+# seconds to wait after the access/compute condition is fulfilled before releasing the
+# reward, callers schedule `fulfill_escrow_reward_condition` with this delay
+ESCROW_REWARD_DELAY = 5
+
 
 def fulfill_escrow_reward_condition(event, agreement_id, service_agreement, price, consumer_address,
                                     publisher_account, condition_ids, escrow_condition_id):
@@ -32,7 +37,7 @@ def fulfill_escrow_reward_condition(event, agreement_id, service_agreement, pric
         return
 
     keeper = Keeper.get_instance()
-    if keeper.condition_manager.get_condition_state(escrow_condition_id) > 1:
+    if ConditionStateReader.get_instance().get_condition_state(escrow_condition_id) > 1:
         logger.debug(
             f'escrow reward condition already fulfilled/aborted: '
             f'agreementId={agreement_id}, escrow reward conditionId={escrow_condition_id}'
@@ -49,8 +54,6 @@ def fulfill_escrow_reward_condition(event, agreement_id, service_agreement, pric
                  f'conditionIds={condition_ids}')
     assert price == service_agreement.get_price(), 'price mismatch.'
     assert isinstance(price, int), f'price expected to be int type, got type "{type(price)}"'
-    time.sleep(5)
-    keeper = Keeper.get_instance()
     did_owner = keeper.agreement_manager.get_agreement_did_owner(agreement_id)
     args = (
         agreement_id,
@@ -5,9 +5,11 @@ import logging
 
 from eth_utils import add_0x_prefix
 from ocean_keeper.keeper import Keeper
-from ocean_keeper.utils import process_fulfill_condition
 from ocean_utils.did import did_to_id
 
+from ocean_events_handler.event_handlers.utils import process_fulfill_condition
+from ocean_events_handler.rpc_batch import ConditionStateReader
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +33,7 @@ def fulfill_access_secret_store_condition(event, agreement_id, did, service_agre
         return
 
     keeper = Keeper.get_instance()
-    if keeper.condition_manager.get_condition_state(access_condition_id) > 1:
+    if ConditionStateReader.get_instance().get_condition_state(access_condition_id) > 1:
         logger.debug(
             f'access secretstore condition already fulfilled/aborted: '
             f'agreementId={agreement_id}, access secretstore conditionId={access_condition_id}'
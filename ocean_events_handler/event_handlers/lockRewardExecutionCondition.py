@@ -5,9 +5,11 @@ import logging
 
 from eth_utils import add_0x_prefix
 from ocean_keeper.keeper import Keeper
-from ocean_keeper.utils import process_fulfill_condition
 from ocean_utils.did import did_to_id
 
+from ocean_events_handler.event_handlers.utils import process_fulfill_condition
+from ocean_events_handler.rpc_batch import ConditionStateReader
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +33,7 @@ def fulfill_exec_compute_condition(event, agreement_id, did, service_agreement,
         return
 
     keeper = Keeper.get_instance()
-    if keeper.condition_manager.get_condition_state(exec_compute_condition_id) > 1:
+    if ConditionStateReader.get_instance().get_condition_state(exec_compute_condition_id) > 1:
         logger.debug(
             f'exec compute condition already fulfilled/aborted: '
             f'agreementId={agreement_id}, exec compute conditionId={exec_compute_condition_id}'
@@ -0,0 +1,169 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+
+from ocean_keeper.utils import process_tx_receipt
+from ocean_keeper.web3_provider import Web3Provider
+
+from ocean_events_handler.metrics import MetricsRegistry
+from ocean_events_handler.nonce_manager import NonceManager
+from ocean_events_handler.rpc_batch import ConditionStateReader
+
+logger = logging.getLogger(__name__)
+
+_metrics = MetricsRegistry.get_instance()
+FULFILL_SECONDS = _metrics.histogram(
+    'events_monitor_fulfill_seconds', 'Duration of condition fulfillments including retries.',
+    ('condition', 'result'), buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600))
+FULFILL_ATTEMPTS = _metrics.counter(
+    'events_monitor_fulfill_attempts_total', 'Condition fulfill transactions attempted.',
+    ('condition',))
+
+_fulfillment_listeners = []
+
+
+def add_fulfillment_listener(listener):
+    """Register `listener(agreement_id, contract_name, tx_hash, submit_time, mined_time)`.
+
+    It is called for every fulfill transaction accepted by the node, with `mined_time`
+    None when its receipt did not show up.
+    """
+    if listener not in _fulfillment_listeners:
+        _fulfillment_listeners.append(listener)
+
+
+def remove_fulfillment_listener(listener):
+    if listener in _fulfillment_listeners:
+        _fulfillment_listeners.remove(listener)
+
+
+def _notify_fulfillment(agreement_id, contract_name, tx_hash, submit_time, mined_time):
+    for listener in list(_fulfillment_listeners):
+        try:
+            listener(agreement_id, contract_name, tx_hash, submit_time, mined_time)
+        except Exception as e:
+            logger.debug(f'fulfillment listener failed for agreement {agreement_id}: {e}')
+
+
+def get_private_key(web3, account):
+    """Return the private key of `account`, decrypting its encrypted key if needed."""
+    if not account.password:
+        return account.key
+
+    return web3.eth.account.decrypt(account.key, account.password)
+
+
+def build_fulfill_transaction(condition_contract, args):
+    """Return the unsigned `fulfill` transaction of `condition_contract`, without a nonce.
+
+    :param args: tuple arguments of `condition_contract.fulfill`, the last one is the
+        Account sending the transaction
+    """
+    account = args[-1]
+    contract_fn = condition_contract.contract.functions.fulfill(*args[:-1])
+    tx = {'from': account.address, 'to': condition_contract.address,
+          'data': contract_fn._encode_transaction_data()}
+    tx['gas'] = contract_fn.estimateGas({'from': account.address})
+    return tx
+
+
+def process_fulfill_condition(args, condition_contract, condition_id, logger_handle, keeper,
+                              num_tries=10):
+    """
+    Fulfill a condition, retrying up to `num_tries` times.
+
+    Works like `ocean_keeper.utils.process_fulfill_condition` with the transaction nonces
+    coming from the `NonceManager` of the sending account. A failed send releases its
+    nonce. A transaction whose receipt does not show up in time is waited for again, and
+    replaced at the same nonce once stuck, so at most one fulfill transaction per nonce can
+    be mined; a new nonce is only taken once the previous one is mined without fulfilling
+    the condition.
+
+    :param args: tuple arguments of `condition_contract.fulfill`, the last one is the
+        Account sending the transaction
+    :param condition_contract: keeper condition contract
+    :param condition_id: hex str id of the condition to fulfill
+    :param logger_handle: logger
+    :param keeper: Keeper instance
+    :param num_tries: int
+    """
+    if not logger_handle:
+        logger_handle = logger
+
+    web3 = Web3Provider.get_web3()
+    account = args[-1]
+    nonce_manager = NonceManager.get(web3, account.address)
+    state_reader = ConditionStateReader.get_instance()
+    contract_name = condition_contract.CONTRACT_NAME
+    agreement_id = args[0]
+    attempts = FULFILL_ATTEMPTS.labels(contract_name)
+    private_key = get_private_key(web3, account)
+    start = time.time()
+    result = 'failed'
+    nonce = None
+    tx_hash = None
+    submit_time = None
+    for i in range(num_tries):
+        try:
+            if nonce is not None:
+                # the transaction of `nonce` is still pending, sending another one with a
+                # new nonce could fulfill twice; wait for it or for its replacement
+                nonce_manager.replace_stuck_transactions(private_key)
+                sent = nonce_manager.in_flight.get(nonce)
+                if sent is not None:
+                    tx_hash = sent[0]
+                elif not nonce_manager.is_mined(nonce):
+                    # dropped by the node, the released nonce may be used by another one
+                    nonce = None
+            if nonce is None:
+                tx = build_fulfill_transaction(condition_contract, args)
+                tx_hash = None
+                nonce = nonce_manager.allocate()
+                attempts.inc()
+                tx_hash = nonce_manager.send_transaction(tx, private_key, nonce)
+                submit_time = time.time()
+
+            success = process_tx_receipt(
+                tx_hash,
+                getattr(condition_contract.contract.events, condition_contract.FULFILLED_EVENT)(),
+                f'{contract_name}.Fulfilled'
+            )
+            _notify_fulfillment(agreement_id, contract_name, tx_hash, submit_time,
+                                time.time() if success else None)
+            if success or state_reader.get_condition_state(condition_id) == 2:
+                logger_handle.info(f'Done {contract_name}.fulfill for agreement {agreement_id}')
+                result = 'fulfilled'
+                break
+
+            logger_handle.debug(
+                f'done trial {i} {contract_name}.fulfill for agreement {agreement_id}, success?: '
+                f'{bool(success)}')
+            if nonce_manager.is_mined(nonce):
+                # mined without fulfilling the condition, the next trial sends a new one
+                nonce = None
+            time.sleep(2)
+
+        except Exception as e:
+            if nonce is not None and tx_hash is None:
+                # the transaction was not sent, its nonce must be reused
+                nonce_manager.release(nonce)
+                nonce = None
+
+            if state_reader.get_condition_state(condition_id) == 2:
+                logger_handle.info(f'Done {contract_name}.fulfill for agreement {agreement_id}')
+                result = 'fulfilled'
+                break
+
+            logger_handle.debug(f'{contract_name}.fulfill error {agreement_id}: {e}', exc_info=1)
+            if i == (num_tries - 1):
+                logger_handle.debug(
+                    f'{contract_name}.fulfill for agreement {agreement_id} FAILED with error: {e}')
+            else:
+                logger_handle.debug(
+                    f'Error when doing {contract_name}.fulfill for agreement {agreement_id}: '
+                    f'retrying trial # {i}')
+                time.sleep(2)
+
+    FULFILL_SECONDS.labels(contract_name, result).observe(time.time() - start)
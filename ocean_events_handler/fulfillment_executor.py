@@ -0,0 +1,161 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class FulfillmentExecutor:
+    """Run condition fulfillment work on bounded worker pools, one pool per condition type.
+
+    Work is submitted with `submit` (or through a callback made by `callback`), queued on
+    the pool of its condition type and run by at most that pool's number of workers, so
+    bursts of events queue up instead of creating threads. Delayed work is kept in a heap
+    served by a single scheduler thread and only enters a pool once it is due.
+    """
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, workers=None, default_workers=None):
+        """
+
+        :param workers: dict condition name -> int max number of concurrent workers
+        :param default_workers: int max number of workers for condition names not in `workers`
+        """
+        self._workers = dict(workers or {})
+        self._default_workers = int(default_workers or self.DEFAULT_WORKERS)
+        self._pools = {}
+        self._lock = Lock()
+        self._queued = Counter()
+        self._scheduled = []
+        self._sequence = itertools.count()
+        self._scheduler_cv = Condition()
+        self._scheduler_thread = None
+        self._is_running = True
+
+    @staticmethod
+    def parse_workers(value):
+        """Parse a `name:count,name:count` string into a dict of worker limits.
+
+        :param value: str, e.g. `lockReward:8,escrowReward:2`
+        :return: dict
+        """
+        workers = {}
+        for item in (value or '').split(','):
+            if ':' not in item:
+                continue
+            name, count = item.split(':', 1)
+            workers[name.strip()] = int(count)
+        return workers
+
+    def _get_pool(self, name):
+        with self._lock:
+            if name not in self._pools:
+                self._pools[name] = ThreadPoolExecutor(
+                    max_workers=self._workers.get(name, self._default_workers),
+                    thread_name_prefix=f'fulfill-{name}'
+                )
+            return self._pools[name]
+
+    def queue_depth(self, name=None):
+        """Return the number of submitted tasks not yet finished, including scheduled ones.
+
+        :param name: str condition name, or None for the total over all conditions
+        """
+        with self._lock:
+            if name is None:
+                return sum(self._queued.values())
+            return self._queued[name]
+
+    def submit(self, name, fn, *args, delay=0):
+        """Queue `fn(*args)` on the pool of condition `name`, optionally after `delay` seconds.
+
+        :param name: str condition type used to select the worker pool
+        :param fn: callable
+        :param args: arguments for `fn`
+        :param delay: float seconds to wait before the task is queued on the pool
+        """
+        with self._lock:
+            self._queued[name] += 1
+
+        if delay and delay > 0:
+            with self._scheduler_cv:
+                heapq.heappush(self._scheduled,
+                               (time.time() + delay, next(self._sequence), name, fn, args))
+                self._scheduler_cv.notify()
+            self._ensure_scheduler()
+        else:
+            self._get_pool(name).submit(self._run, name, fn, *args)
+
+    def callback(self, name, fn, delay=0):
+        """Return an event callback that submits `fn(event, *args)` instead of running it.
+
+        :param name: str condition type used to select the worker pool
+        :param fn: callable with the signature of an event callback
+        :param delay: float seconds to wait before the task is queued on the pool
+        """
+        def _submit(*args):
+            self.submit(name, fn, *args, delay=delay)
+
+        return _submit
+
+    def _run(self, name, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f'fulfillment task {name} failed: {e}', exc_info=1)
+        finally:
+            with self._lock:
+                self._queued[name] -= 1
+
+    def _ensure_scheduler(self):
+        with self._lock:
+            if self._scheduler_thread is not None:
+                return
+            self._is_running = True
+            self._scheduler_thread = Thread(target=self._run_scheduler, daemon=True,
+                                            name='fulfillment-scheduler')
+            self._scheduler_thread.start()
+
+    def _run_scheduler(self):
+        while self._is_running:
+            with self._scheduler_cv:
+                while self._is_running and not self._scheduled:
+                    self._scheduler_cv.wait()
+                if not self._is_running:
+                    return
+
+                due_time = self._scheduled[0][0]
+                wait_time = due_time - time.time()
+                if wait_time > 0:
+                    self._scheduler_cv.wait(wait_time)
+                    continue
+
+                _, _, name, fn, args = heapq.heappop(self._scheduled)
+
+            self._get_pool(name).submit(self._run, name, fn, *args)
+
+    def shutdown(self, wait=True):
+        """Stop the scheduler thread and the worker pools.
+
+        Work submitted afterwards starts new pools and a new scheduler thread.
+
+        :param wait: bool wait for the running tasks to finish
+        """
+        with self._lock:
+            self._is_running = False
+            scheduler_thread, self._scheduler_thread = self._scheduler_thread, None
+            pools = list(self._pools.values())
+            self._pools = {}
+        with self._scheduler_cv:
+            self._scheduler_cv.notify_all()
+        for pool in pools:
+            pool.shutdown(wait=wait)
+        if wait and scheduler_thread is not None:
+            scheduler_thread.join()
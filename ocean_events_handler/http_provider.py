@@ -0,0 +1,145 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+
+logger = logging.getLogger(__name__)
+
+
+class TransportStats:
+    """Request counts, connection pool usage and latency percentiles of a transport."""
+    LATENCY_SAMPLES = 2000
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.num_requests = 0
+        self.num_errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._latencies = deque(maxlen=self.LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def request_finished(self, latency, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.num_requests += 1
+            if failed:
+                self.num_errors += 1
+            else:
+                self._latencies.append(latency)
+
+    def latency_percentile(self, percentile):
+        """Return the `percentile` (0-100) of the recent request latencies in seconds."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        index = min(int(round(percentile / 100 * (len(latencies) - 1))), len(latencies) - 1)
+        return latencies[index]
+
+    def as_dict(self):
+        return {
+            'requests': self.num_requests,
+            'errors': self.num_errors,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'pool_size': self.pool_size,
+            'latency_p50': self.latency_percentile(50),
+            'latency_p95': self.latency_percentile(95),
+            'latency_p99': self.latency_percentile(99),
+        }
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """Web3 HTTP provider with its own keep-alive connection pool.
+
+    All threads share one `requests` session whose pool keeps up to `pool_size`
+    connections to the node open, so bursts of requests reuse connections instead of
+    paying a TCP/TLS handshake each. Requests block while the pool is exhausted.
+    Responses can be gzip compressed by the node, and JSON-RPC batches are sent with
+    `make_batch_request`. Pool usage and latencies are kept in `stats`.
+    """
+    POOL_SIZE = 25
+    TIMEOUT = 10
+
+    def __init__(self, endpoint_uri, pool_size=None, timeout=None, gzip=False, max_retries=0):
+        """
+
+        :param endpoint_uri: str url of the ethereum node
+        :param pool_size: int max number of kept-alive connections
+        :param timeout: float seconds to wait for a connection and for a response
+        :param gzip: bool ask the node for gzip compressed responses
+        :param max_retries: int connection retries of the underlying adapter
+        """
+        super().__init__(endpoint_uri)
+        self._pool_size = int(pool_size or self.POOL_SIZE)
+        self._timeout = float(timeout or self.TIMEOUT)
+        self._gzip = gzip
+        self._request_ids = itertools.count()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size,
+                              pool_block=True, max_retries=max_retries)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update(self.get_request_headers())
+        self._session.headers['Connection'] = 'keep-alive'
+        self._session.headers['Accept-Encoding'] = 'gzip' if gzip else 'identity'
+        self.stats = TransportStats(self._pool_size)
+
+    def __str__(self):
+        return f'Pooled RPC connection {self.endpoint_uri}'
+
+    def _post(self, data):
+        self.stats.request_started()
+        start = time.time()
+        try:
+            response = self._session.post(self.endpoint_uri, data=data, timeout=self._timeout)
+            response.raise_for_status()
+        except Exception:
+            self.stats.request_finished(time.time() - start, failed=True)
+            raise
+
+        self.stats.request_finished(time.time() - start)
+        return response.content
+
+    def make_request(self, method, params):
+        self.logger.debug("Making request HTTP. URI: %s, Method: %s",
+                          self.endpoint_uri, method)
+        raw_response = self._post(self.encode_rpc_request(method, params))
+        response = self.decode_rpc_response(raw_response)
+        self.logger.debug("Getting response HTTP. URI: %s, "
+                          "Method: %s, Response: %s",
+                          self.endpoint_uri, method, response)
+        return response
+
+    def make_batch_request(self, requests):
+        """Send several JSON-RPC requests in one HTTP request.
+
+        :param requests: list of (method, params) tuples
+        :return: list of JSON-RPC response dicts, in the order of `requests`
+        """
+        batch = [
+            {'jsonrpc': '2.0', 'method': method, 'params': params,
+             'id': next(self._request_ids)}
+            for method, params in requests
+        ]
+        responses = {
+            response['id']: response
+            for response in json.loads(self._post(json.dumps(batch).encode('utf-8')))
+        }
+        return [responses.get(request['id'], {'error': {'message': 'missing response'}})
+                for request in batch]
@@ -0,0 +1,341 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import math
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+
+logger = logging.getLogger(__name__)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    items = []
+    for name, value in labels:
+        value = str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+        items.append(f'{name}="{value}"')
+    return '{' + ','.join(items) + '}'
+
+
+class _ValueChild:
+    """Value of a counter or gauge for one set of label values."""
+
+    def __init__(self):
+        self._value = 0
+        self._function = None
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def set_function(self, function):
+        """Read the value from `function()` whenever the metrics are collected."""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception as e:
+                logger.debug(f'metric value function failed: {e}')
+                return math.nan
+        return self._value
+
+
+class _GaugeChild(_ValueChild):
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+
+class _HistogramChild:
+    """Bucket counts, sum and count of a histogram for one set of label values."""
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self)
+
+    def get(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = []
+        count = 0
+        for bound, bucket_count in zip(self._buckets, counts):
+            count += bucket_count
+            cumulative.append((bound, count))
+        return cumulative, total, count
+
+
+class _Timer:
+
+    def __init__(self, child):
+        self._child = child
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.time() - self._start)
+
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+
+        :param name: str metric name
+        :param documentation: str help text
+        :param labelnames: tuple of label names, values are given to `labels`
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = OrderedDict()
+        self._lock = Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child metric of the given label values, creating it if needed."""
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {values}')
+
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return [(list(zip(self.labelnames, values)), child)
+                    for values, child in self._children.items()]
+
+    def collect(self):
+        """Return the exposition lines of the metric."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        for labels, child in self._items():
+            lines.append(f'{self.name}{_format_labels(labels)} {_format_value(child.get())}')
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, e.g. number of processed events."""
+    TYPE = 'counter'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. a queue depth."""
+    TYPE = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, e.g. call latencies."""
+    TYPE = 'histogram'
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        """
+
+        :param buckets: sorted upper bounds of the buckets, `+Inf` is always added
+        """
+        super().__init__(name, documentation, labelnames)
+        buckets = sorted(float(b) for b in (buckets or self.DEFAULT_BUCKETS))
+        if buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        for labels, child in self._items():
+            cumulative, total, count = child.get()
+            for bound, bucket_count in cumulative:
+                bucket_labels = labels + [('le', _format_value(bound))]
+                lines.append(f'{self.name}_bucket{_format_labels(bucket_labels)} {bucket_count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms rendered in the Prometheus text format.
+
+    Metrics are created on first use and returned as is afterwards, so modules can
+    declare the metrics they record at import time. Recording only takes the lock of
+    the metric child being updated.
+    """
+    _instance = None
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def get_instance():
+        if MetricsRegistry._instance is None:
+            MetricsRegistry._instance = MetricsRegistry()
+        return MetricsRegistry._instance
+
+    def _get_or_create(self, metric_class, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f'metric {name} is already registered as a {metric.TYPE} '
+                                 f'with labels {metric.labelnames}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serve the metrics of a registry on `http://<host>:<port>/metrics`."""
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry, port, host='127.0.0.1'):
+        """
+
+        :param registry: MetricsRegistry instance
+        :param port: int port to listen on, 0 picks a free port
+        :param host: str interface to listen on
+        """
+        self._registry = registry
+        self._server = _ThreadingHTTPServer((host, int(port)), self._handler_class())
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def _handler_class(self):
+        registry = self._registry
+        content_type = self.CONTENT_TYPE
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f'metrics request: {format % args}')
+
+        return _MetricsHandler
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever, daemon=True,
+                              name='metrics-server')
+        self._thread.start()
+        logger.info(f'serving metrics on port {self.port}')
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=None):
+    """Start a `MetricsServer` for `registry`, the shared registry by default."""
+    server = MetricsServer(registry or MetricsRegistry.get_instance(), port, host)
+    server.start()
+    return server
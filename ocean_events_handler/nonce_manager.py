@@ -0,0 +1,230 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import heapq
+import logging
+import threading
+import time
+
+from ocean_keeper.wallet import Wallet
+
+logger = logging.getLogger(__name__)
+
+
+class NonceManager:
+    """Allocate transaction nonces for one account locally so transactions can be pipelined.
+
+    Nonces are handed out sequentially under a lock, starting from the account's `pending`
+    transaction count, so any number of fulfillment threads can sign and send without
+    waiting for each other's receipts. Transactions are signed with their nonce set
+    explicitly by `send_transaction`; the keeper `Wallet`, shared with other keeper users
+    of the process, is left alone. When sending fails only the failed nonce is given back
+    with `release`: it is handed out again before any new nonce so the gap is filled,
+    while the nonces held by other threads stay theirs. The count is resynced from the
+    node only once no nonce is outstanding.
+
+    Sent transactions are tracked until mined. One still pending after `stuck_timeout`
+    seconds is replaced by the same transaction with a higher gas price.
+    """
+    STUCK_TIMEOUT = 60
+    # nodes only accept a replacement paying at least 10% more gas
+    GAS_PRICE_BUMP = 1.125
+
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    def __init__(self, web3, address, stuck_timeout=None):
+        """
+
+        :param web3: Web3 instance
+        :param address: hex str account address
+        :param stuck_timeout: float seconds before a pending transaction is replaced
+        """
+        self._web3 = web3
+        self._address = address
+        self._stuck_timeout = float(stuck_timeout or self.STUCK_TIMEOUT)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_nonce = None
+        # nonces allocated but not sent yet
+        self._allocated = set()
+        # heap of released nonces below `_next_nonce`
+        self._free = []
+        # nonce -> (tx hash, time sent)
+        self._in_flight = {}
+
+    @classmethod
+    def get(cls, web3, address):
+        """Return the process wide NonceManager of `address`."""
+        with cls._managers_lock:
+            manager = cls._managers.get(address.lower())
+            if manager is None:
+                manager = cls(web3, address)
+                cls._managers[address.lower()] = manager
+            return manager
+
+    @property
+    def address(self):
+        return self._address
+
+    @property
+    def last_allocated(self):
+        """Nonce most recently allocated on the calling thread, or None."""
+        return getattr(self._local, 'nonce', None)
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return dict(self._in_flight)
+
+    def _get_transaction_count(self, block_identifier):
+        return self._web3.eth.getTransactionCount(self._address, block_identifier)
+
+    def allocate(self):
+        """Return the next nonce of the account.
+
+        :return: int
+        """
+        with self._lock:
+            if self._free:
+                nonce = heapq.heappop(self._free)
+            else:
+                if self._next_nonce is None:
+                    self._next_nonce = max(
+                        [self._get_transaction_count('pending')] +
+                        [n + 1 for n in self._in_flight]
+                    )
+                nonce = self._next_nonce
+                self._next_nonce += 1
+            self._allocated.add(nonce)
+
+        self._local.nonce = nonce
+        return nonce
+
+    def is_mined(self, nonce):
+        """Return True if a transaction of the account with `nonce` was mined."""
+        return self._get_transaction_count('latest') > nonce
+
+    def send_transaction(self, tx, private_key, nonce):
+        """Sign `tx` with `nonce`, send it and track it until it is mined.
+
+        The gas price is chosen as the keeper `Wallet` does unless `tx` sets one.
+
+        :param tx: dict transaction with at least `to`, `data` and `gas`
+        :param private_key: private key of the account
+        :param nonce: int nonce from `allocate`
+        :return: hash of the sent transaction
+        """
+        tx = dict(tx, nonce=nonce)
+        if 'gasPrice' not in tx:
+            tx['gasPrice'] = max(int(self._web3.eth.gasPrice / 100), Wallet.MIN_GAS_PRICE)
+        signed_tx = self._web3.eth.account.signTransaction(tx, private_key)
+        tx_hash = self._web3.eth.sendRawTransaction(signed_tx.rawTransaction)
+        self.submitted(tx_hash, nonce)
+        return tx_hash
+
+    def release(self, nonce):
+        """Give back `nonce`, whose transaction was not sent or was dropped by the node.
+
+        The last nonce handed out is rolled back, any other one is allocated again before
+        a new nonce.
+
+        :param nonce: int nonce from `allocate`
+        """
+        with self._lock:
+            self._allocated.discard(nonce)
+            self._in_flight.pop(nonce, None)
+            if self._next_nonce is None or nonce >= self._next_nonce or nonce in self._free:
+                return
+
+            heapq.heappush(self._free, nonce)
+            # roll back over the released nonces at the top
+            while self._next_nonce - 1 in self._free:
+                self._free.remove(self._next_nonce - 1)
+                self._next_nonce -= 1
+            heapq.heapify(self._free)
+
+        self.resync()
+
+    def resync(self):
+        """Continue from the node's `pending` transaction count on the next allocation.
+
+        Only done when no nonce is allocated or in flight, otherwise a nonce held by
+        another thread could be handed out again.
+        """
+        mined_count = self._get_transaction_count('latest')
+        with self._lock:
+            for nonce in [n for n in self._in_flight if n < mined_count]:
+                del self._in_flight[nonce]
+            if self._allocated or self._in_flight:
+                return
+
+            self._next_nonce = None
+            self._free = []
+        logger.debug(f'resyncing nonce of {self._address}')
+
+    def submitted(self, tx_hash, nonce=None):
+        """Track a sent transaction until it is mined.
+
+        :param tx_hash: hash of the sent transaction
+        :param nonce: int nonce of the transaction, defaults to `last_allocated`
+        """
+        nonce = nonce if nonce is not None else self.last_allocated
+        if nonce is None:
+            return
+
+        with self._lock:
+            self._allocated.discard(nonce)
+            self._in_flight[nonce] = (tx_hash, time.time())
+
+    def replace_stuck_transactions(self, private_key):
+        """Resend the tracked transactions pending for longer than `stuck_timeout`.
+
+        Each one is replaced by the same transaction with the same nonce and a gas price
+        `GAS_PRICE_BUMP` times higher. Mined transactions are dropped from the tracking.
+
+        :param private_key: private key of the account used to sign the replacements
+        :return: dict nonce -> hash of the replacement transaction
+        """
+        mined_count = self._get_transaction_count('latest')
+        now = time.time()
+        with self._lock:
+            for nonce in [n for n in self._in_flight if n < mined_count]:
+                del self._in_flight[nonce]
+            stuck = {nonce: tx_hash for nonce, (tx_hash, sent_at) in self._in_flight.items()
+                     if now - sent_at >= self._stuck_timeout}
+
+        replaced = {}
+        for nonce, tx_hash in sorted(stuck.items()):
+            try:
+                replaced[nonce] = self._replace(nonce, tx_hash, private_key)
+            except Exception as e:
+                logger.warning(f'failed to replace stuck transaction {tx_hash} '
+                               f'(nonce {nonce}) of {self._address}: {e}')
+
+        if replaced:
+            with self._lock:
+                for nonce, new_tx_hash in replaced.items():
+                    self._in_flight[nonce] = (new_tx_hash, now)
+        return replaced
+
+    def _replace(self, nonce, tx_hash, private_key):
+        tx = self._web3.eth.getTransaction(tx_hash)
+        if tx is None:
+            # dropped by the node, the nonce is free again
+            self.release(nonce)
+            raise ValueError('transaction not found')
+
+        replacement = {
+            'to': tx['to'],
+            'data': tx['input'],
+            'value': tx['value'],
+            'gas': tx['gas'],
+            'gasPrice': int(tx['gasPrice'] * self.GAS_PRICE_BUMP) + 1,
+            'nonce': nonce,
+        }
+        signed_tx = self._web3.eth.account.signTransaction(replacement, private_key)
+        new_tx_hash = self._web3.eth.sendRawTransaction(signed_tx.rawTransaction)
+        logger.info(f'replaced stuck transaction {tx_hash} (nonce {nonce}) of '
+                    f'{self._address} with {new_tx_hash}, gas price {replacement["gasPrice"]}')
+        return new_tx_hash
@@ -0,0 +1,91 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptivePollScheduler:
+    """Decide how long to wait before the next poll from the observed block times.
+
+    Every poll reports the chain head with `observe`. From the times at which new blocks
+    were first seen the scheduler estimates the block interval, and `next_delay` sleeps
+    until just after the next block is expected. When that block is late the delay
+    backs off exponentially, and when a poll finds several new blocks at once (the
+    monitor fell behind) the next poll happens after `min_interval`.
+    """
+    MIN_INTERVAL = 0.5
+    MAX_INTERVAL = 10
+    INITIAL_INTERVAL = 3
+    # fraction of the block interval added after the expected block time
+    MARGIN = 0.1
+    WINDOW = 20
+
+    def __init__(self, initial_interval=None, min_interval=None, max_interval=None,
+                 margin=None, window=None):
+        """
+
+        :param initial_interval: float seconds between polls until block times are known
+        :param min_interval: float min seconds between polls
+        :param max_interval: float max seconds between polls
+        :param margin: float fraction of the block interval to wait after the expected block
+        :param window: int number of recent blocks used to estimate the block interval
+        """
+        self._min_interval = float(min_interval or self.MIN_INTERVAL)
+        self._max_interval = float(max_interval or self.MAX_INTERVAL)
+        self._initial_interval = float(initial_interval or self.INITIAL_INTERVAL)
+        self._margin = float(margin if margin is not None else self.MARGIN)
+        self._samples = deque(maxlen=int(window or self.WINDOW))
+        self._last_block = None
+        self._empty_polls = 0
+        self._backlog = 0
+
+    @property
+    def block_interval(self):
+        """Estimated seconds between blocks, None until two new blocks were seen."""
+        if len(self._samples) < 2:
+            return None
+
+        (first_block, first_time), (last_block, last_time) = self._samples[0], self._samples[-1]
+        return (last_time - first_time) / (last_block - first_block)
+
+    @property
+    def empty_polls(self):
+        return self._empty_polls
+
+    def observe(self, block_number, now=None):
+        """Record the chain head returned by a poll.
+
+        :param block_number: int latest block number of the chain
+        :param now: float time of the poll, defaults to `time.time()`
+        """
+        now = now if now is not None else time.time()
+        if self._last_block is not None and block_number <= self._last_block:
+            self._empty_polls += 1
+            self._backlog = 0
+            return
+
+        self._backlog = block_number - self._last_block - 1 if self._last_block is not None else 0
+        self._last_block = block_number
+        self._empty_polls = 0
+        self._samples.append((block_number, now))
+
+    def next_delay(self, now=None):
+        """Return the seconds to wait before the next poll."""
+        interval = self.block_interval
+        if interval is None:
+            delay = self._initial_interval
+        elif self._backlog > 0:
+            delay = self._min_interval
+        else:
+            now = now if now is not None else time.time()
+            expected = self._samples[-1][1] + interval * (1 + self._margin)
+            delay = expected - now
+            if delay <= 0:
+                # the block is late, back off while the chain is idle
+                delay = interval * self._margin * 2 ** self._empty_polls
+
+        return min(max(delay, self._min_interval), self._max_interval)
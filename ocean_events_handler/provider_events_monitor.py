@@ -4,10 +4,14 @@
 import logging
 import os
 import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from threading import Thread
+from itertools import islice
+from threading import Event, Thread
 
-from ocean_keeper.utils import generate_multi_value_hash
+from eth_utils import encode_hex, event_abi_to_log_topic
+from ocean_keeper.didregistry import DIDRegistry
 from ocean_keeper.web3_provider import Web3Provider
 from ocean_utils.agreements.service_agreement import ServiceTypesIndices
 from ocean_utils.agreements.service_agreement_template import ServiceAgreementTemplate
@@ -16,9 +20,28 @@ from ocean_utils.agreements.utils import get_sla_template
 from ocean_utils.did import id_to_did
 from ocean_utils.did_resolver.did_resolver import DIDResolver
 
-from ocean_events_handler.agreement_store.agreements import AgreementsStorage
-from ocean_events_handler.event_handlers import (accessSecretStore, lockRewardCondition,
-                                                 lockRewardExecutionCondition)
+from ocean_events_handler.agreement_log_fetcher import AgreementCreatedLogFetcher
+from ocean_events_handler.agreement_store.agreement_index import KnownAgreementIndex
+from ocean_events_handler.agreement_store.agreements import (
+    AGREEMENT_CREATED_STAGE,
+    AgreementRecord,
+    AgreementsStorage
+)
+from ocean_events_handler.agreement_store.compaction import AgreementCompactor
+from ocean_events_handler.block_range_scanner import BlockRangeScanner
+from ocean_events_handler.block_source import create_block_source
+from ocean_events_handler.condition_dispatcher import ConditionEventDispatcher
+from ocean_events_handler.ddo_cache import DDOCache
+from ocean_events_handler.event_handlers.utils import (
+    add_fulfillment_listener,
+    remove_fulfillment_listener
+)
+from ocean_events_handler.fulfillment_executor import FulfillmentExecutor
+from ocean_events_handler.metrics import MetricsRegistry
+from ocean_events_handler.poll_scheduler import AdaptivePollScheduler
+from ocean_events_handler.reorg_tracker import ReorgTracker
+from ocean_events_handler.rpc_batch import ConditionStateReader
+from ocean_events_handler.template_registry import build_template_registry
 
 logger = logging.getLogger(__name__)
 
@@ -61,15 +84,36 @@ class ProviderEventsMonitor:
 
     EVENT_WAIT_TIMEOUT = 3600
     LAST_N_BLOCKS = 400
+    FULFILLMENT_WORKERS = 4
+    RECOVERY_WORKERS = 8
+    RECOVERY_BATCH_SIZE = 1000
+    AGREEMENT_CREATED_CHECKPOINT = 'AgreementCreated'
 
     def __init__(self, keeper, web3, storage_path, account):
+        """
+
+        :param keeper: Keeper instance
+        :param web3: Web3 instance
+        :param storage_path: str path of the agreements database
+        :param account: Account of the provider, or list of the Accounts of several
+            providers served by this monitor; the first one is the default account
+        """
         self._keeper = keeper
         self._storage_path = storage_path
-        self._account = account
         self._web3 = web3
-        self._db = AgreementsStorage(self._storage_path)
+        accounts = account if isinstance(account, (list, tuple)) else [account]
+        self._account = accounts[0]
+        # provider accounts by checksum address, replaced as a whole when accounts are added
+        self._accounts = OrderedDict(
+            (self._web3.toChecksumAddress(a.address), a) for a in accounts)
+        # agreement and condition writes are batched, the checkpoint update flushes them
+        self._db = AgreementsStorage(
+            self._storage_path,
+            write_behind=True,
+            max_batch_size=os.getenv('OCN_EVENTS_MONITOR_WRITE_BATCH_SIZE'),
+            flush_interval=os.getenv('OCN_EVENTS_MONITOR_WRITE_FLUSH_INTERVAL')
+        )
 
-        self.known_agreement_ids = set()
         self.completed_ids = set()
         self.other_agreement_ids = set()
 
@@ -82,48 +126,219 @@ class ProviderEventsMonitor:
         db = self.db
         db.create_tables()
         # get largest block_number from db or `latest` if db has no data
-        self.last_n_blocks = os.getenv('OCN_EVENTS_MONITOR_LAST_N_BLOCKS', self.LAST_N_BLOCKS)
+        self.last_n_blocks = int(
+            os.getenv('OCN_EVENTS_MONITOR_LAST_N_BLOCKS', self.LAST_N_BLOCKS))
         self.latest_block = self._web3.eth.blockNumber
-        db_latest = db.get_latest_block_number() or self.latest_block
+        db_latest = db.get_checkpoint(self.AGREEMENT_CREATED_CHECKPOINT) or \
+            db.get_latest_block_number() or self.latest_block
         self.latest_block = min(db_latest, self.latest_block)
         self.last_processed_block = 0
+        self.known_agreement_ids = KnownAgreementIndex(
+            self._storage_path, since_block_number=self.latest_block - self.last_n_blocks)
+        self._template_registry = build_template_registry(self._keeper)
+        # one log request per block range covers all provider accounts
+        self._agreement_log_fetcher = AgreementCreatedLogFetcher(
+            self._web3,
+            [template.contract for template in self._template_registry.templates],
+            list(self._accounts)
+        )
+        # new blocks and AgreementCreated logs are pushed by the node when a WebSocket/IPC
+        # endpoint is configured, otherwise the monitor polls
+        self._block_source = create_block_source(
+            self._web3,
+            os.getenv('OCN_EVENTS_MONITOR_SUBSCRIPTION_URI'),
+            log_filter=self._agreement_log_fetcher.log_filter
+        )
+        resolve_ddo = DIDResolver(self._keeper.did_registry).resolve
+        provider = self._web3.providers[0]
+        if hasattr(provider, 'wrap_ddo_resolver'):
+            # DDO lookups are recorded or replayed along with the node traffic
+            resolve_ddo = provider.wrap_ddo_resolver(resolve_ddo)
+        self._ddo_cache = DDOCache(
+            resolve_ddo,
+            max_size=os.getenv('OCN_EVENTS_MONITOR_DDO_CACHE_SIZE'),
+            ttl=os.getenv('OCN_EVENTS_MONITOR_DDO_CACHE_TTL')
+        )
+        self._did_attribute_topic = encode_hex(event_abi_to_log_topic(
+            getattr(self._keeper.did_registry.events,
+                    DIDRegistry.DID_REGISTRY_EVENT_NAME)._get_event_abi()
+        ))
+        # condition state reads of all agreements share batched JSON-RPC requests
+        self._condition_state_reader = ConditionStateReader.get_instance()
+        # event callbacks only queue work, fulfillment runs on bounded per-condition pools
+        self._fulfillment_executor = FulfillmentExecutor(
+            FulfillmentExecutor.parse_workers(os.getenv('OCN_EVENTS_MONITOR_FULFILLMENT_WORKERS')),
+            default_workers=os.getenv('OCN_EVENTS_MONITOR_DEFAULT_FULFILLMENT_WORKERS',
+                                      self.FULFILLMENT_WORKERS)
+        )
+        # one `Fulfilled` events dispatcher per condition contract, shared by all agreements
+        self._condition_dispatchers = {
+            cond: ConditionEventDispatcher(self._web3, contract)
+            for cond, contract in self._template_registry.condition_contracts.items()
+        }
+        # lifecycle timings: condition transitions and the fulfill transactions sent for them
+        self._contract_conditions = {
+            dispatcher.name: cond for cond, dispatcher in self._condition_dispatchers.items()
+        }
+        add_fulfillment_listener(self._record_fulfillment_transaction)
+        self._block_scanner = BlockRangeScanner(
+            self.get_agreement_events,
+            min_chunk_size=os.getenv('OCN_EVENTS_MONITOR_MIN_BLOCK_CHUNK'),
+            max_chunk_size=os.getenv('OCN_EVENTS_MONITOR_MAX_BLOCK_CHUNK')
+        )
+        self._recovery_workers = int(
+            os.getenv('OCN_EVENTS_MONITOR_RECOVERY_WORKERS', self.RECOVERY_WORKERS))
+        self._recovery_done = Event()
+        # finished agreements are moved out of the hot tables in the background
+        self._compactor = AgreementCompactor(
+            self._storage_path,
+            lambda: self.last_processed_block or self.latest_block,
+            min_block_age=os.getenv('OCN_EVENTS_MONITOR_ARCHIVE_BLOCK_AGE'),
+            batch_size=os.getenv('OCN_EVENTS_MONITOR_ARCHIVE_BATCH_SIZE'),
+            interval=os.getenv('OCN_EVENTS_MONITOR_ARCHIVE_INTERVAL')
+        )
         logger.info(f'initialized events monitor: '
-                    f'latest block number {self.latest_block}'
-                    f'provider address {self.provider_account.address}')
+                    f'latest block number {self.latest_block}, '
+                    f'provider addresses {", ".join(self._accounts)}')
 
         self._monitor_is_on = False
         try:
-            self._monitor_sleep_time = os.getenv('OCN_EVENTS_MONITOR_QUITE_TIME', 3)
+            quiet_time = float(os.getenv('OCN_EVENTS_MONITOR_QUITE_TIME', 3))
         except ValueError:
-            self._monitor_sleep_time = 3
-
-        self._monitor_sleep_time = max(self._monitor_sleep_time, 3)
+            quiet_time = 3
+
+        # the wait between polls follows the observed block times, `quiet_time` is only
+        # used until the block interval is known
+        self._poll_scheduler = AdaptivePollScheduler(
+            initial_interval=quiet_time,
+            min_interval=os.getenv('OCN_EVENTS_MONITOR_MIN_POLL_INTERVAL'),
+            max_interval=os.getenv('OCN_EVENTS_MONITOR_MAX_POLL_INTERVAL')
+        )
+        # only blocks `confirmations` deep are scanned and, with a confirmation depth,
+        # recent block hashes are checked for reorgs; recent logs are remembered so
+        # overlapping ranges skip them
+        self._reorg_tracker = ReorgTracker(
+            self._web3,
+            confirmations=os.getenv('OCN_EVENTS_MONITOR_CONFIRMATIONS'),
+            max_blocks=os.getenv('OCN_EVENTS_MONITOR_REORG_WINDOW'),
+            max_logs=os.getenv('OCN_EVENTS_MONITOR_LOG_CACHE_SIZE')
+        )
+        self._init_metrics(MetricsRegistry.get_instance())
+
+    def _init_metrics(self, registry):
+        self._chain_head_gauge = registry.gauge(
+            'events_monitor_chain_head_block', 'Latest block number reported by the node.')
+        self._last_processed_gauge = registry.gauge(
+            'events_monitor_last_processed_block', 'Last block scanned for new agreements.')
+        registry.gauge(
+            'events_monitor_blocks_behind', 'Blocks between the chain head and the last '
+            'scanned block.'
+        ).set_function(
+            lambda: max(self._chain_head_gauge.labels().get() - self.last_processed_block, 0))
+        self._get_logs_histogram = registry.histogram(
+            'events_monitor_get_logs_seconds', 'Duration of AgreementCreated log queries.')
+        self._monitor_errors = registry.counter(
+            'events_monitor_errors_total', 'Errors raised in the monitor loop.')
+        self._reorgs = registry.counter(
+            'events_monitor_reorgs_total', 'Chain reorganizations rolled back.')
+        self._agreements_counter = registry.counter(
+            'events_monitor_agreements_total', 'Agreements whose conditions were subscribed.',
+            ('origin',))
+        self._process_conditions_histogram = registry.histogram(
+            'events_monitor_process_condition_events_seconds',
+            'Duration of process_condition_events per agreement.', ('origin',))
+        self._completion_histogram = registry.histogram(
+            'events_monitor_agreement_completion_seconds',
+            'Seconds from handling AgreementCreated to the last condition fulfilled.',
+            buckets=(10, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400))
+
+        subscriptions = registry.gauge(
+            'events_monitor_condition_subscriptions', 'Open condition event subscriptions.',
+            ('condition',))
+        queue_depth = registry.gauge(
+            'events_monitor_fulfillment_queue_depth', 'Queued or running fulfillment tasks.',
+            ('condition',))
+        for cond, dispatcher in self._condition_dispatchers.items():
+            subscriptions.labels(cond).set_function(lambda d=dispatcher: d.num_subscriptions)
+            queue_depth.labels(cond).set_function(
+                lambda c=cond: self._fulfillment_executor.queue_depth(c))
+
+        registry.gauge('events_monitor_ddo_cache_size', 'DDOs in the cache.').set_function(
+            lambda: len(self._ddo_cache))
+        registry.counter('events_monitor_ddo_cache_hits_total', 'DDO cache hits.').set_function(
+            lambda: self._ddo_cache.hits)
+        registry.counter(
+            'events_monitor_ddo_cache_misses_total', 'DDO cache misses.').set_function(
+            lambda: self._ddo_cache.misses)
 
     @staticmethod
     def get_instance(keeper, storage_path, account):
-        if not ProviderEventsMonitor._instance or \
-                ProviderEventsMonitor._instance.provider_account != account:
+        """Return the process wide monitor, serving `account` as well from now on.
+
+        :param account: Account or list of Accounts
+        """
+        if not ProviderEventsMonitor._instance:
             ProviderEventsMonitor._instance = ProviderEventsMonitor(
                 keeper,
                 Web3Provider.get_web3(),
                 storage_path,
                 account
             )
+        else:
+            ProviderEventsMonitor._instance.add_accounts(
+                account if isinstance(account, (list, tuple)) else [account])
 
         return ProviderEventsMonitor._instance
 
     @property
     def db(self):
-        return AgreementsStorage(self._storage_path)
+        return self._db
+
+    @property
+    def ddo_cache(self):
+        return self._ddo_cache
 
     @property
     def provider_account(self):
         return self._account
 
+    @property
+    def provider_accounts(self):
+        return list(self._accounts.values())
+
+    def add_accounts(self, accounts):
+        """Also serve the agreements of `accounts` from the next scanned block range.
+
+        Logs pushed by a subscription keep the filter the subscription was created with,
+        the range scans pick up the agreements of the added accounts.
+
+        :param accounts: list of Account
+        """
+        new_accounts = OrderedDict(self._accounts)
+        for account in accounts:
+            new_accounts.setdefault(self._web3.toChecksumAddress(account.address), account)
+        if len(new_accounts) == len(self._accounts):
+            return
+
+        self._accounts = new_accounts
+        self._agreement_log_fetcher.set_provider_addresses(list(new_accounts))
+        logger.info(f'events monitor serves provider addresses {", ".join(new_accounts)}')
+
+    def _get_account(self, provider_address):
+        """Return the Account of `provider_address`, the default account if it is None."""
+        if provider_address is None:
+            return self._account
+        return self._accounts.get(self._web3.toChecksumAddress(provider_address))
+
     @property
     def is_monitor_running(self):
         return self._monitor_is_on
 
+    @property
+    def recovery_done(self):
+        """Event set once the pending agreements found at startup are all resubscribed."""
+        return self._recovery_done
+
     def start_agreement_events_monitor(self):
         if self._monitor_is_on:
             return
@@ -135,127 +350,267 @@ class ProviderEventsMonitor:
         )
         self._monitor_is_on = True
         t.start()
+        # pending agreements are recovered next to the live loop instead of before it
+        Thread(target=self.do_first_check, daemon=True, name='agreements-recovery').start()
+        self._compactor.start()
         logger.info('started the agreement events monitor')
 
     def stop_monitor(self):
         self._monitor_is_on = False
+        self._block_source.stop()
+        for dispatcher in self._condition_dispatchers.values():
+            dispatcher.stop()
+        self._fulfillment_executor.shutdown()
+        self._compactor.stop()
+        remove_fulfillment_listener(self._record_fulfillment_transaction)
+        self._db.flush()
 
     def process_pending_agreements(self, pending_agreements, conditions):
+        """Resubscribe to the condition events of the given pending agreements.
+
+        :param pending_agreements: dict agreement id -> agreement data as returned by
+            `AgreementsStorage.get_pending_agreements`
+        :param conditions: dict agreement id -> dict of unfulfilled condition statuses
+        """
+        self._process_pending_records([
+            AgreementRecord(agreement_id, data[0], data[1], data[2], data[3], data[5], data[4],
+                            data[6], None, conditions[agreement_id])
+            for agreement_id, data in pending_agreements.items()
+        ])
+
+    def _process_pending_records(self, records):
+        """Resubscribe to the condition events of pending AgreementRecords.
+
+        Agreements are grouped by DID so each DDO is resolved once, and the groups are
+        processed on `OCN_EVENTS_MONITOR_RECOVERY_WORKERS` threads. Returns when all
+        agreements were processed.
+        """
         logger.info(
-            f'processing pending agreements, there is {len(pending_agreements)} agreements to '
-            f'process.')
-        for agreement_id in pending_agreements.keys():
-            data = pending_agreements[agreement_id]
-            did = data[0]
-            consumer_address = data[5]
-            block_number = data[6]
-            unfulfilled_conditions = conditions[agreement_id].keys()
-            logger.info(f'process pending agreement conditions: agreementId={agreement_id}, '
+            f'processing pending agreements, there is {len(records)} agreements to process.')
+        did_to_records = defaultdict(list)
+        for record in records:
+            did_to_records[record.did].append(record)
+
+        num_failed = 0
+        with ThreadPoolExecutor(max_workers=max(self._recovery_workers, 1)) as pool:
+            futures = [
+                pool.submit(self._process_pending_did_agreements, did, did_records)
+                for did, did_records in did_to_records.items()
+            ]
+            for future in as_completed(futures):
+                num_failed += future.result()
+
+        logger.info(f'processed {len(records)} pending agreements of '
+                    f'{len(did_to_records)} assets, {num_failed} failed.')
+
+    def _process_pending_did_agreements(self, did, records):
+        try:
+            ddo = self._ddo_cache.get(did)
+        except Exception as e:
+            logger.error(f'failed to resolve {did}, skipping {len(records)} pending '
+                         f'agreements: {e}')
+            return len(records)
+
+        num_failed = 0
+        for record in records:
+            unfulfilled_conditions = record.conditions.keys()
+            logger.info(f'process pending agreement conditions: '
+                        f'agreementId={record.agreement_id}, '
                         f'unfulfilled conditions={unfulfilled_conditions}')
-            if data[1] == ServiceTypesIndices.DEFAULT_ACCESS_INDEX:
-                template_id = self._keeper.escrow_access_secretstore_template.address
+            if record.service_index == ServiceTypesIndices.DEFAULT_ACCESS_INDEX:
+                agreement_type = ServiceTypes.ASSET_ACCESS
             else:
-                template_id = self._keeper.escrow_compute_execution_template.address
-            self.process_condition_events(
-                agreement_id,
-                unfulfilled_conditions,
-                did,
-                consumer_address,
-                block_number,
-                new_agreement=False,
-                template_id=template_id
-            )
+                agreement_type = ServiceTypes.CLOUD_COMPUTE
+            template_id = self._template_registry.get_by_type(agreement_type).contract.address
+            account = self._get_account(record.provider)
+            if account is None:
+                num_failed += 1
+                logger.warning(f'skipping pending agreement {record.agreement_id} of provider '
+                               f'{record.provider}, which is not served by this monitor')
+                continue
+
+            try:
+                self.process_condition_events(
+                    record.agreement_id,
+                    unfulfilled_conditions,
+                    did,
+                    record.consumer,
+                    record.block_number,
+                    new_agreement=False,
+                    template_id=template_id,
+                    ddo=ddo,
+                    account=account
+                )
+            except Exception as e:
+                num_failed += 1
+                logger.error(f'failed to process pending agreement {record.agreement_id}: {e}')
+
+        return num_failed
 
     def get_next_block_range(self):
-        to_block = self._web3.eth.blockNumber
+        latest_block = self._block_source.get_block_number()
+        self._chain_head_gauge.set(latest_block)
+        self._poll_scheduler.observe(latest_block)
+        # the condition dispatchers follow this head instead of polling the node
+        for dispatcher in self._condition_dispatchers.values():
+            dispatcher.set_head(latest_block)
+        to_block = self._reorg_tracker.safe_block(latest_block)
         if self.last_processed_block:
             block_range = self.last_processed_block - 1, to_block
         else:
-            block_num = self.db.get_latest_block_number() or 0
-            if block_num > to_block:
-                block_num = to_block - self.last_n_blocks
-            from_block = max(to_block - self.last_n_blocks, block_num)
-            block_range = from_block, to_block
+            checkpoint = self.db.get_checkpoint(self.AGREEMENT_CREATED_CHECKPOINT)
+            if checkpoint is not None and checkpoint <= to_block:
+                # resume right after the last block processed before the restart
+                block_range = min(checkpoint + 1, to_block), to_block
+            else:
+                block_num = self.db.get_latest_block_number() or 0
+                if block_num > to_block:
+                    block_num = to_block - self.last_n_blocks
+                from_block = max(to_block - self.last_n_blocks, block_num)
+                block_range = from_block, to_block
 
         debug_log(f'next block range = {block_range}, latest block number: {to_block}')
         return block_range
 
     def do_first_check(self):
-        db = self.db
-        if not db.get_agreement_count():
-            logger.info('No pending agreements found in the local database.')
-            return
-
-        block_num = db.get_latest_block_number()
-        agreements, conditions = db.get_pending_agreements(block_num - self.last_n_blocks)
-        self.process_pending_agreements(agreements, conditions)
+        try:
+            db = self.db
+            if not db.get_agreement_count():
+                logger.info('No pending agreements found in the local database.')
+                return
+
+            # stream the pending agreements so memory stays bounded by the batch size
+            block_num = db.get_latest_block_number()
+            records = db.iter_pending_agreements(block_num - self.last_n_blocks)
+            while True:
+                batch = list(islice(records, self.RECOVERY_BATCH_SIZE))
+                if not batch:
+                    break
+                self._process_pending_records(batch)
+        except Exception as e:
+            logger.error(f'Error recovering pending agreements: {e}')
+        finally:
+            self._recovery_done.set()
 
     def run_monitor(self):
-        self.do_first_check()
         while True:
             try:
                 if not self._monitor_is_on:
                     return
 
-                _from, _to = self.get_next_block_range()
-                for event_log in self.get_agreement_events(_from, _to):
-                    self._handle_agreement_created_event(event_log)
+                # reorg checks only run with a confirmation depth, they cost a getBlock
+                if self._reorg_tracker.confirmations:
+                    self._handle_reorg()
+
+                # logs pushed by the node are handled right away, the range scan below
+                # still covers them in case the subscription dropped some; with a
+                # confirmation depth they are left to the scan, which picks them up as
+                # soon as their block is confirmed
+                pushed_logs = self._block_source.pop_logs()
+                if not self._reorg_tracker.confirmations:
+                    for log in pushed_logs:
+                        event = self._agreement_log_fetcher.decode_log(log)
+                        if event is not None:
+                            self._handle_new_log(event)
 
-                self.last_processed_block = _to
+                _from, _to = self.get_next_block_range()
+                for chunk_from, chunk_to, event_logs in self._block_scanner.scan(_from, _to):
+                    self._invalidate_updated_ddos(chunk_from, chunk_to)
+                    # block hashes are recorded from the logs, only blocks holding
+                    # agreements need to be rolled back
+                    for event_log in event_logs:
+                        self._handle_new_log(event_log)
+
+                    # record progress per window so an error resumes mid-range
+                    self.last_processed_block = chunk_to
+                    self._last_processed_gauge.set(chunk_to)
+                    self.db.update_checkpoint(self.AGREEMENT_CREATED_CHECKPOINT, chunk_to)
 
             except (KeyError, Exception) as e:
+                self._monitor_errors.inc()
                 debug_log(f'Error processing event: {str(e)}')
 
-            time.sleep(self._monitor_sleep_time)
+            self._block_source.wait_for_new_block(
+                self.last_processed_block, self._poll_scheduler.next_delay())
+
+    def _handle_new_log(self, event_log):
+        if not self._reorg_tracker.is_new_log(event_log):
+            return
+
+        self._reorg_tracker.record_log_block(event_log)
+        self._handle_agreement_created_event(event_log)
+
+    def _handle_reorg(self):
+        """Roll back the agreements of blocks replaced by a chain reorganization."""
+        fork_block = self._reorg_tracker.find_fork_block()
+        if fork_block is None:
+            return
+
+        agreement_ids = self.db.rollback_agreements(fork_block)
+        for agreement_id in agreement_ids:
+            self.known_agreement_ids.discard(agreement_id)
+            for dispatcher in self._condition_dispatchers.values():
+                dispatcher.unsubscribe(agreement_id)
+
+        self._reorg_tracker.rollback(fork_block)
+        self._reorgs.inc()
+        self.last_processed_block = fork_block - 1
+        self.db.update_checkpoint(self.AGREEMENT_CREATED_CHECKPOINT, fork_block - 1)
+        logger.warning(f'chain reorganization from block {fork_block}, rolled back '
+                       f'{len(agreement_ids)} agreements')
 
     def get_agreement_events(self, from_block, to_block):
-        event_filter = self._keeper.escrow_access_secretstore_template \
-            .get_event_filter_for_agreement_created(
-                self._account.address, from_block, to_block)
-        event_filter2 = self._keeper.escrow_compute_execution_template \
-            .get_event_filter_for_agreement_created(
-                self._account.address, from_block, to_block)
         debug_log(
-            f'getting event logs in range {from_block} to {to_block} for provider address '
-            f'{self._account.address}'
+            f'getting event logs in range {from_block} to {to_block} for provider addresses '
+            f'{", ".join(self._accounts)}'
         )
-        logs = event_filter.get_all_entries(max_tries=5)
-        logs2 = event_filter2.get_all_entries(max_tries=5)
-        logs3 = logs + logs2
-        return logs3
+        with self._get_logs_histogram.time():
+            return self._agreement_log_fetcher.get_logs(from_block, to_block)
+
+    def _invalidate_updated_ddos(self, from_block, to_block):
+        """Drop cached DDOs whose DIDRegistry attribute changed in the block range."""
+        if not len(self._ddo_cache):
+            return
+
+        for log in self._web3.eth.getLogs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'address': self._keeper.did_registry.address,
+            'topics': [self._did_attribute_topic]
+        }):
+            self._ddo_cache.invalidate(id_to_did(log['topics'][1]))
 
     def _handle_agreement_created_event(self, event, *_):
         if not event or not event.args:
             return
 
-        if self._account.address != event.args["_accessProvider"]:
+        account = self._get_account(event.args["_accessProvider"])
+        if account is None:
             debug_log(f'skip agreement event because it does not match my provider '
-                      f'address {self._account.address}, event provider '
+                      f'addresses {", ".join(self._accounts)}, event provider '
                       f'address is {event.args["_accessProvider"]}')
             return
         agreement_id = None
         try:
             agreement_id = self._web3.toHex(event.args["_agreementId"])
-            ids = self.db.get_agreement_ids()
-            if ids:
-                # logger.info(f'got agreement ids: #{agreement_id}#, ##{ids}##, \nid in ids: {
-                # agreement_id in ids}')
-                if agreement_id in ids:
-                    debug_log(
-                        f'handle_agreement_created: skipping service agreement {agreement_id} '
-                        f'because it already been processed before.')
-                    return
+            if agreement_id in self.known_agreement_ids:
+                debug_log(
+                    f'handle_agreement_created: skipping service agreement {agreement_id} '
+                    f'because it already been processed before.')
+                return
 
             debug_log(
                 f'Start handle_agreement_created (agreementId {agreement_id}): event_args='
                 f'{event.args}')
 
             did = id_to_did(event.args["_did"])
-            agreement = self._keeper.agreement_manager.get_agreement(agreement_id)
-            unfulfilled_conditions = self._get_unfulfill_conditions(agreement.template_id)
+            # the emitting template contract is the agreement's template id
+            template_id = event.address
+            unfulfilled_conditions = self._get_unfulfill_conditions(template_id)
             self.process_condition_events(
                 agreement_id, unfulfilled_conditions, did, event.args['_accessConsumer'],
-                event.blockNumber, new_agreement=True, template_id=agreement.template_id
+                event.blockNumber, new_agreement=True, template_id=template_id,
+                account=account
             )
 
             debug_log(f'handle_agreement_created()  (agreementId {agreement_id}) -- '
@@ -264,44 +619,131 @@ class ProviderEventsMonitor:
             logger.error(f'Error in handle_agreement_created (agreementId {agreement_id}): {e}',
                          exc_info=1)
 
-    def _last_condition_fulfilled(self, _, agreement_id, cond_name_to_id):
+    def _record_stage_transition(self, agreement_id, stage, block_number, local_time=None):
+        # the block timestamp is filled in by `fill_block_timestamps`, off the event path
+        self.db.record_stage_transition(
+            agreement_id, stage, block_number, None, local_time or time.time())
+
+    def fill_block_timestamps(self):
+        """Read the timestamps of the blocks of stage transitions recorded without one.
+
+        The blocks are read in JSON-RPC batches, once per block, when a report needs them.
+        """
+        block_numbers = self.db.get_blocks_without_timestamp()
+        batcher = self._condition_state_reader.batcher
+        futures = {block_number: batcher.submit('eth_getBlockByNumber', [hex(block_number), False])
+                   for block_number in block_numbers}
+        deadline = time.time() + self._condition_state_reader.timeout
+        block_timestamps = {}
+        for block_number, future in futures.items():
+            try:
+                block = future.result(max(deadline - time.time(), 0))
+            except Exception as e:
+                logger.debug(f'failed to get the timestamp of block {block_number}: {e}')
+                continue
+            if block:
+                timestamp = block['timestamp']
+                block_timestamps[block_number] = \
+                    int(timestamp, 16) if isinstance(timestamp, str) else int(timestamp)
+
+        self.db.set_block_timestamps(block_timestamps)
+
+    def _timed_condition_callback(self, cond, fn):
+        """Wrap an event callback of condition `cond` to record when it was fulfilled."""
+        def _callback(event, agreement_id, *args):
+            if event:
+                try:
+                    self._record_stage_transition(agreement_id, cond, event.blockNumber)
+                except Exception as e:
+                    logger.debug(f'failed to record {cond} timing of {agreement_id}: {e}')
+            return fn(event, agreement_id, *args)
+
+        return _callback
+
+    def _record_fulfillment_transaction(self, agreement_id, contract_name, tx_hash,
+                                        submit_time, mined_time):
+        cond = self._contract_conditions.get(contract_name)
+        if cond is not None:
+            self.db.record_stage_transaction(
+                agreement_id, cond, self._web3.toHex(tx_hash), submit_time, mined_time)
+
+    def get_stage_latency_report(self, agreement_type=ServiceTypes.ASSET_ACCESS, since=None,
+                                 until=None):
+        """Return the p50/p95/p99 stage latencies of agreements of `agreement_type`.
+
+        :param agreement_type: str service type selecting the template conditions order
+        :param since: float local time where the window starts, unbounded if None
+        :param until: float local time where the window ends, unbounded if None
+        :return: dict, see `AgreementsStorage.get_stage_latency_report`
+        """
+        template = self._template_registry.get_by_type(agreement_type)
+        self.fill_block_timestamps()
+        return self.db.get_stage_latency_report(
+            [AGREEMENT_CREATED_STAGE] + list(template.conditions_order), since, until)
+
+    def _last_condition_fulfilled(self, _, agreement_id, cond_name_to_id, start_time=None):
         # update db, escrow reward status to fulfilled
         # log the success of this transaction
         db = self.db
-        for cond, _id in cond_name_to_id.items():
-            state = self._keeper.condition_manager.get_condition_state(_id)
+        conditions = list(cond_name_to_id.items())
+        states = self._condition_state_reader.get_condition_states(
+            [_id for _, _id in conditions])
+        for (cond, _), state in zip(conditions, states):
             db.update_condition_status(agreement_id, cond, state)
 
+        if start_time is not None:
+            self._completion_histogram.observe(time.time() - start_time)
         logger.info(f'Agreement {agreement_id} is completed, all conditions are fulfilled.')
 
     def process_condition_events(self, agreement_id, conditions, did,
                                  consumer_address, block_number, new_agreement=True,
-                                 template_id=None):
-
-        ddo = DIDResolver(self._keeper.did_registry).resolve(did)
-
-        cond_order = self._get_conditions_order(template_id)
-        agreement_type = self._get_agreement_type(template_id)
+                                 template_id=None, ddo=None, account=None):
+        """Record a new agreement and subscribe to the events of its `conditions`.
+
+        :param account: Account of the agreement's provider, signing its fulfillments,
+            the default account if None
+        """
+        origin = 'new' if new_agreement else 'pending'
+        with self._process_conditions_histogram.labels(origin).time():
+            self._process_condition_events(agreement_id, conditions, did, consumer_address,
+                                           block_number, new_agreement, template_id, ddo,
+                                           account or self._account)
+        self._agreements_counter.labels(origin).inc()
+
+    def _process_condition_events(self, agreement_id, conditions, did, consumer_address,
+                                  block_number, new_agreement, template_id, ddo, account):
+        if ddo is None:
+            ddo = self._ddo_cache.get(did)
+
+        template = self._template_registry.get(template_id)
+        cond_order = template.conditions_order
+        agreement_type = template.agreement_type
         service_agreement = ddo.get_service(agreement_type)
         if not service_agreement:
+            known_ids = ' and '.join(t.contract.address for t in self._template_registry.templates)
             logger.warning(
                 f'Failed to find service agreement of type {agreement_type} and '
                 f'templateId {template_id}. \nKnown template ids are:'
-                f'{self._keeper.escrow_access_secretstore_template.address} and '
-                f'{self._keeper.escrow_compute_execution_template.address}.'
+                f'{known_ids}.'
                 f'Processing service agreement {agreement_id} failed.'
             )
 
         condition_def_dict = service_agreement.condition_by_name
         price = service_agreement.get_price()
+        created_time = None
         if new_agreement:
+            created_time = time.time()
             start_time = int(datetime.now().timestamp())
             self.db.record_service_agreement(
                 agreement_id, ddo.did, service_agreement.index, price,
                 ddo.metadata.get('encryptedFiles'), consumer_address, start_time,
                 block_number, agreement_type,
-                service_agreement.condition_by_name.keys()
+                service_agreement.condition_by_name.keys(),
+                provider=account.address
             )
+            self._record_stage_transition(
+                agreement_id, AGREEMENT_CREATED_STAGE, block_number, created_time)
+            self.known_agreement_ids.add(agreement_id)
 
         condition_ids = service_agreement.generate_agreement_condition_ids(
             agreement_id=agreement_id,
@@ -312,75 +754,38 @@ class ProviderEventsMonitor:
         )
         cond_to_id = {cond_order[i]: _id for i, _id in enumerate(condition_ids)}
         for cond in conditions:
-
-            if cond == 'lockReward':
-                if agreement_type == ServiceTypes.ASSET_ACCESS:
-                    condition = lockRewardCondition.fulfillAccessSecretStoreCondition
+            handler = template.handlers.get(cond)
+            if handler is not None:
+                condition = self._fulfillment_executor.callback(
+                    handler.fulfills, self._timed_condition_callback(cond, handler.handler),
+                    delay=handler.delay)
+                if handler.fulfills == 'escrowReward':
+                    callback_args = (agreement_id, service_agreement, price, consumer_address,
+                                     account, condition_ids, cond_to_id['escrowReward'])
                 else:
-                    condition = lockRewardExecutionCondition.fulfillExecComputeCondition
-                self._keeper.lock_reward_condition.subscribe_condition_fulfilled(
-                    agreement_id,
-                    max(condition_def_dict['lockReward'].timeout, self.EVENT_WAIT_TIMEOUT),
-                    condition,
-                    (agreement_id, ddo.did, service_agreement, consumer_address,
-                     self._account, condition_ids[0]),
-                    from_block=block_number)
-
-            elif cond == 'accessSecretStore':
-                self._keeper.access_secret_store_condition.subscribe_condition_fulfilled(
-                    agreement_id,
-                    max(condition_def_dict['accessSecretStore'].timeout,
-                        self.EVENT_WAIT_TIMEOUT),
-                    accessSecretStore.fulfillEscrowRewardCondition,
-                    (agreement_id, service_agreement, price, consumer_address, self._account,
-                     condition_ids, condition_ids[2]),
-                    from_block=block_number
-                )
-            elif cond == 'execCompute':
-                self._keeper.compute_execution_condition.subscribe_condition_fulfilled(
-                    agreement_id,
-                    max(condition_def_dict['execCompute'].timeout, self.EVENT_WAIT_TIMEOUT),
-                    accessSecretStore.fulfillEscrowRewardCondition,
-                    (agreement_id, service_agreement, price, consumer_address, self._account,
-                     condition_ids, condition_ids[2]),
-                    from_block=block_number
-                )
-            elif cond == 'escrowReward':
-                self._keeper.escrow_reward_condition.subscribe_condition_fulfilled(
-                    agreement_id,
-                    max(condition_def_dict['escrowReward'].timeout,
-                        self.EVENT_WAIT_TIMEOUT),
-                    self._last_condition_fulfilled,
-                    (agreement_id, cond_to_id),
-                    from_block=block_number
-                )
+                    callback_args = (agreement_id, ddo.did, service_agreement, consumer_address,
+                                     account, cond_to_id[handler.fulfills])
+            elif cond == template.unfulfilled_conditions[-1]:
+                condition = self._fulfillment_executor.callback(
+                    'agreementCompleted',
+                    self._timed_condition_callback(cond, self._last_condition_fulfilled))
+                callback_args = (agreement_id, cond_to_id, created_time)
+            else:
+                continue
+
+            self._condition_dispatchers[cond].subscribe(
+                agreement_id,
+                max(condition_def_dict[cond].timeout, self.EVENT_WAIT_TIMEOUT),
+                condition,
+                callback_args,
+                from_block=block_number
+            )
 
     def _get_unfulfill_conditions(self, template_id):
-        if self._get_agreement_type(template_id) == ServiceTypes.ASSET_ACCESS:
-            return ['lockReward', 'accessSecretStore', 'escrowReward']
-        elif self._get_agreement_type(template_id) == ServiceTypes.CLOUD_COMPUTE:
-            return ['lockReward', 'execCompute', 'escrowReward']
-        else:
-            return None
+        return self._template_registry.get(template_id).unfulfilled_conditions
 
     def _get_conditions_order(self, template_id):
-        if self._get_agreement_type(template_id) == ServiceTypes.ASSET_ACCESS:
-            return ['accessSecretStore', 'lockReward', 'escrowReward']
-        elif self._get_agreement_type(template_id) == ServiceTypes.CLOUD_COMPUTE:
-            return ['execCompute', 'lockReward', 'escrowReward']
-        else:
-            return None
+        return self._template_registry.get(template_id).conditions_order
 
     def _get_agreement_type(self, template_id):
-        access_template_id = generate_multi_value_hash(
-            ['string'], [self._keeper.escrow_access_secretstore_template.CONTRACT_NAME])
-        compute_template_id = generate_multi_value_hash(
-            ['string'], [self._keeper.escrow_compute_execution_template.CONTRACT_NAME])
-        if template_id == self._keeper.escrow_access_secretstore_template.address or \
-                template_id == access_template_id:
-            return ServiceTypes.ASSET_ACCESS
-        elif template_id == self._keeper.escrow_compute_execution_template.address or \
-                template_id == compute_template_id:
-            return ServiceTypes.CLOUD_COMPUTE
-
-        return ServiceTypes.ASSET_ACCESS
+        return self._template_registry.get(template_id).agreement_type
@@ -0,0 +1,102 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+from collections import OrderedDict
+
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+
+def _to_hex(value):
+    return value if isinstance(value, str) else Web3.toHex(value)
+
+
+class ReorgTracker:
+    """Confirmation window, recent log dedup cache and reorg detection for the monitor.
+
+    The monitor only scans blocks that are `confirmations` blocks behind the chain head.
+    The hashes of the last `max_blocks` processed blocks are kept in a ring buffer; when
+    the chain no longer has the same hash for the newest of them, the tracker walks back
+    to the last block both agree on, which is where processing resumes. The
+    `(transactionHash, logIndex)` keys of the last `max_logs` processed logs are kept as
+    well, so logs returned again by overlapping block ranges are skipped in memory.
+    """
+    CONFIRMATIONS = 0
+    MAX_BLOCKS = 256
+    MAX_LOGS = 10000
+
+    def __init__(self, web3, confirmations=None, max_blocks=None, max_logs=None):
+        """
+
+        :param web3: Web3 instance
+        :param confirmations: int number of blocks a block must be behind the head to be
+            processed
+        :param max_blocks: int number of recent block hashes kept for reorg detection
+        :param max_logs: int number of recent log keys kept for dedup
+        """
+        self._web3 = web3
+        self._confirmations = int(confirmations or self.CONFIRMATIONS)
+        self._max_blocks = int(max_blocks or self.MAX_BLOCKS)
+        self._max_logs = int(max_logs or self.MAX_LOGS)
+        self._block_hashes = OrderedDict()
+        self._log_keys = OrderedDict()
+
+    @property
+    def confirmations(self):
+        return self._confirmations
+
+    def safe_block(self, latest_block):
+        """Return the newest block with enough confirmations given the chain head."""
+        return max(latest_block - self._confirmations, 0)
+
+    @staticmethod
+    def log_key(log):
+        return _to_hex(log['transactionHash']), log['logIndex']
+
+    def is_new_log(self, log):
+        """Return False if `log` was already seen, otherwise remember it and return True."""
+        key = self.log_key(log)
+        if key in self._log_keys:
+            return False
+
+        self._log_keys[key] = log['blockNumber']
+        while len(self._log_keys) > self._max_logs:
+            self._log_keys.popitem(last=False)
+        return True
+
+    def record_block(self, block_number, block_hash):
+        """Remember the hash of a processed block."""
+        self._block_hashes[block_number] = _to_hex(block_hash)
+        self._block_hashes.move_to_end(block_number)
+        while len(self._block_hashes) > self._max_blocks:
+            self._block_hashes.popitem(last=False)
+
+    def record_log_block(self, log):
+        self.record_block(log['blockNumber'], log['blockHash'])
+
+    def _chain_hash(self, block_number):
+        block = self._web3.eth.getBlock(block_number)
+        return _to_hex(block['hash']) if block else None
+
+    def find_fork_block(self):
+        """Return the first recorded block replaced by a reorg, or None if there was none.
+
+        Compares the newest recorded block hash with the chain and, on a mismatch, walks
+        back through the recorded blocks until one still matches.
+        """
+        fork_block = None
+        for block_number in sorted(self._block_hashes, reverse=True):
+            if self._chain_hash(block_number) == self._block_hashes[block_number]:
+                break
+            fork_block = block_number
+
+        return fork_block
+
+    def rollback(self, fork_block):
+        """Forget blocks and logs from `fork_block` onwards."""
+        for block_number in [n for n in self._block_hashes if n >= fork_block]:
+            del self._block_hashes[block_number]
+        for key in [k for k, n in self._log_keys.items() if n >= fork_block]:
+            del self._log_keys[key]
@@ -0,0 +1,230 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from ocean_keeper.keeper import Keeper
+from ocean_keeper.web3.request import make_post_request
+from ocean_keeper.web3_provider import Web3Provider
+
+logger = logging.getLogger(__name__)
+
+_request_ids = itertools.count()
+
+
+def make_batch_request(provider, requests):
+    """Send several JSON-RPC requests to `provider` in one batch.
+
+    :param provider: web3 HTTP provider
+    :param requests: list of (method, params) tuples
+    :return: list of JSON-RPC response dicts, in the order of `requests`
+    """
+    if hasattr(provider, 'make_batch_request'):
+        return provider.make_batch_request(requests)
+
+    batch = [
+        {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': next(_request_ids)}
+        for method, params in requests
+    ]
+    raw_response = make_post_request(
+        provider.endpoint_uri,
+        json.dumps(batch).encode('utf-8'),
+        **provider.get_request_kwargs()
+    )
+    responses = {response['id']: response for response in json.loads(raw_response)}
+    return [responses.get(request['id'], {'error': {'message': 'missing response'}})
+            for request in batch]
+
+
+class RPCBatcher:
+    """Gather JSON-RPC requests from many threads and send them as batches.
+
+    `submit` returns a `Future` right away. A sender thread waits `tick` seconds after
+    the first request comes in, then sends everything queued (up to `max_batch_size`
+    requests) as one JSON-RPC batch and resolves each future with its own result.
+    """
+    MAX_BATCH_SIZE = 100
+    TICK = 0.05
+
+    def __init__(self, web3, max_batch_size=None, tick=None):
+        """
+
+        :param web3: Web3 instance whose provider receives the batches
+        :param max_batch_size: int max number of requests per batch
+        :param tick: float seconds to wait for more requests before sending a batch
+        """
+        self._web3 = web3
+        self._max_batch_size = int(max_batch_size or self.MAX_BATCH_SIZE)
+        self._tick = float(tick or self.TICK)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self.num_batches = 0
+        self.num_requests = 0
+
+    def submit(self, method, params):
+        """Queue a JSON-RPC request.
+
+        :return: Future resolved with the `result` of the response
+        """
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='rpc-batcher')
+                self._thread.start()
+            self._queue.append((method, params, future))
+            self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # leave `tick` seconds to other callers of this round to queue their requests
+            deadline = time.time() + self._tick
+            while len(self._queue) < self._max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._queue[:self._max_batch_size]
+            self._queue = self._queue[self._max_batch_size:]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._next_batch()
+                self.send(batch)
+            except Exception as e:
+                # the sender thread must outlive any error, callers block on its futures
+                logger.error(f'JSON-RPC batcher failed on a batch of {len(batch)} requests: {e}',
+                             exc_info=True)
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def send(self, batch):
+        """Send a list of (method, params, future) as one batch and resolve the futures."""
+        try:
+            responses = make_batch_request(
+                self._web3.providers[0], [(method, params) for method, params, _ in batch])
+        except Exception as e:
+            logger.warning(f'JSON-RPC batch of {len(batch)} requests failed: {e}')
+            self._fail(batch, e)
+            return
+
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        for (method, _, future), response in zip(batch, responses):
+            if future.done():
+                continue
+            if 'error' in response:
+                future.set_exception(ValueError(f'{method} failed: {response["error"]}'))
+            else:
+                future.set_result(response.get('result'))
+        self._fail(batch, ValueError(
+            f'JSON-RPC batch returned {len(responses)} responses to {len(batch)} requests'))
+
+
+class ConditionStateReader:
+    """Read condition states with `eth_call`s sent through an `RPCBatcher`.
+
+    Reads from all agreements issued within the same tick share one HTTP round trip.
+    `get_condition_state` can replace `keeper.condition_manager.get_condition_state`.
+    A read the batch has not answered within `timeout` seconds is sent as a direct
+    `eth_call` instead.
+    """
+    TIMEOUT = 10
+    _instance = None
+
+    def __init__(self, condition_manager, batcher, timeout=None):
+        """
+
+        :param condition_manager: keeper ConditionStoreManager contract
+        :param batcher: RPCBatcher
+        :param timeout: float seconds to wait for a batched read
+        """
+        self._condition_manager = condition_manager
+        self._batcher = batcher
+        self._timeout = float(timeout or self.TIMEOUT)
+
+    @staticmethod
+    def get_instance():
+        if ConditionStateReader._instance is None:
+            ConditionStateReader._instance = ConditionStateReader(
+                Keeper.get_instance().condition_manager,
+                RPCBatcher(Web3Provider.get_web3()),
+                timeout=os.getenv('OCN_EVENTS_MONITOR_RPC_TIMEOUT')
+            )
+        return ConditionStateReader._instance
+
+    @property
+    def batcher(self):
+        return self._batcher
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    def get_condition_state_async(self, condition_id):
+        """
+        :param condition_id: hex str id of the condition
+        :return: Future resolved with the int state of the condition
+        """
+        call_data = self._condition_manager.contract.functions.getConditionState(
+            condition_id)._encode_transaction_data()
+        call_future = self._batcher.submit(
+            'eth_call', [{'to': self._condition_manager.address, 'data': call_data}, 'latest'])
+
+        future = Future()
+
+        def _decode(done):
+            try:
+                future.set_result(int(done.result(), 16))
+            except Exception as e:
+                future.set_exception(e)
+
+        call_future.add_done_callback(_decode)
+        return future
+
+    def get_condition_state(self, condition_id):
+        """Return the state of the condition (0 Uninitialized, 1 Unfulfilled, 2 Fulfilled,
+        3 Aborted).
+
+        :param condition_id: hex str id of the condition
+        """
+        return self._result(condition_id, self.get_condition_state_async(condition_id),
+                            self._timeout)
+
+    def get_condition_states(self, condition_ids):
+        """Return the states of all `condition_ids`, read in the same batch.
+
+        :param condition_ids: list of hex str condition ids
+        :return: list of int
+        """
+        futures = [self.get_condition_state_async(_id) for _id in condition_ids]
+        deadline = time.time() + self._timeout
+        return [self._result(_id, future, max(deadline - time.time(), 0))
+                for _id, future in zip(condition_ids, futures)]
+
+    def _result(self, condition_id, future, timeout):
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            logger.warning(f'batched read of condition {condition_id} timed out, '
+                           f'reading it directly')
+            return self._condition_manager.get_condition_state(condition_id)
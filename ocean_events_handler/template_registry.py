@@ -0,0 +1,123 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import logging
+from collections import namedtuple
+
+from ocean_keeper.utils import generate_multi_value_hash
+from ocean_utils.agreements.service_types import ServiceTypes
+
+from ocean_events_handler.event_handlers import event_handlers_map
+
+logger = logging.getLogger(__name__)
+
+AgreementTemplate = namedtuple(
+    'AgreementTemplate',
+    ('contract', 'agreement_type', 'conditions_order', 'unfulfilled_conditions',
+     'condition_contracts', 'handlers')
+)
+
+
+class TemplateRegistry:
+    """Lookup table from agreement template id to everything needed to process its agreements.
+
+    Each template is registered once with its agreement type, the order of its condition
+    ids, the conditions to watch and the fulfillment handlers to run on each condition
+    event. Lookups by template address or by template id hash are plain dict lookups.
+    """
+
+    def __init__(self, default_type=None):
+        """
+
+        :param default_type: str agreement type returned for unknown template ids
+        """
+        self._default_type = default_type
+        self._templates = []
+        self._by_id = {}
+        self._by_type = {}
+
+    @property
+    def templates(self):
+        return list(self._templates)
+
+    @property
+    def condition_contracts(self):
+        """dict of condition name to condition contract over all registered templates."""
+        contracts = {}
+        for template in self._templates:
+            contracts.update(template.condition_contracts)
+        return contracts
+
+    def register(self, contract, agreement_type, conditions_order, unfulfilled_conditions,
+                 condition_contracts, handlers=None):
+        """
+
+        :param contract: keeper agreement template contract (`TemplateBase`)
+        :param agreement_type: str e.g. `ServiceTypes.ASSET_ACCESS`
+        :param conditions_order: list of condition names in the order of the condition ids
+        :param unfulfilled_conditions: list of condition names to watch for a new agreement
+        :param condition_contracts: dict condition name -> keeper condition contract
+        :param handlers: dict condition name -> callable run when that condition is fulfilled,
+            defaults to `event_handlers_map[agreement_type]`
+        :return: AgreementTemplate
+        """
+        template = AgreementTemplate(
+            contract,
+            agreement_type,
+            list(conditions_order),
+            list(unfulfilled_conditions),
+            dict(condition_contracts),
+            dict(handlers if handlers is not None else event_handlers_map.get(agreement_type, {}))
+        )
+        template_id_hash = generate_multi_value_hash(['string'], [contract.CONTRACT_NAME])
+        self._templates.append(template)
+        self._by_id[contract.address] = template
+        self._by_id[template_id_hash] = template
+        self._by_type[agreement_type] = template
+        logger.debug(f'registered agreement template {contract.CONTRACT_NAME} '
+                     f'({agreement_type}) at {contract.address}')
+        return template
+
+    def get(self, template_id):
+        """Return the AgreementTemplate for a template address or id hash.
+
+        Unknown template ids map to the template of the default agreement type.
+        """
+        template = self._by_id.get(template_id)
+        if template is None:
+            template = self._by_type.get(self._default_type)
+        return template
+
+    def get_by_type(self, agreement_type):
+        return self._by_type.get(agreement_type)
+
+
+def build_template_registry(keeper):
+    """Return a TemplateRegistry with the access and compute agreement templates of `keeper`.
+
+    :param keeper: Keeper instance
+    """
+    registry = TemplateRegistry(default_type=ServiceTypes.ASSET_ACCESS)
+    registry.register(
+        keeper.escrow_access_secretstore_template,
+        ServiceTypes.ASSET_ACCESS,
+        ['accessSecretStore', 'lockReward', 'escrowReward'],
+        ['lockReward', 'accessSecretStore', 'escrowReward'],
+        {
+            'lockReward': keeper.lock_reward_condition,
+            'accessSecretStore': keeper.access_secret_store_condition,
+            'escrowReward': keeper.escrow_reward_condition,
+        }
+    )
+    registry.register(
+        keeper.escrow_compute_execution_template,
+        ServiceTypes.CLOUD_COMPUTE,
+        ['execCompute', 'lockReward', 'escrowReward'],
+        ['lockReward', 'execCompute', 'escrowReward'],
+        {
+            'lockReward': keeper.lock_reward_condition,
+            'execCompute': keeper.compute_execution_condition,
+            'escrowReward': keeper.escrow_reward_condition,
+        }
+    )
+    return registry
@@ -0,0 +1,340 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+import atexit
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from ocean_utils.ddo.ddo import DDO
+from web3.providers.base import BaseProvider
+
+from ocean_events_handler.rpc_batch import make_batch_request
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    raise TypeError(f'cannot record value of type {type(value).__name__}')
+
+
+def _params_key(method, params):
+    return method, json.dumps(params or [], sort_keys=True, default=_json_default)
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_traffic(path):
+    """Yield the entries of a traffic file in the order they were written.
+
+    A last line cut short by a crash of the recording process is skipped.
+    """
+    with _open(path, 'r') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f'skipping truncated entry in traffic file {path}')
+
+
+class TrafficLog:
+    """Append-only file of the JSON-RPC responses and DDOs the events monitor received.
+
+    Every entry is one compact JSON line: `t` is the unix time it was received, an RPC
+    entry has the method `m`, params `p` and either the result `r` or the error `e`, and a
+    DDO entry has the DID `ddo` and the DDO text `r`. Paths ending with `.gz` are gzip
+    compressed. Writes are buffered and flushed at most every `flush_interval` seconds
+    and when the process exits; recording into an existing file appends to it.
+    """
+    FLUSH_INTERVAL = 1
+
+    def __init__(self, path, flush_interval=None):
+        """
+
+        :param path: str path of the traffic file
+        :param flush_interval: float max seconds between flushes to disk
+        """
+        self.path = path
+        self._flush_interval = float(flush_interval or self.FLUSH_INTERVAL)
+        self._file = _open(path, 'a')
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self.num_entries = 0
+        atexit.register(self.close)
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'), default=_json_default) + '\n'
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line)
+            self.num_entries += 1
+            if time.time() - self._last_flush >= self._flush_interval:
+                self._file.flush()
+                self._last_flush = time.time()
+
+    def record_response(self, method, params, response):
+        entry = {'t': time.time(), 'm': method, 'p': params or []}
+        if 'error' in response:
+            entry['e'] = response['error']
+        else:
+            entry['r'] = response.get('result')
+        self._write(entry)
+
+    def record_ddo(self, did, ddo):
+        self._write({'t': time.time(), 'ddo': did, 'r': ddo.as_text()})
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._last_flush = time.time()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class RecordingProvider(BaseProvider):
+    """Web3 provider that records every response of the wrapped provider to a `TrafficLog`.
+
+    Single requests and the items of JSON-RPC batches are recorded alike. Other attributes,
+    e.g. the `stats` of a `PooledHTTPProvider`, are those of the wrapped provider.
+    """
+
+    def __init__(self, provider, traffic_log):
+        """
+
+        :param provider: web3 provider sending the requests to the node
+        :param traffic_log: TrafficLog the responses are written to
+        """
+        self._provider = provider
+        self._traffic_log = traffic_log
+
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+    def __str__(self):
+        return f'Recording {self._provider} to {self._traffic_log.path}'
+
+    def isConnected(self):
+        return self._provider.isConnected()
+
+    def make_request(self, method, params):
+        response = self._provider.make_request(method, params)
+        self._traffic_log.record_response(method, params, response)
+        return response
+
+    def make_batch_request(self, requests):
+        responses = make_batch_request(self._provider, requests)
+        for (method, params), response in zip(requests, responses):
+            self._traffic_log.record_response(method, params, response)
+        return responses
+
+    def wrap_ddo_resolver(self, resolve):
+        """Return `resolve` recording the DDOs it returns."""
+        def _resolve(did):
+            ddo = resolve(did)
+            if ddo is not None:
+                self._traffic_log.record_ddo(did, ddo)
+            return ddo
+
+        return _resolve
+
+
+class ReplayProvider(BaseProvider):
+    """Web3 provider answering requests from a traffic file instead of a node.
+
+    Responses are matched on method and params and handed out in the order they were
+    recorded, the last one being repeated once they are used up; e.g. successive
+    `eth_blockNumber` calls see the chain head advance as it did while recording. Logs
+    and blocks are indexed from all recorded responses, so `eth_getLogs` is answered for
+    any block range and filter, not only the exact requests that were recorded.
+
+    With `speed` set, a recorded response is not returned before its recorded time
+    (relative to the first entry, divided by `speed`) has elapsed since the replay
+    started; without it the traffic is replayed as fast as the monitor asks for it.
+    """
+    LOG_METHODS = ('eth_getLogs', 'eth_getFilterLogs', 'eth_getFilterChanges')
+    # when the exact request was not recorded, the next response of the method is used,
+    # e.g. a fulfill transaction signed with another gas price
+    SEQUENTIAL_METHODS = ('eth_sendRawTransaction',)
+
+    def __init__(self, path, speed=None):
+        """
+
+        :param path: str path of a traffic file written by `TrafficLog`
+        :param speed: float replay speed relative to the recording, None for no waits
+        """
+        self.path = path
+        self._speed = float(speed) if speed else None
+        self._responses = defaultdict(deque)
+        self._last_responses = {}
+        self._method_responses = defaultdict(deque)
+        self._used = set()
+        self._logs = {}
+        self._blocks = {}
+        self._ddos = {}
+        self._head = 0
+        self._lock = threading.Lock()
+        self._first_time = None
+        self._start_time = None
+        self.num_requests = 0
+        self.num_misses = 0
+        self._load(path)
+        logger.info(f'loaded traffic file {path}: {len(self._responses)} distinct requests, '
+                    f'{len(self._logs)} logs, {len(self._blocks)} blocks, '
+                    f'{len(self._ddos)} ddos')
+
+    def __str__(self):
+        return f'Replay of {self.path}'
+
+    def _load(self, path):
+        for entry in read_traffic(path):
+            if self._first_time is None:
+                self._first_time = entry['t']
+            if 'ddo' in entry:
+                self._ddos[entry['ddo']] = entry['r']
+                continue
+
+            method = entry['m']
+            self._responses[_params_key(method, entry['p'])].append(entry)
+            if method in self.SEQUENTIAL_METHODS:
+                self._method_responses[method].append(entry)
+            result = entry.get('r')
+            if method in self.LOG_METHODS and isinstance(result, list):
+                for log in result:
+                    if isinstance(log, dict):
+                        self._logs[(log['transactionHash'], log['logIndex'])] = log
+            elif method == 'eth_getBlockByNumber' and result:
+                self._blocks[(int(result['number'], 16), bool(entry['p'][1]))] = result
+
+        self._sorted_logs = sorted(
+            self._logs.values(), key=lambda log: (int(log['blockNumber'], 16),
+                                                  int(log['logIndex'], 16)))
+
+    def isConnected(self):
+        return True
+
+    def _wait(self, entry):
+        if self._speed is None:
+            return
+
+        if self._start_time is None:
+            self._start_time = time.time()
+        delay = self._start_time + (entry['t'] - self._first_time) / self._speed - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pop_unused(self, responses):
+        while responses:
+            entry = responses.popleft()
+            if id(entry) not in self._used:
+                return entry
+        return None
+
+    def _next_recorded(self, method, params):
+        key = _params_key(method, params)
+        with self._lock:
+            entry = self._pop_unused(self._responses.get(key))
+            if entry is not None:
+                self._last_responses[key] = entry
+            elif key in self._last_responses:
+                return self._last_responses[key]
+            else:
+                entry = self._pop_unused(self._method_responses.get(method))
+                if entry is None:
+                    return None
+            self._used.add(id(entry))
+
+        self._wait(entry)
+        return entry
+
+    def _block_number(self, value):
+        if value in (None, 'latest', 'pending'):
+            return self._head
+        if value == 'earliest':
+            return 0
+        return int(value, 16) if isinstance(value, str) else int(value)
+
+    def _get_logs(self, log_filter):
+        from_block = self._block_number(log_filter.get('fromBlock', 'latest'))
+        to_block = self._block_number(log_filter.get('toBlock', 'latest'))
+        addresses = log_filter.get('address')
+        if addresses:
+            addresses = {a.lower() for a in
+                         (addresses if isinstance(addresses, list) else [addresses])}
+        topics = log_filter.get('topics') or []
+        return [
+            log for log in self._sorted_logs
+            if from_block <= int(log['blockNumber'], 16) <= to_block
+            and (not addresses or log['address'].lower() in addresses)
+            and self._topics_match(log['topics'], topics)
+        ]
+
+    @staticmethod
+    def _topics_match(log_topics, topics):
+        if len(topics) > len(log_topics):
+            return False
+        for log_topic, topic in zip(log_topics, topics):
+            if topic is None:
+                continue
+            options = topic if isinstance(topic, list) else [topic]
+            if log_topic.lower() not in {option.lower() for option in options}:
+                return False
+        return True
+
+    def _handle(self, method, params):
+        if method == 'eth_getLogs':
+            return {'result': self._get_logs(params[0])}
+
+        if method == 'eth_getBlockByNumber':
+            block = self._blocks.get((self._block_number(params[0]), bool(params[1])))
+            if block is not None:
+                return {'result': block}
+
+        entry = self._next_recorded(method, params)
+        if entry is None:
+            self.num_misses += 1
+            logger.debug(f'no recorded response to {method} {params}')
+            return {'error': {'code': -32000,
+                              'message': f'no recorded response to {method} {params}'}}
+
+        if 'e' in entry:
+            return {'error': entry['e']}
+        if method == 'eth_blockNumber':
+            with self._lock:
+                self._head = max(self._head, int(entry['r'], 16))
+        return {'result': entry['r']}
+
+    def make_request(self, method, params):
+        with self._lock:
+            self.num_requests += 1
+            request_id = self.num_requests
+        response = self._handle(method, params)
+        response.update(jsonrpc='2.0', id=request_id)
+        return response
+
+    def make_batch_request(self, requests):
+        return [self.make_request(method, params) for method, params in requests]
+
+    def resolve_ddo(self, did):
+        """Return the recorded DDO of `did`."""
+        ddo_text = self._ddos.get(did)
+        if ddo_text is None:
+            raise ValueError(f'no recorded ddo for {did}')
+        return DDO(json_text=ddo_text)
+
+    def wrap_ddo_resolver(self, resolve):
+        """Return `resolve_ddo`, DDOs are replayed instead of resolved."""
+        return self.resolve_ddo
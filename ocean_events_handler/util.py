@@ -2,9 +2,12 @@ import os
 import site
 
 from ocean_keeper import Keeper
+from ocean_keeper.utils import get_account
 from ocean_keeper.web3_provider import Web3Provider
 
 from ocean_events_handler.config import Config
+from ocean_events_handler.http_provider import PooledHTTPProvider
+from ocean_events_handler.traffic_recorder import RecordingProvider, ReplayProvider, TrafficLog
 
 
 def get_config():
@@ -26,17 +29,68 @@ def get_keeper_path(config):
     return path
 
 
+ACCOUNT_ENVVARS = ('ADDRESS', 'PASSWORD', 'KEY', 'KEYFILE', 'ENCRYPTED_KEY')
+
+
+def _provider_account_indices():
+    index = 0
+    while index == 0 or os.getenv(f'PROVIDER_ADDRESS{index}'):
+        yield index
+        index += 1
+
+
 def init_account_envvars():
-    os.environ['PARITY_ADDRESS'] = os.getenv('PROVIDER_ADDRESS', '')
-    os.environ['PARITY_PASSWORD'] = os.getenv('PROVIDER_PASSWORD', '')
-    os.environ['PARITY_KEY'] = os.getenv('PROVIDER_KEY', '')
-    os.environ['PARITY_KEYFILE'] = os.getenv('PROVIDER_KEYFILE', '')
-    os.environ['PARITY_ENCRYPTED_KEY'] = os.getenv('PROVIDER_ENCRYPTED_KEY', '')
+    """Map the `PROVIDER_*` account variables to the `PARITY_*` ones read by the keeper.
+
+    Further provider accounts are numbered from 1, e.g. `PROVIDER_ADDRESS1` and
+    `PROVIDER_KEY1`, and are mapped for as long as their `PROVIDER_ADDRESS<n>` is set.
+    """
+    for index in _provider_account_indices():
+        suffix = str(index) if index else ''
+        for name in ACCOUNT_ENVVARS:
+            os.environ[f'PARITY_{name}{suffix}'] = os.getenv(f'PROVIDER_{name}{suffix}', '')
+
+
+def get_provider_accounts():
+    """Return the provider accounts mapped by `init_account_envvars`.
+
+    Only the indices of the `PROVIDER_ADDRESS<n>` variables are looked up, other
+    `PARITY_ADDRESS<n>` accounts of the environment, e.g. consumer accounts of a test
+    setup, are not provider accounts.
+    """
+    accounts = [get_account(index) for index in _provider_account_indices()]
+    return [account for account in accounts if account is not None]
 
 
 def keeper_instance():
     return Keeper.get_instance()
 
 
+def get_web3_provider(keeper_url):
+    """Return the pooled HTTP provider to the keeper node, tuned from the environment.
+
+    With `OCN_EVENTS_MONITOR_REPLAY_FILE` set, the responses recorded in that file are
+    replayed instead and no node is used. With `OCN_EVENTS_MONITOR_RECORD_FILE` set, the
+    node responses are recorded to that file.
+    """
+    replay_file = os.getenv('OCN_EVENTS_MONITOR_REPLAY_FILE')
+    if replay_file:
+        return ReplayProvider(replay_file, speed=os.getenv('OCN_EVENTS_MONITOR_REPLAY_SPEED'))
+
+    provider = PooledHTTPProvider(
+        keeper_url,
+        pool_size=os.getenv('OCN_EVENTS_MONITOR_RPC_POOL_SIZE'),
+        timeout=os.getenv('OCN_EVENTS_MONITOR_RPC_TIMEOUT'),
+        gzip=os.getenv('OCN_EVENTS_MONITOR_RPC_GZIP', 'false').lower() in ('1', 'true', 'yes')
+    )
+    record_file = os.getenv('OCN_EVENTS_MONITOR_RECORD_FILE')
+    if record_file:
+        provider = RecordingProvider(provider, TrafficLog(record_file))
+    return provider
+
+
 def web3():
-    return Web3Provider.get_web3(get_config().keeper_url)
+    # the provider owns a connection pool or a traffic file, only build one when needed
+    if Web3Provider._web3 is None:
+        Web3Provider.get_web3(provider=get_web3_provider(get_config().keeper_url))
+    return Web3Provider.get_web3()
@@ -0,0 +1,51 @@
+import pytest
+
+from ocean_events_handler.agreement_store.agreement_index import BloomFilter, KnownAgreementIndex
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+
+
+def _agreement_id(i):
+    return '0x' + format(i, '064x')
+
+
+@pytest.fixture
+def storage_path(tmp_path):
+    path = str(tmp_path / 'agreements.db')
+    db = AgreementsStorage(path)
+    db.create_tables()
+    for i in range(50):
+        db.record_service_agreement(
+            _agreement_id(i), 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, i, 'access',
+            ['lockReward', 'accessSecretStore', 'escrowReward']
+        )
+    return path
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [_agreement_id(i) for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(_agreement_id(i) in bloom for i in range(1000, 11000))
+    assert false_positives < 300
+
+
+def test_index_membership(storage_path):
+    index = KnownAgreementIndex(storage_path)
+    assert len(index) == 50
+    assert _agreement_id(3) in index
+    assert _agreement_id(99) not in index
+
+    index.add(_agreement_id(99))
+    assert _agreement_id(99) in index
+
+
+def test_index_with_bloom_filter_keeps_recent_ids_in_memory(storage_path):
+    index = KnownAgreementIndex(storage_path, since_block_number=40, bloom_threshold=10)
+    assert len(index) == 10
+    # older ids are confirmed through the bloom filter and the store
+    assert _agreement_id(3) in index
+    assert _agreement_id(45) in index
+    assert _agreement_id(99) not in index
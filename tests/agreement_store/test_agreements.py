@@ -1 +1,139 @@
+import pytest
 
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    db = AgreementsStorage(str(tmp_path / 'agreements.db'))
+    db.create_tables()
+    return db
+
+
+def test_checkpoint_roundtrip(storage, tmp_path):
+    assert storage.get_checkpoint('AgreementCreated') is None
+
+    storage.update_checkpoint('AgreementCreated', 100)
+    storage.update_checkpoint('AgreementCreated', 150)
+    storage.update_checkpoint('Other', 7)
+
+    reopened = AgreementsStorage(str(tmp_path / 'agreements.db'))
+    assert reopened.get_checkpoint('AgreementCreated') == 150
+    assert reopened.get_checkpoint('Other') == 7
+
+
+def test_get_agreements_joins_conditions(storage):
+    for i, block_number in enumerate((10, 20)):
+        storage.record_service_agreement(
+            f'0x{i}', 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, block_number, 'access',
+            ['lockReward', 'escrowReward']
+        )
+    storage.update_condition_status('0x1', 'lockReward', 2)
+
+    agreements, conditions = storage.get_agreements(since_block_number=15)
+    assert list(agreements) == ['0x1']
+    assert conditions == {'0x1': {'lockReward': 2, 'escrowReward': 1}}
+    assert storage.get_agreement_ids_with_condition_status()['0x0'] == {
+        'lockReward': 1, 'escrowReward': 1}
+
+
+def test_iter_pending_agreements_groups_rows_per_agreement(storage):
+    for i in range(7):
+        storage.record_service_agreement(
+            f'0x{i}', 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, 10 - i, 'access',
+            ['lockReward', 'accessSecretStore', 'escrowReward']
+        )
+    storage.update_condition_status('0x0', 'lockReward', 2)
+    for cond in ('lockReward', 'accessSecretStore', 'escrowReward'):
+        storage.update_condition_status('0x6', cond, 2)
+
+    records = list(storage.iter_pending_agreements(since_block_number=4, page_size=2))
+    assert [r.agreement_id for r in records] == ['0x5', '0x4', '0x3', '0x2', '0x1', '0x0']
+    assert records[-1].conditions == {'accessSecretStore': 1, 'escrowReward': 1}
+    assert records[-1].block_number == 10 and records[-1].type == 'access'
+
+    all_records = list(storage.iter_agreements(page_size=1))
+    assert len(all_records) == 7
+    assert all_records[0].conditions == {
+        'lockReward': 2, 'accessSecretStore': 2, 'escrowReward': 2}
+
+
+def test_agreements_are_partitioned_by_provider(storage):
+    for i, provider in enumerate(('0xprovider1', '0xprovider2', '0xprovider1', None)):
+        storage.record_service_agreement(
+            f'0x{i}', 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, 10 + i, 'access',
+            ['lockReward', 'escrowReward'], provider=provider
+        )
+    storage.update_condition_status('0x2', 'lockReward', 2)
+    storage.update_condition_status('0x2', 'escrowReward', 2)
+
+    records = list(storage.iter_pending_agreements(provider='0xprovider1'))
+    assert [(r.agreement_id, r.provider) for r in records] == [('0x0', '0xprovider1')]
+    assert [r.provider for r in storage.iter_agreements()] == [
+        '0xprovider1', '0xprovider2', '0xprovider1', None]
+    assert storage.get_agreement_count(provider='0xprovider1') == 2
+
+    assert storage.archive_agreements(100, 10) == 1
+    assert storage.get_agreement_count(include_archive=True, provider='0xprovider1') == 2
+    assert storage.get_agreement_count(provider='0xprovider1') == 1
+
+
+def test_rollback_agreements_removes_agreements_from_block(storage):
+    for i in range(4):
+        storage.record_service_agreement(
+            f'0x{i}', 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, 100 + i, 'access',
+            ['lockReward', 'accessSecretStore', 'escrowReward']
+        )
+
+    assert sorted(storage.rollback_agreements(102)) == ['0x2', '0x3']
+    assert sorted(storage.iter_agreement_ids()) == ['0x0', '0x1']
+    assert [r.agreement_id for r in storage.iter_agreements()] == ['0x0', '0x1']
+    assert storage.rollback_agreements(200) == []
+
+
+def test_stage_timings_and_latency_report(storage):
+    stages = ['agreementCreated', 'lockReward', 'accessSecretStore']
+    for i in range(100):
+        agreement_id = f'0x{i}'
+        storage.record_stage_transition(agreement_id, 'agreementCreated', 10, 1000, 1000.5)
+        storage.record_stage_transition(agreement_id, 'lockReward', 12, 1010, 1011)
+        # a replayed event keeps the first observation
+        storage.record_stage_transition(agreement_id, 'lockReward', 12, 1010, 1500)
+        storage.record_stage_transaction(agreement_id, 'accessSecretStore', '0xab', 1012,
+                                         1012 + i / 10)
+        storage.record_stage_transition(agreement_id, 'accessSecretStore', 13, 1011 + i, 2000 + i)
+
+    assert storage.get_stage_timings('0x1') == {
+        'agreementCreated': (10, 1000, 1000.5, None, None, None),
+        'lockReward': (12, 1010, 1011, None, None, None),
+        'accessSecretStore': (13, 1012, 2001, '0xab', 1012, 1012.1),
+    }
+
+    report = storage.get_stage_latency_report(stages)
+    assert report['agreementCreated->lockReward'] == {
+        'count': 100, 'p50': 10, 'p95': 10, 'p99': 10}
+    waited = report['lockReward->accessSecretStore']
+    assert waited['count'] == 100
+    assert (waited['p50'], waited['p95'], waited['p99']) == (51, 95, 99)
+    assert report['lockReward.observed']['p50'] == 1
+    assert abs(report['accessSecretStore.tx']['p99'] - 9.8) < 1e-9
+    assert report['lockReward.tx']['count'] == 0
+
+    # only agreements that reached the stage inside the window are used
+    window = storage.get_stage_latency_report(stages, since=2090, until=2095)
+    assert window['lockReward->accessSecretStore']['count'] == 5
+    assert window['agreementCreated->lockReward']['count'] == 0
+
+
+def test_block_timestamps_are_filled_in_later(storage):
+    storage.record_stage_transition('0x1', 'agreementCreated', 10, None, 1000.5)
+    storage.record_stage_transition('0x1', 'lockReward', 12, None, 1011)
+    storage.record_stage_transition('0x2', 'agreementCreated', 12, None, 1011)
+    storage.record_stage_transition('0x3', 'agreementCreated', 13, 1015, 1016)
+    assert sorted(storage.get_blocks_without_timestamp()) == [10, 12]
+
+    storage.set_block_timestamps({10: 1000, 12: 1010})
+    assert storage.get_blocks_without_timestamp() == []
+    assert storage.get_stage_timings('0x1')['lockReward'][:2] == (12, 1010)
+    report = storage.get_stage_latency_report(['agreementCreated', 'lockReward'])
+    assert report['agreementCreated->lockReward']['p50'] == 10
@@ -0,0 +1,69 @@
+from ocean_events_handler.agreement_store.agreement_index import KnownAgreementIndex
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+from ocean_events_handler.agreement_store.compaction import AgreementCompactor
+
+CONDITIONS = ['lockReward', 'accessSecretStore', 'escrowReward']
+
+
+def _agreement_id(i):
+    return '0x' + format(i, '064x')
+
+
+def _storage(tmp_path, num_agreements):
+    path = str(tmp_path / 'agreements.db')
+    db = AgreementsStorage(path)
+    db.create_tables()
+    for i in range(num_agreements):
+        db.record_service_agreement(
+            _agreement_id(i), 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, i, 'access',
+            CONDITIONS
+        )
+    return path, db
+
+
+def _finish(db, i, status=2):
+    for cond in CONDITIONS:
+        db.update_condition_status(_agreement_id(i), cond, status)
+
+
+def test_only_old_finished_agreements_are_archived(tmp_path):
+    path, db = _storage(tmp_path, 10)
+    _finish(db, 1)
+    _finish(db, 2, status=3)
+    _finish(db, 8)
+    # partially fulfilled
+    db.update_condition_status(_agreement_id(3), 'lockReward', 2)
+
+    compactor = AgreementCompactor(path, lambda: 105, min_block_age=100, batch_size=1)
+    assert compactor.run_once() == 2
+
+    assert db.get_agreement_ids() == {_agreement_id(i) for i in (0, 3, 4, 5, 6, 7, 8, 9)}
+    assert db.get_agreement_count() == 8
+    assert db.get_agreement_count(include_archive=True) == 10
+    pending, conditions = db.get_pending_agreements()
+    assert _agreement_id(1) not in pending and _agreement_id(3) in pending
+
+    # archived agreements are still known
+    assert db.has_agreement(_agreement_id(1))
+    assert _agreement_id(2) in KnownAgreementIndex(path)
+    assert _agreement_id(2) in KnownAgreementIndex(path, since_block_number=5, bloom_threshold=1)
+    archived = db._run_query(
+        'SELECT condition_name, status FROM agreement_condition_archive WHERE agreement_id=?',
+        (_agreement_id(2),)).fetchall()
+    assert sorted(archived) == [(cond, 3) for cond in sorted(CONDITIONS)]
+
+
+def test_nothing_is_archived_before_min_block_age(tmp_path):
+    path, db = _storage(tmp_path, 3)
+    _finish(db, 0)
+    assert AgreementCompactor(path, lambda: 50, min_block_age=100).run_once() == 0
+    assert db.get_agreement_count() == 3
+
+
+def test_stop_waits_for_the_running_pass(tmp_path):
+    path, _ = _storage(tmp_path, 1)
+    compactor = AgreementCompactor(path, lambda: 50, interval=0.01)
+    compactor.start()
+    thread = compactor._thread
+    compactor.stop()
+    assert not thread.is_alive()
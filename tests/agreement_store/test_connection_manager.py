@@ -0,0 +1,48 @@
+import threading
+
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage
+from ocean_events_handler.agreement_store.connection_manager import ConnectionManager
+
+
+def test_manager_is_shared_per_database_file(tmp_path):
+    path = str(tmp_path / 'agreements.db')
+    assert ConnectionManager.get(path) is ConnectionManager.get(path)
+    assert AgreementsStorage(path)._connections is AgreementsStorage(path)._connections
+
+    mode = ConnectionManager.get(path).execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_concurrent_writes_and_reads_from_threads(tmp_path):
+    path = str(tmp_path / 'agreements.db')
+    AgreementsStorage(path).create_tables()
+    errors = []
+
+    def record(start):
+        try:
+            db = AgreementsStorage(path)
+            for i in range(start, start + 50):
+                agreement_id = '0x' + format(i, '064x')
+                db.record_service_agreement(
+                    agreement_id, 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0, i, 'access',
+                    ['lockReward']
+                )
+                assert db.has_agreement(agreement_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=record, args=(n * 50,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert AgreementsStorage(path).get_agreement_count() == 200
+
+
+def test_in_memory_database_is_shared():
+    db = AgreementsStorage(':memory:')
+    db.create_tables()
+    db.update_checkpoint('AgreementCreated', 5)
+    assert AgreementsStorage(':memory:').get_checkpoint('AgreementCreated') == 5
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from ocean_events_handler.agreement_store.agreements import AgreementsStorage, DatabaseSchema
+
+NUM_AGREEMENTS = 1000000
+
+
+@pytest.fixture(scope='module')
+def large_db(tmp_path_factory):
+    """Database with a million agreements and their conditions, built with plain sqlite."""
+    path = str(tmp_path_factory.mktemp('schema') / 'agreements.db')
+    AgreementsStorage(path).create_tables()
+    conn = sqlite3.connect(path)
+    conn.executescript(f'''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n LIMIT {NUM_AGREEMENTS})
+        INSERT INTO agreement
+            SELECT printf('0x%064x', i), 'did:op:0x01', 3, '10', '0x', '0xconsumer', 0,
+                   i / 10, 'access', printf('0xprovider%d', i % 3)
+            FROM n;
+        INSERT INTO agreement_condition
+            SELECT agreement_id, 'lockReward', 2 FROM agreement;
+        INSERT INTO agreement_condition
+            SELECT agreement_id, 'escrowReward', CASE WHEN block_number % 50 THEN 2 ELSE 1 END
+            FROM agreement;
+        ANALYZE;
+    ''')
+    conn.close()
+    return path
+
+
+def _hot_queries(db):
+    """Run the store's read methods and return the (query, args) they execute."""
+    queries = []
+    run_query = db._run_query
+
+    def _recording_run_query(query, args=None):
+        queries.append((query, args or ()))
+        return run_query(query, args)
+
+    db._run_query = _recording_run_query
+    since = NUM_AGREEMENTS // 10 - 400
+    db.get_pending_agreements(since)
+    db.get_completed_agreement_ids(since)
+    db.get_agreement_ids(since)
+    db.get_agreements(since)
+    next(db.iter_agreements(since))
+    next(db.iter_pending_agreements(since))
+    next(db.iter_agreements(since, provider='0xprovider1'))
+    next(db.iter_pending_agreements(since, provider='0xprovider1'))
+    db.has_agreement('0x' + format(5, '064x'))
+    db.get_latest_block_number()
+    db.get_checkpoint('AgreementCreated')
+    db.get_stage_latency_report(['agreementCreated', 'lockReward'], since=0, until=100)
+    db.get_blocks_without_timestamp()
+    return queries
+
+
+def test_migrations_set_schema_version(tmp_path):
+    db = AgreementsStorage(str(tmp_path / 'agreements.db'))
+    assert db.get_schema_version() == 0
+    assert db.migrate() == DatabaseSchema.VERSION
+    assert db.migrate() == DatabaseSchema.VERSION
+
+    indexes = {row[0] for row in db._run_query(
+        "SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {'agreement_block_number_idx', 'agreement_condition_status_idx',
+            'agreement_stage_timing_local_time_idx', 'agreement_provider_idx',
+            'agreement_stage_timing_block_timestamp_idx'} <= indexes
+
+
+def test_migrate_upgrades_unversioned_database(tmp_path):
+    path = str(tmp_path / 'agreements.db')
+    conn = sqlite3.connect(path)
+    for create_table_query in DatabaseSchema.SCHEMA.values():
+        conn.execute(create_table_query)
+    conn.execute("INSERT INTO agreement(agreement_id, block_number) VALUES ('0x01', 1)")
+    conn.commit()
+    conn.close()
+
+    db = AgreementsStorage(path)
+    db.create_tables()
+    assert db.get_schema_version() == DatabaseSchema.VERSION
+    assert db.has_agreement('0x01')
+
+
+def test_hot_queries_do_not_scan_tables(large_db):
+    db = AgreementsStorage(large_db)
+    assert db.get_agreement_count() == NUM_AGREEMENTS
+
+    conn = sqlite3.connect(large_db)
+    for query, args in _hot_queries(db):
+        plan = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, args)]
+        assert not [step for step in plan if step.startswith('SCAN')], (query, plan)
+        # streamed queries must not sort the whole result before the first row
+        if 'ORDER BY' in query:
+            assert not [step for step in plan if 'TEMP B-TREE' in step], (query, plan)
+    conn.close()
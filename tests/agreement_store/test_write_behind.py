@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from ocean_events_handler.agreement_store.agreements import (
+    AgreementsStorage, DatabaseSchema, WriteStatements)
+from ocean_events_handler.agreement_store.connection_manager import ConnectionManager
+
+
+def _agreement_id(i):
+    return '0x' + format(i, '064x')
+
+
+def _raw_count(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'agreements.db')
+    yield path
+    ConnectionManager.close_all()
+
+
+def _record(db, i, block_number=None):
+    db.record_service_agreement(
+        _agreement_id(i), 'did:op:0x01', 3, 10, '0x', '0xconsumer', 0,
+        i if block_number is None else block_number, 'access', ['lockReward', 'escrowReward']
+    )
+
+
+def test_writes_are_batched_until_flush(path):
+    db = AgreementsStorage(path, write_behind=True, max_batch_size=1000, flush_interval=60)
+    db.create_tables()
+    for i in range(10):
+        _record(db, i)
+    db.update_condition_status(_agreement_id(3), 'lockReward', 2)
+
+    assert len(db.write_behind) == 31
+    assert _raw_count(path, 'agreement') == 0
+
+    db.flush()
+    assert len(db.write_behind) == 0
+    assert _raw_count(path, 'agreement') == 10
+    assert db.write_behind.num_flushes == 1
+    _, conditions = db.get_pending_agreements()
+    assert conditions[_agreement_id(3)] == {'escrowReward': 1}
+
+
+def test_reads_see_queued_writes(path):
+    db = AgreementsStorage(path, write_behind=True, max_batch_size=1000, flush_interval=60)
+    db.create_tables()
+    _record(db, 1)
+    assert db.has_agreement(_agreement_id(1))
+    # a plain instance on the same file shares the queue
+    assert AgreementsStorage(path).write_behind is db.write_behind
+
+
+def test_full_batch_is_flushed(path):
+    db = AgreementsStorage(path, write_behind=True, max_batch_size=9, flush_interval=60)
+    db.create_tables()
+    for i in range(3):
+        _record(db, i)
+    assert len(db.write_behind) == 0
+    assert _raw_count(path, 'agreement_condition') == 6
+
+
+def test_checkpoint_is_written_with_queued_rows(path):
+    db = AgreementsStorage(path, write_behind=True, max_batch_size=1000, flush_interval=60)
+    db.create_tables()
+    _record(db, 1, block_number=7)
+    db.update_checkpoint('AgreementCreated', 7)
+
+    assert _raw_count(path, 'agreement') == 1
+    assert db.get_checkpoint('AgreementCreated') == 7
+
+
+def test_failed_flush_keeps_rows(path):
+    db = AgreementsStorage(path, write_behind=True, max_batch_size=1000, flush_interval=60)
+    # no tables yet, the flush fails and the rows stay queued
+    db.write_behind.add(WriteStatements.insert_condition, (_agreement_id(1), 'lockReward', 1))
+    with pytest.raises(sqlite3.OperationalError):
+        db.flush()
+    assert len(db.write_behind) == 1
+
+    conn = sqlite3.connect(path)
+    conn.execute(DatabaseSchema.agreement_condition_table)
+    conn.close()
+    db.flush()
+    assert len(db.write_behind) == 0
+    assert _raw_count(path, 'agreement_condition') == 1
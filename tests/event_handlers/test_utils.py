@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ocean_events_handler.event_handlers import utils
+from ocean_events_handler.nonce_manager import NonceManager
+from ocean_events_handler.rpc_batch import ConditionStateReader
+
+ADDRESS = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+
+
+class FakeEth:
+    gasPrice = 100000000000
+
+    def __init__(self, nonce=3):
+        self.pending = nonce
+        self.mined = nonce
+        self.sent = []
+        self.account = SimpleNamespace(signTransaction=self._sign)
+
+    def getTransactionCount(self, address, block_identifier='latest'):
+        return self.pending if block_identifier == 'pending' else self.mined
+
+    @staticmethod
+    def _sign(tx, private_key):
+        return SimpleNamespace(rawTransaction=tx)
+
+    def sendRawTransaction(self, raw_tx):
+        self.sent.append(raw_tx)
+        self.pending += 1
+        return f'0xtx{len(self.sent)}'
+
+
+class FakeCondition:
+    CONTRACT_NAME = 'AccessSecretStoreCondition'
+    FULFILLED_EVENT = 'Fulfilled'
+    address = '0xcondition'
+
+    def __init__(self):
+        fulfill = SimpleNamespace(_encode_transaction_data=lambda: '0xdata',
+                                  estimateGas=lambda tx: 100000)
+        self.contract = SimpleNamespace(
+            functions=SimpleNamespace(fulfill=lambda *args: fulfill),
+            events=SimpleNamespace(Fulfilled=lambda: None)
+        )
+
+
+@pytest.fixture
+def eth(monkeypatch):
+    eth = FakeEth()
+    monkeypatch.setattr(utils, 'Web3Provider',
+                        SimpleNamespace(get_web3=lambda: SimpleNamespace(eth=eth)))
+    monkeypatch.setattr(utils, 'time', SimpleNamespace(time=lambda: 0, sleep=lambda _: None))
+    monkeypatch.setattr(NonceManager, '_managers', {})
+    monkeypatch.setattr(ConditionStateReader, '_instance',
+                        SimpleNamespace(get_condition_state=lambda _: 1))
+    return eth
+
+
+def _fulfill(monkeypatch, *receipts):
+    receipts = list(receipts)
+    monkeypatch.setattr(utils, 'process_tx_receipt',
+                        lambda tx_hash, event, event_name: receipts.pop(0)(tx_hash))
+    account = SimpleNamespace(address=ADDRESS, password=None, key='0xkey')
+    utils.process_fulfill_condition(('0xagreement', '0xdid', account), FakeCondition(),
+                                    '0xcondition_id', None, None, num_tries=5)
+
+
+def test_receipt_timeouts_wait_for_the_same_nonce(monkeypatch, eth):
+    def timed_out(_):
+        return False
+
+    _fulfill(monkeypatch, timed_out, timed_out, lambda tx_hash: tx_hash == '0xtx1')
+    # no second fulfill transaction is sent while the first one may still be mined
+    assert [tx['nonce'] for tx in eth.sent] == [3]
+
+
+def test_a_new_nonce_is_used_once_the_failed_transaction_is_mined(monkeypatch, eth):
+    def reverted(_):
+        eth.mined += 1
+        return False
+
+    _fulfill(monkeypatch, reverted, lambda tx_hash: tx_hash == '0xtx2')
+    assert [tx['nonce'] for tx in eth.sent] == [3, 4]
+    assert eth.sent[0]['to'] == FakeCondition.address
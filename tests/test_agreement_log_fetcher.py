@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+
+from eth_abi import encode_abi, encode_single
+from eth_utils import encode_hex, event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from ocean_events_handler.agreement_log_fetcher import AgreementCreatedLogFetcher
+
+AGREEMENT_CREATED_ABI = {
+    'anonymous': False,
+    'name': 'AgreementCreated',
+    'type': 'event',
+    'inputs': [
+        {'indexed': True, 'name': '_agreementId', 'type': 'bytes32'},
+        {'indexed': False, 'name': '_did', 'type': 'bytes32'},
+        {'indexed': True, 'name': '_accessConsumer', 'type': 'address'},
+        {'indexed': True, 'name': '_accessProvider', 'type': 'address'},
+        {'indexed': False, 'name': '_timeLocks', 'type': 'uint256[]'},
+        {'indexed': False, 'name': '_timeOuts', 'type': 'uint256[]'},
+    ]
+}
+
+PROVIDER = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+CONSUMER = '0x068Ed00cF0441e4829D9784fCBe7b9e26D4BD8d0'
+ACCESS_TEMPLATE = '0x1111111111111111111111111111111111111111'
+COMPUTE_TEMPLATE = '0x2222222222222222222222222222222222222222'
+
+
+def _template(address):
+    event = SimpleNamespace(_get_event_abi=lambda: AGREEMENT_CREATED_ABI)
+    return SimpleNamespace(address=address, events=SimpleNamespace(AgreementCreated=event))
+
+
+def _raw_log(address, agreement_id, block_number):
+    return {
+        'address': address,
+        'topics': [
+            HexBytes(event_abi_to_log_topic(AGREEMENT_CREATED_ABI)),
+            HexBytes(agreement_id),
+            HexBytes(encode_single('address', CONSUMER)),
+            HexBytes(encode_single('address', PROVIDER)),
+        ],
+        'data': encode_hex(encode_abi(['bytes32', 'uint256[]', 'uint256[]'],
+                                      [b'\x01' * 32, [0, 0, 0], [0, 0, 0]])),
+        'blockNumber': block_number,
+        'blockHash': HexBytes(b'\x00' * 32),
+        'transactionHash': HexBytes(b'\x00' * 32),
+        'transactionIndex': 0,
+        'logIndex': 0,
+    }
+
+
+class FakeProvider(BaseProvider):
+    def __init__(self, logs):
+        self.logs = logs
+        self.requests = []
+
+    def isConnected(self):
+        return True
+
+    def make_request(self, method, params):
+        assert method == 'eth_getLogs'
+        self.requests.append(params[0])
+        return {'jsonrpc': '2.0', 'id': 1, 'result': [_json_log(log) for log in self.logs]}
+
+
+def _json_log(log):
+    # nodes return hex strings instead of ints and bytes
+    return dict(
+        log,
+        topics=[topic.hex() for topic in log['topics']],
+        blockNumber=hex(log['blockNumber']), blockHash=log['blockHash'].hex(),
+        transactionHash=log['transactionHash'].hex(),
+        transactionIndex=hex(log['transactionIndex']), logIndex=hex(log['logIndex'])
+    )
+
+
+def test_get_logs_uses_one_request_for_all_templates():
+    provider = FakeProvider([
+        _raw_log(ACCESS_TEMPLATE, b'\xaa' * 32, 10),
+        _raw_log(COMPUTE_TEMPLATE, b'\xbb' * 32, 11),
+        _raw_log('0x3333333333333333333333333333333333333333', b'\xcc' * 32, 12),
+    ])
+    web3 = Web3(provider)
+    methods = []
+
+    def recording_middleware(make_request, web3):
+        def middleware(method, params):
+            methods.append(method)
+            return make_request(method, params)
+        return middleware
+
+    web3.middleware_stack.add(recording_middleware)
+    fetcher = AgreementCreatedLogFetcher(
+        web3, [_template(ACCESS_TEMPLATE), _template(COMPUTE_TEMPLATE)], PROVIDER)
+    logs = fetcher.get_logs(10, 20)
+
+    # the configured middlewares see the request
+    assert methods == ['eth_getLogs']
+    assert len(provider.requests) == 1
+    request = provider.requests[0]
+    assert (request['fromBlock'], request['toBlock']) == ('0xa', '0x14')
+    assert request['address'] == [ACCESS_TEMPLATE, COMPUTE_TEMPLATE]
+    assert request['topics'] == [
+        encode_hex(event_abi_to_log_topic(AGREEMENT_CREATED_ABI)), None, None,
+        encode_hex(encode_single('address', PROVIDER))
+    ]
+    assert [log.address for log in logs] == [ACCESS_TEMPLATE, COMPUTE_TEMPLATE]
+    assert logs[0].args['_agreementId'] == b'\xaa' * 32
+    assert logs[0].args['_accessProvider'].lower() == PROVIDER.lower()
+    assert logs[1].blockNumber == 11
+
+
+def test_decode_log_pushed_by_a_subscription():
+    fetcher = AgreementCreatedLogFetcher(
+        Web3(FakeProvider([])), [_template(ACCESS_TEMPLATE)], PROVIDER)
+    # JSON-RPC notifications carry hex strings instead of ints and bytes
+    event = fetcher.decode_log(_json_log(_raw_log(ACCESS_TEMPLATE, b'\xaa' * 32, 10)))
+    assert event.blockNumber == 10
+    assert event.args['_agreementId'] == b'\xaa' * 32
+    assert fetcher.log_filter == {'address': [ACCESS_TEMPLATE], 'topics': fetcher._topics}
+
+
+def test_get_logs_filters_on_several_providers():
+    other_provider = '0x' + '33' * 20
+    provider = FakeProvider([])
+    fetcher = AgreementCreatedLogFetcher(
+        Web3(provider), [_template(ACCESS_TEMPLATE)], [PROVIDER, other_provider])
+    fetcher.get_logs(10, 20)
+    fetcher.set_provider_addresses([other_provider])
+    fetcher.get_logs(21, 30)
+
+    assert [request['topics'][3] for request in provider.requests] == [
+        [encode_hex(encode_single('address', PROVIDER)),
+         encode_hex(encode_single('address', other_provider))],
+        [encode_hex(encode_single('address', other_provider))],
+    ]
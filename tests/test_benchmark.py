@@ -0,0 +1,51 @@
+#  Copyright 2018 Ocean Protocol Foundation
+#  SPDX-License-Identifier: Apache-2.0
+
+from ocean_keeper.web3_provider import Web3Provider
+
+from benchmarks.run_benchmark import compare_results, run_benchmark
+
+
+def test_benchmark_completes_agreements_against_fake_keeper():
+    web3 = Web3Provider.get_web3()
+    results = run_benchmark(num_agreements=4, agreements_per_block=2, block_time=0.2,
+                            num_assets=2, timeout=60)
+
+    assert not results['timed_out']
+    assert results['agreements'] == {'created': 4, 'completed': 4}
+    assert results['latency']['end_to_end']['count'] == 4
+    assert results['monitor_stage_latency']['escrowReward.observed']['count'] == 4
+    assert results['rpc']['calls_by_method']['eth_sendRawTransaction'] == 8
+    # the DDO of each asset is resolved once and then cached
+    assert results['rpc']['ddo_requests'] == 2
+    assert results['process']['peak_threads'] > 1
+    assert Web3Provider.get_web3() is web3
+
+
+def test_benchmark_serves_several_provider_accounts():
+    results = run_benchmark(num_agreements=4, agreements_per_block=2, block_time=0.2,
+                            num_assets=2, num_accounts=2, timeout=60)
+
+    assert not results['timed_out']
+    assert results['agreements'] == {'created': 4, 'completed': 4}
+    assert results['config']['num_accounts'] == 2
+    assert results['rpc']['calls_by_method']['eth_sendRawTransaction'] == 8
+
+
+def test_compare_results_reports_regressions_beyond_tolerance():
+    baseline = {
+        'throughput': {'events_per_sec': 100, 'agreements_per_sec': 10},
+        'latency': {'end_to_end': {'p95': 10}},
+        'rpc': {'calls_per_agreement': 30},
+    }
+    results = {
+        'throughput': {'events_per_sec': 85, 'agreements_per_sec': 5},
+        'latency': {'end_to_end': {'p95': 14}},
+        'rpc': {'calls_per_agreement': 20},
+    }
+
+    regressions = compare_results(baseline, results, tolerance=0.2)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('throughput.agreements_per_sec: 10 -> 5')
+    assert regressions[1].startswith('latency.end_to_end.p95: 10 -> 14')
+    assert compare_results(baseline, baseline) == []
@@ -0,0 +1,67 @@
+import pytest
+
+from ocean_events_handler.block_range_scanner import BlockRangeScanner
+
+
+def test_scan_covers_range_in_windows():
+    calls = []
+
+    def fetch(_from, _to):
+        calls.append((_from, _to))
+        return []
+
+    scanner = BlockRangeScanner(fetch, min_chunk_size=10, max_chunk_size=100,
+                                initial_chunk_size=10)
+    windows = [(f, t) for f, t, _ in scanner.scan(1, 300)]
+    assert windows == calls
+    assert windows[0] == (1, 10)
+    assert windows[-1][1] == 300
+    for (_, prev_to), (next_from, _) in zip(windows, windows[1:]):
+        assert next_from == prev_to + 1
+    # empty fast responses grow the window up to the max
+    assert scanner.chunk_size == 100
+
+
+def test_scan_shrinks_window_on_many_results():
+    scanner = BlockRangeScanner(lambda f, t: [None] * 50, min_chunk_size=10,
+                                max_chunk_size=1000, initial_chunk_size=400, target_results=20)
+    windows = [(f, t) for f, t, _ in scanner.scan(0, 999)]
+    assert windows[0] == (0, 399)
+    assert windows[1] == (400, 599)
+    assert scanner.chunk_size < 400
+
+
+def test_scan_retries_failed_window_with_smaller_size():
+    failed = []
+
+    def fetch(_from, _to):
+        if _to - _from + 1 > 100:
+            failed.append((_from, _to))
+            raise ValueError('query returned more than 10000 results')
+        return []
+
+    scanner = BlockRangeScanner(fetch, min_chunk_size=10, max_chunk_size=1000,
+                                initial_chunk_size=400)
+    windows = [(f, t) for f, t, _ in scanner.scan(0, 999)]
+    assert failed[0] == (0, 399)
+    assert all(t - f + 1 <= 100 for f, t in windows)
+    assert windows[0][0] == 0
+    assert windows[-1][1] == 999
+    for (_, prev_to), (next_from, _) in zip(windows, windows[1:]):
+        assert next_from == prev_to + 1
+
+
+def test_scan_raises_after_progress_is_yielded():
+    def fetch(_from, _to):
+        if _from >= 20:
+            raise ValueError('node unavailable')
+        return []
+
+    scanner = BlockRangeScanner(fetch, min_chunk_size=10, max_chunk_size=10,
+                                initial_chunk_size=10)
+    processed = []
+    with pytest.raises(ValueError):
+        for _, chunk_to, _ in scanner.scan(0, 100):
+            processed.append(chunk_to)
+
+    assert processed == [9, 19]
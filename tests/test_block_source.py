@@ -0,0 +1,120 @@
+import json
+import os
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ocean_events_handler.block_source import (
+    PollingBlockSource,
+    SubscriptionBlockSource,
+    create_block_source
+)
+
+LOG_FILTER = {'address': ['0x01'], 'topics': ['0xsig']}
+
+
+class FakeIPCNode:
+    """Unix socket server answering `eth_subscribe` and pushing notifications."""
+
+    def __init__(self, path):
+        self.path = path
+        self.requests = []
+        self.conn = None
+        self.connected = threading.Event()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        self.conn, _ = self.server.accept()
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while len(self.requests) < 2:
+            buffer += self.conn.recv(4096).decode()
+            while buffer:
+                try:
+                    request, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break
+                buffer = buffer[end:]
+                self.requests.append(request)
+                kind = request['params'][0]
+                self.send({'jsonrpc': '2.0', 'id': request['id'], 'result': f'0x{kind}'})
+        self.connected.set()
+
+    def send(self, message):
+        # no delimiter between messages, like geth and parity
+        self.conn.sendall(json.dumps(message).encode())
+
+    def notify(self, kind, result):
+        self.send({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                   'params': {'subscription': f'0x{kind}', 'result': result}})
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+        self.server.close()
+
+
+@pytest.fixture
+def node(tmp_path):
+    node = FakeIPCNode(str(tmp_path / 'node.ipc'))
+    yield node
+    node.close()
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_new_heads_wake_up_waiters_and_logs_are_queued(node):
+    web3 = SimpleNamespace(eth=SimpleNamespace(blockNumber=1))
+    source = create_block_source(web3, node.path, log_filter=LOG_FILTER)
+    assert node.connected.wait(5)
+    assert _wait(lambda: source.is_subscribed)
+    assert node.requests[1]['params'] == ['logs', LOG_FILTER]
+
+    def push():
+        time.sleep(0.2)
+        node.notify('newHeads', {'number': hex(42)})
+
+    threading.Thread(target=push).start()
+    start = time.time()
+    source.wait_for_new_block(41, timeout=5)
+    assert time.time() - start < 2
+    assert source.get_block_number() == 42
+
+    node.notify('logs', {'blockNumber': hex(42), 'removed': False, 'logIndex': '0x0'})
+    node.notify('logs', {'blockNumber': hex(42), 'removed': True, 'logIndex': '0x1'})
+    node.notify('newHeads', {'number': hex(43)})
+    assert _wait(lambda: source.latest_block == 43)
+    assert [log['logIndex'] for log in source.pop_logs()] == ['0x0']
+    assert source.pop_logs() == []
+    source.stop()
+
+
+def test_falls_back_to_polling_when_node_is_unavailable(tmp_path):
+    web3 = SimpleNamespace(eth=SimpleNamespace(blockNumber=7))
+    source = SubscriptionBlockSource(web3, str(tmp_path / 'missing.ipc'))
+    time.sleep(0.1)
+    assert not source.is_subscribed
+    assert source.get_block_number() == 7
+
+    start = time.time()
+    source.wait_for_new_block(7, timeout=0.2)
+    assert time.time() - start >= 0.2
+    source.stop()
+
+
+def test_polling_source_without_uri():
+    web3 = SimpleNamespace(eth=SimpleNamespace(blockNumber=3))
+    source = create_block_source(web3, os.getenv('NO_SUCH_ENV_VAR'))
+    assert isinstance(source, PollingBlockSource) and not source.is_subscribed
+    assert source.get_block_number() == 3
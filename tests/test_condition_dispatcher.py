@@ -0,0 +1,162 @@
+from types import SimpleNamespace
+
+from eth_abi import encode_abi, encode_single
+from eth_utils import encode_hex, event_abi_to_log_topic
+from hexbytes import HexBytes
+
+from ocean_events_handler.condition_dispatcher import ConditionEventDispatcher
+
+FULFILLED_ABI = {
+    'anonymous': False,
+    'name': 'Fulfilled',
+    'type': 'event',
+    'inputs': [
+        {'indexed': True, 'name': '_agreementId', 'type': 'bytes32'},
+        {'indexed': True, 'name': '_rewardAddress', 'type': 'address'},
+        {'indexed': False, 'name': '_conditionId', 'type': 'bytes32'},
+        {'indexed': False, 'name': '_amount', 'type': 'uint256'},
+    ]
+}
+CONTRACT_ADDRESS = '0x4444444444444444444444444444444444444444'
+
+
+def _agreement_id(i):
+    return '0x' + format(i, '064x')
+
+
+def _raw_log(agreement_id, block_number):
+    return {
+        'address': CONTRACT_ADDRESS,
+        'topics': [
+            HexBytes(event_abi_to_log_topic(FULFILLED_ABI)),
+            HexBytes(agreement_id),
+            HexBytes(encode_single('address', CONTRACT_ADDRESS)),
+        ],
+        'data': encode_hex(encode_abi(['bytes32', 'uint256'], [b'\x02' * 32, 10])),
+        'blockNumber': block_number,
+        'blockHash': HexBytes(b'\x00' * 32),
+        'transactionHash': HexBytes(b'\x00' * 32),
+        'transactionIndex': 0,
+        'logIndex': 0,
+    }
+
+
+class FakeChain:
+    def __init__(self):
+        self.blockNumber = 100
+        self.logs = []
+        self.requests = []
+
+    def getLogs(self, params):
+        self.requests.append(params)
+        agreement_topics = params['topics'][1] if len(params['topics']) > 1 else None
+        return [
+            log for log in self.logs
+            if params['fromBlock'] <= log['blockNumber'] <= params['toBlock'] and
+            (not agreement_topics or encode_hex(log['topics'][1]) in agreement_topics)
+        ]
+
+
+def _dispatcher(chain):
+    contract = SimpleNamespace(
+        CONTRACT_NAME='LockRewardCondition',
+        FULFILLED_EVENT='Fulfilled',
+        address=CONTRACT_ADDRESS,
+        events=SimpleNamespace(Fulfilled=SimpleNamespace(_get_event_abi=lambda: FULFILLED_ABI))
+    )
+    dispatcher = ConditionEventDispatcher(SimpleNamespace(eth=chain), contract)
+    # drive polling from the test instead of the background thread
+    dispatcher.start = lambda: None
+    return dispatcher
+
+
+def test_routes_events_by_agreement_id_with_one_query_per_poll():
+    chain = FakeChain()
+    dispatcher = _dispatcher(chain)
+    received = []
+    for i in range(20):
+        dispatcher.subscribe(_agreement_id(i), 60, lambda e, i: received.append((i, e)), (i,))
+    dispatcher.poll()
+
+    chain.blockNumber = 105
+    chain.logs = [_raw_log(_agreement_id(3), 101), _raw_log(_agreement_id(7), 104),
+                  _raw_log(_agreement_id(99), 104)]
+    num_requests = len(chain.requests)
+    dispatcher.poll()
+
+    assert len(chain.requests) == num_requests + 1
+    assert sorted(i for i, _ in received) == [3, 7]
+    assert dispatcher.num_subscriptions == 18
+
+
+def test_backfills_subscriptions_starting_in_polled_blocks():
+    chain = FakeChain()
+    dispatcher = _dispatcher(chain)
+    dispatcher.subscribe(_agreement_id(1), 60, lambda *a: None, ())
+    dispatcher.poll()
+
+    chain.logs = [_raw_log(_agreement_id(2), 90)]
+    received = []
+    dispatcher.subscribe(_agreement_id(2), 60, lambda e: received.append(e), (),
+                         from_block=80)
+    dispatcher.poll()
+
+    assert len(received) == 1
+    assert received[0].blockNumber == 90
+
+
+def test_expired_subscription_calls_callback_with_none():
+    chain = FakeChain()
+    dispatcher = _dispatcher(chain)
+    received = []
+    dispatcher.subscribe(_agreement_id(1), -1, lambda e, x: received.append((e, x)), ('x',))
+    dispatcher.poll()
+
+    assert received == [(None, 'x')]
+    assert dispatcher.num_subscriptions == 0
+
+
+def test_pushed_head_replaces_block_number_polls():
+    class CountingChain(FakeChain):
+        block_number_calls = 0
+
+        @property
+        def blockNumber(self):
+            self.block_number_calls += 1
+            return 100
+
+        @blockNumber.setter
+        def blockNumber(self, value):
+            pass
+
+    chain = CountingChain()
+    dispatcher = _dispatcher(chain)
+    received = []
+    dispatcher.subscribe(_agreement_id(1), 60, lambda e: received.append(e), ())
+    dispatcher.set_head(100)
+    dispatcher.poll()
+    num_requests = len(chain.requests)
+    # no new block: nothing is asked from the node
+    dispatcher.set_head(100)
+    dispatcher.poll()
+    assert len(chain.requests) == num_requests
+
+    chain.logs = [_raw_log(_agreement_id(1), 102)]
+    dispatcher.set_head(102)
+    dispatcher.poll()
+
+    assert len(received) == 1
+    assert chain.block_number_calls == 0
+
+
+def test_stop_ends_the_thread_and_drops_subscriptions():
+    chain = FakeChain()
+    dispatcher = _dispatcher(chain)
+    del dispatcher.start
+    dispatcher.set_head(100)
+    dispatcher.subscribe(_agreement_id(1), 60, lambda *a: None, ())
+    thread = dispatcher._thread
+    dispatcher.stop()
+
+    assert not thread.is_alive()
+    assert dispatcher.num_subscriptions == 0
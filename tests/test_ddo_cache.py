@@ -0,0 +1,48 @@
+import time
+
+from ocean_events_handler.ddo_cache import DDOCache
+
+
+class CountingResolver:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, did):
+        self.calls.append(did)
+        return {'did': did, 'version': len(self.calls)}
+
+
+def test_hits_and_misses():
+    resolver = CountingResolver()
+    cache = DDOCache(resolver, max_size=10, ttl=60)
+    for _ in range(5):
+        assert cache.get('did:op:01')['did'] == 'did:op:01'
+
+    assert resolver.calls == ['did:op:01']
+    assert cache.stats() == {'size': 1, 'hits': 4, 'misses': 1}
+
+
+def test_lru_eviction():
+    resolver = CountingResolver()
+    cache = DDOCache(resolver, max_size=2, ttl=60)
+    cache.get('did:op:01')
+    cache.get('did:op:02')
+    cache.get('did:op:01')
+    cache.get('did:op:03')
+
+    assert 'did:op:01' in cache
+    assert 'did:op:02' not in cache
+    assert len(cache) == 2
+
+
+def test_ttl_and_invalidate():
+    resolver = CountingResolver()
+    cache = DDOCache(resolver, max_size=10, ttl=0.05)
+    first = cache.get('did:op:01')
+    time.sleep(0.1)
+    assert cache.get('did:op:01')['version'] == first['version'] + 1
+
+    cache.invalidate('did:op:01')
+    assert 'did:op:01' not in cache
+    cache.get('did:op:01')
+    assert len(resolver.calls) == 3
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from ocean_events_handler.fulfillment_executor import FulfillmentExecutor
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_parse_workers():
+    assert FulfillmentExecutor.parse_workers('lockReward:8, escrowReward:2') == {
+        'lockReward': 8, 'escrowReward': 2}
+    assert FulfillmentExecutor.parse_workers(None) == {}
+
+
+def test_concurrency_is_bounded_per_condition():
+    executor = FulfillmentExecutor({'escrowReward': 2}, default_workers=1)
+    lock = threading.Lock()
+    running = {'now': 0, 'max': 0}
+    release = threading.Event()
+
+    def task():
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        release.wait(5)
+        with lock:
+            running['now'] -= 1
+
+    for _ in range(6):
+        executor.submit('escrowReward', task)
+
+    assert _wait_for(lambda: running['now'] == 2)
+    assert executor.queue_depth('escrowReward') == 6
+    release.set()
+    assert _wait_for(lambda: executor.queue_depth() == 0)
+    assert running['max'] == 2
+    executor.shutdown()
+
+
+def test_delayed_callback_runs_after_delay():
+    executor = FulfillmentExecutor()
+    calls = []
+    callback = executor.callback('escrowReward', lambda event, x: calls.append((event, x)),
+                                 delay=0.2)
+    start = time.time()
+    callback('event', 1)
+    assert executor.queue_depth('escrowReward') == 1
+    assert calls == []
+
+    assert _wait_for(lambda: calls)
+    assert time.time() - start >= 0.2
+    assert calls == [('event', 1)]
+    assert _wait_for(lambda: executor.queue_depth() == 0)
+    executor.shutdown()
+
+
+def test_work_submitted_after_shutdown_runs_on_new_pools():
+    executor = FulfillmentExecutor()
+    calls = []
+    executor.submit('escrowReward', calls.append, 1, delay=0.05)
+    assert _wait_for(lambda: calls == [1])
+    executor.shutdown()
+
+    executor.submit('escrowReward', calls.append, 2)
+    executor.submit('escrowReward', calls.append, 3, delay=0.05)
+    assert _wait_for(lambda: calls == [1, 2, 3])
+    executor.shutdown()
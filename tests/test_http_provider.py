@@ -0,0 +1,110 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+from web3 import Web3
+
+from ocean_events_handler import util
+from ocean_events_handler.http_provider import PooledHTTPProvider
+
+
+class RPCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.client_ports.add(self.client_address[1])
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        requests = request if isinstance(request, list) else [request]
+        responses = [{'jsonrpc': '2.0', 'id': r['id'], 'result': hex(len(r['params']))}
+                     for r in requests]
+        body = json.dumps(responses if isinstance(request, list) else responses[0]).encode()
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+            self.server.num_gzipped += 1
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RPCServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def rpc_server():
+    server = RPCServer(('127.0.0.1', 0), RPCHandler)
+    server.client_ports = set()
+    server.num_gzipped = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_connections_are_reused_across_requests_and_threads(rpc_server):
+    provider = PooledHTTPProvider(_url(rpc_server), pool_size=2)
+    web3 = Web3(provider)
+    results = []
+
+    def call():
+        for _ in range(20):
+            results.append(web3.manager.request_blocking('test_echo', ['0x01', 'latest']))
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ['0x2'] * 80
+    # 80 requests from 4 threads over at most `pool_size` connections
+    assert len(rpc_server.client_ports) <= 2
+    stats = provider.stats.as_dict()
+    assert stats['requests'] == 80 and stats['errors'] == 0
+    # requests waiting for a pooled connection count as in flight
+    assert stats['in_flight'] == 0 and stats['max_in_flight'] <= 4
+    assert stats['latency_p50'] <= stats['latency_p99']
+
+
+def test_batch_request_and_gzip(rpc_server):
+    provider = PooledHTTPProvider(_url(rpc_server), gzip=True)
+    responses = provider.make_batch_request([('eth_call', [1]), ('eth_call', [1, 2, 3])])
+    assert [r['result'] for r in responses] == ['0x1', '0x3']
+    assert rpc_server.num_gzipped == 1
+    assert provider.stats.num_requests == 1
+
+
+def test_failed_requests_are_counted():
+    provider = PooledHTTPProvider('http://127.0.0.1:1', timeout=1)
+    with pytest.raises(Exception):
+        provider.make_request('eth_blockNumber', [])
+    assert provider.stats.num_errors == 1
+    assert provider.stats.in_flight == 0
+
+
+def test_web3_builds_its_provider_once(monkeypatch):
+    providers = []
+
+    def get_web3_provider(keeper_url):
+        providers.append(PooledHTTPProvider(keeper_url))
+        return providers[-1]
+
+    monkeypatch.setattr(util, 'get_web3_provider', get_web3_provider)
+    monkeypatch.setattr(util.Web3Provider, '_web3', None)
+    web3 = util.web3()
+    assert util.web3() is web3
+    assert len(providers) == 1 and web3.providers[0] is providers[0]
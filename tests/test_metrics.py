@@ -0,0 +1,64 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from ocean_events_handler.metrics import MetricsRegistry, start_metrics_server
+
+
+def test_counter_and_gauge_render():
+    registry = MetricsRegistry()
+    counter = registry.counter('events_total', 'Events.', ('kind',))
+    counter.labels('created').inc()
+    counter.labels('created').inc(2)
+    counter.labels('say "hi"').inc()
+    gauge = registry.gauge('queue_depth', 'Queue depth.')
+    gauge.set(5)
+    gauge.dec()
+    registry.gauge('cache_size', 'Cache size.').set_function(lambda: 7)
+
+    text = registry.render()
+    assert '# TYPE events_total counter' in text
+    assert 'events_total{kind="created"} 3.0' in text
+    assert 'events_total{kind="say \\"hi\\""} 1.0' in text
+    assert 'queue_depth 4.0' in text
+    assert 'cache_size 7.0' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    with histogram.time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 3' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 4' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 5' in lines
+    assert 'latency_seconds_count 5' in lines
+
+
+def test_metrics_are_created_once():
+    registry = MetricsRegistry()
+    assert registry.counter('c', 'C.') is registry.counter('c', 'C.')
+    with pytest.raises(ValueError):
+        registry.gauge('c', 'C.')
+    with pytest.raises(ValueError):
+        registry.counter('c', 'C.').labels('x')
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests.').inc()
+    server = start_metrics_server(0, registry=registry)
+    try:
+        response = urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5)
+        assert response.headers['Content-Type'].startswith('text/plain')
+        assert 'requests_total 1.0' in response.read().decode('utf-8')
+
+        with pytest.raises(HTTPError):
+            urlopen(f'http://127.0.0.1:{server.port}/other', timeout=5)
+    finally:
+        server.stop()
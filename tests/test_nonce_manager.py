@@ -0,0 +1,142 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from ocean_keeper.wallet import Wallet
+
+from ocean_events_handler.nonce_manager import NonceManager
+
+ADDRESS = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+
+
+class FakeEth:
+    def __init__(self, pending=5, mined=5):
+        self.pending = pending
+        self.mined = mined
+        self.transactions = {}
+        self.sent = []
+        self.account = SimpleNamespace(signTransaction=self._sign)
+
+    def getTransactionCount(self, address, block_identifier='latest'):
+        return self.pending if block_identifier == 'pending' else self.mined
+
+    def getTransaction(self, tx_hash):
+        return self.transactions.get(tx_hash)
+
+    @staticmethod
+    def _sign(tx, private_key):
+        return SimpleNamespace(rawTransaction=dict(tx, key=private_key))
+
+    def sendRawTransaction(self, raw_tx):
+        self.sent.append(raw_tx)
+        return f'0xreplacement{len(self.sent)}'
+
+
+def _manager(eth, stuck_timeout=60):
+    return NonceManager(SimpleNamespace(eth=eth), ADDRESS, stuck_timeout=stuck_timeout)
+
+
+def test_concurrent_allocations_are_sequential():
+    manager = _manager(FakeEth(pending=7))
+    nonces = []
+
+    def allocate():
+        for _ in range(100):
+            nonces.append(manager.allocate())
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(nonces) == list(range(7, 807))
+
+
+def test_release_fills_the_gap_of_a_failed_send():
+    eth = FakeEth(pending=3)
+    manager = _manager(eth)
+    assert [manager.allocate() for _ in range(3)] == [3, 4, 5]
+    # nonce 5 never reached the node
+    manager.release(5)
+    assert manager.allocate() == 5
+    assert manager.last_allocated == 5
+
+
+def test_release_of_a_middle_nonce_keeps_the_others_allocated():
+    eth = FakeEth(pending=3, mined=3)
+    manager = _manager(eth)
+    assert [manager.allocate() for _ in range(5)] == [3, 4, 5, 6, 7]
+    manager.submitted('0xtx3', 3)
+    manager.submitted('0xtx5', 5)
+    # the node only saw nonces 3 and 5, nonces 6 and 7 are still held by other threads
+    eth.pending = 4
+    manager.release(4)
+
+    assert [manager.allocate() for _ in range(2)] == [4, 8]
+
+
+def test_resync_only_when_nothing_is_outstanding():
+    eth = FakeEth(pending=3, mined=3)
+    manager = _manager(eth)
+    assert [manager.allocate() for _ in range(3)] == [3, 4, 5]
+    manager.submitted('0xtx3', 3)
+    manager.release(5)
+    manager.release(4)
+    # nonce 3 is in flight, allocations continue after it
+    assert manager.allocate() == 4
+
+    manager.release(4)
+    # nonce 3 was mined and a transaction of another process took nonce 4
+    eth.pending = eth.mined = 5
+    manager.resync()
+    assert manager.allocate() == 5
+
+
+def test_resync_never_goes_below_the_transactions_in_flight():
+    eth = FakeEth(pending=3, mined=3)
+    manager = _manager(eth)
+    manager.submitted('0xtx7', 7)
+    assert manager.allocate() == 8
+
+
+def test_transactions_are_sent_with_the_given_nonce():
+    eth = FakeEth(pending=11)
+    eth.gasPrice = 500 * Wallet.MIN_GAS_PRICE
+    manager = _manager(eth)
+    get_nonce = Wallet._get_nonce
+
+    tx_hash = manager.send_transaction({'to': '0xcondition', 'data': '0xdata', 'gas': 100000},
+                                       '0xkey', manager.allocate())
+    assert eth.sent == [{'to': '0xcondition', 'data': '0xdata', 'gas': 100000, 'nonce': 11,
+                         'gasPrice': 5 * Wallet.MIN_GAS_PRICE, 'key': '0xkey'}]
+    assert manager.in_flight[11][0] == tx_hash
+    # the keeper wallet shared with other users of the process is untouched
+    assert Wallet._get_nonce is get_nonce
+
+
+def test_is_mined():
+    manager = _manager(FakeEth(pending=10, mined=8))
+    assert manager.is_mined(7)
+    assert not manager.is_mined(8)
+
+
+def test_stuck_transactions_are_replaced_with_higher_gas_price():
+    eth = FakeEth(pending=10, mined=8)
+    manager = _manager(eth, stuck_timeout=0.01)
+    for nonce in (7, 8, 9):
+        tx_hash = f'0xtx{nonce}'
+        eth.transactions[tx_hash] = {
+            'to': '0xcondition', 'input': '0xdata', 'value': 0, 'gas': 100000,
+            'gasPrice': 1000000000, 'nonce': nonce
+        }
+        manager.submitted(tx_hash, nonce)
+    time.sleep(0.02)
+
+    replaced = manager.replace_stuck_transactions('0xkey')
+    # nonce 7 is already mined
+    assert sorted(replaced) == [8, 9]
+    assert [tx['nonce'] for tx in eth.sent] == [8, 9]
+    assert all(tx['gasPrice'] > 1100000000 and tx['key'] == '0xkey' for tx in eth.sent)
+    assert manager.in_flight[9][0] == replaced[9]
+    assert 7 not in manager.in_flight
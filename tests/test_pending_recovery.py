@@ -0,0 +1,89 @@
+import threading
+from collections import Counter, OrderedDict
+from types import SimpleNamespace
+
+from ocean_utils.agreements.service_agreement import ServiceTypesIndices
+from ocean_utils.agreements.service_types import ServiceTypes
+
+from web3 import Web3
+
+from ocean_events_handler.agreement_store.agreements import AgreementRecord
+from ocean_events_handler.provider_events_monitor import ProviderEventsMonitor
+from ocean_events_handler.template_registry import build_template_registry
+from tests.test_template_registry import _keeper
+
+PROVIDER = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+OTHER_PROVIDER = '0x068Ed00cF0441e4829D9784fCBe7b9e26D4BD8d0'
+
+
+class RecordingMonitor(ProviderEventsMonitor):
+    """Monitor with only the state used by pending agreements recovery."""
+
+    def __init__(self, resolve, workers, accounts=(SimpleNamespace(address=PROVIDER),)):
+        self._ddo_cache = SimpleNamespace(get=resolve)
+        self._template_registry = build_template_registry(_keeper())
+        self._recovery_workers = workers
+        self._web3 = Web3
+        self._account = accounts[0]
+        self._accounts = OrderedDict((a.address, a) for a in accounts)
+        self.processed = []
+        self.accounts = {}
+        self.threads = set()
+
+    def process_condition_events(self, agreement_id, conditions, did, consumer_address,
+                                 block_number, new_agreement=True, template_id=None, ddo=None,
+                                 account=None):
+        assert not new_agreement and ddo == f'ddo-{did}'
+        if agreement_id == '0xbad':
+            raise ValueError('bad agreement')
+        self.threads.add(threading.get_ident())
+        self.processed.append((agreement_id, template_id, sorted(conditions)))
+        self.accounts[agreement_id] = account.address
+
+
+def test_pending_agreements_resolve_each_ddo_once():
+    resolved = Counter()
+    barrier = threading.Barrier(3, timeout=5)
+
+    def resolve(did):
+        resolved[did] += 1
+        # all three DIDs must be resolving at the same time
+        barrier.wait()
+        return f'ddo-{did}'
+
+    pending, conditions = {}, {}
+    for i in range(30):
+        agreement_id = f'0x{i:02x}'
+        index = ServiceTypesIndices.DEFAULT_ACCESS_INDEX if i % 2 else 99
+        pending[agreement_id] = (f'did:op:{i % 3}', index, 10, '0x', 0, '0xconsumer', i)
+        conditions[agreement_id] = {'lockReward': 1, 'escrowReward': 1}
+    pending['0xbad'] = ('did:op:0', 3, 10, '0x', 0, '0xconsumer', 1)
+    conditions['0xbad'] = {'lockReward': 1}
+
+    monitor = RecordingMonitor(resolve, workers=3)
+    monitor.process_pending_agreements(pending, conditions)
+
+    assert resolved == {'did:op:0': 1, 'did:op:1': 1, 'did:op:2': 1}
+    assert len(monitor.processed) == 30
+    assert len(monitor.threads) == 3
+    registry = monitor._template_registry
+    access = registry.get_by_type(ServiceTypes.ASSET_ACCESS).contract.address
+    compute = registry.get_by_type(ServiceTypes.CLOUD_COMPUTE).contract.address
+    assert ('0x01', access, ['escrowReward', 'lockReward']) in monitor.processed
+    assert ('0x02', compute, ['escrowReward', 'lockReward']) in monitor.processed
+
+
+def test_pending_agreements_are_fulfilled_by_their_provider_account():
+    accounts = (SimpleNamespace(address=PROVIDER), SimpleNamespace(address=OTHER_PROVIDER))
+    monitor = RecordingMonitor(lambda did: f'ddo-{did}', workers=1, accounts=accounts)
+    records = [
+        AgreementRecord(agreement_id, 'did:op:0', ServiceTypesIndices.DEFAULT_ACCESS_INDEX,
+                        10, '0x', '0xconsumer', 0, 1, 'access', {'lockReward': 1}, provider)
+        for agreement_id, provider in (('0x01', OTHER_PROVIDER.lower()), ('0x02', None),
+                                       ('0x03', '0x' + '11' * 20))
+    ]
+    monitor._process_pending_records(records)
+
+    # agreements recorded before the provider column belong to the default account, those
+    # of accounts that are not served are skipped
+    assert monitor.accounts == {'0x01': OTHER_PROVIDER, '0x02': PROVIDER}
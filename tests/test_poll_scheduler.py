@@ -0,0 +1,59 @@
+from ocean_events_handler.poll_scheduler import AdaptivePollScheduler
+
+
+def _scheduler(**kwargs):
+    kwargs.setdefault('initial_interval', 3)
+    kwargs.setdefault('min_interval', 0.5)
+    kwargs.setdefault('max_interval', 60)
+    return AdaptivePollScheduler(**kwargs)
+
+
+def test_initial_interval_until_block_times_are_known():
+    scheduler = _scheduler(initial_interval=4)
+    assert scheduler.next_delay(now=0) == 4
+    scheduler.observe(10, now=0)
+    assert scheduler.block_interval is None
+    assert scheduler.next_delay(now=0) == 4
+
+
+def test_sleeps_until_just_after_the_next_expected_block():
+    scheduler = _scheduler(margin=0.1)
+    for i in range(5):
+        scheduler.observe(100 + i, now=15.0 * i)
+    assert scheduler.block_interval == 15
+    # last block seen at t=60, the next one is expected at t=75
+    assert abs(scheduler.next_delay(now=61) - (75 + 1.5 - 61)) < 1e-9
+
+    fast = _scheduler(margin=0.1)
+    for i in range(5):
+        fast.observe(100 + i, now=1.0 * i)
+    assert abs(fast.next_delay(now=4) - 1.1) < 1e-9
+
+
+def test_backs_off_when_blocks_are_late():
+    scheduler = _scheduler(margin=0.1)
+    for i in range(3):
+        scheduler.observe(100 + i, now=10.0 * i)
+
+    delays = []
+    now = 40
+    for _ in range(5):
+        scheduler.observe(102, now=now)
+        delays.append(scheduler.next_delay(now=now))
+        now += delays[-1]
+    assert scheduler.empty_polls == 5
+    assert delays == sorted(delays) and delays[0] < delays[-1]
+    assert delays[-1] == 32
+
+
+def test_polls_sooner_after_a_backlog_and_clamps():
+    scheduler = _scheduler(margin=0.1, max_interval=8)
+    scheduler.observe(100, now=0)
+    scheduler.observe(101, now=20)
+    assert scheduler.next_delay(now=20) == 8
+
+    # several blocks appeared since the last poll
+    scheduler.observe(105, now=25)
+    assert scheduler.next_delay(now=25) == 0.5
+    scheduler.observe(105, now=25.5)
+    assert scheduler.next_delay(now=25.5) > 0.5
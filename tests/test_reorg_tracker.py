@@ -0,0 +1,70 @@
+from ocean_events_handler.reorg_tracker import ReorgTracker
+
+
+class FakeChain:
+    def __init__(self, length):
+        self.blocks = {n: f'0x{n:064x}' for n in range(length)}
+
+    def reorg(self, from_block):
+        for n in self.blocks:
+            if n >= from_block:
+                self.blocks[n] = f'0x{n + 10 ** 6:064x}'
+
+    def getBlock(self, block_number):
+        return {'number': block_number, 'hash': self.blocks[block_number]}
+
+
+class FakeWeb3:
+    def __init__(self, chain):
+        self.eth = chain
+
+
+def _log(chain, block_number, tx, log_index=0):
+    return {'blockNumber': block_number, 'blockHash': chain.blocks[block_number],
+            'transactionHash': f'0x{tx:064x}', 'logIndex': log_index}
+
+
+def test_safe_block_honours_confirmations():
+    assert ReorgTracker(FakeWeb3(FakeChain(1)), confirmations=6).safe_block(100) == 94
+    assert ReorgTracker(FakeWeb3(FakeChain(1)), confirmations=6).safe_block(3) == 0
+    assert ReorgTracker(FakeWeb3(FakeChain(1))).safe_block(100) == 100
+
+
+def test_replayed_logs_are_skipped():
+    chain = FakeChain(10)
+    tracker = ReorgTracker(FakeWeb3(chain), max_logs=2)
+    assert tracker.is_new_log(_log(chain, 1, 1))
+    assert tracker.is_new_log(_log(chain, 1, 1, log_index=1))
+    assert not tracker.is_new_log(_log(chain, 1, 1))
+
+    # the oldest key is evicted once the cache is full
+    assert tracker.is_new_log(_log(chain, 2, 2))
+    assert tracker.is_new_log(_log(chain, 1, 1))
+
+
+def test_find_fork_block_and_rollback():
+    chain = FakeChain(20)
+    tracker = ReorgTracker(FakeWeb3(chain), max_blocks=5)
+    for n in range(10, 20):
+        tracker.record_block(n, chain.blocks[n])
+        tracker.is_new_log(_log(chain, n, n))
+    assert tracker.find_fork_block() is None
+
+    chain.reorg(17)
+    assert tracker.find_fork_block() == 17
+
+    tracker.rollback(17)
+    assert tracker.find_fork_block() is None
+    # logs of the replaced blocks are processed again, older ones are still skipped
+    assert tracker.is_new_log(_log(chain, 18, 18))
+    assert not tracker.is_new_log(_log(chain, 16, 16))
+
+
+def test_fork_older_than_the_window_rolls_back_all_recorded_blocks():
+    chain = FakeChain(20)
+    tracker = ReorgTracker(FakeWeb3(chain), max_blocks=3)
+    for n in range(10, 20):
+        tracker.record_block(n, chain.blocks[n])
+
+    chain.reorg(5)
+    assert tracker.find_fork_block() == 17
@@ -0,0 +1,148 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from ocean_events_handler.rpc_batch import ConditionStateReader, RPCBatcher
+
+CONDITION_STORE = '0x0000000000000000000000000000000000000C0d'
+
+
+class BatchingProvider:
+    def __init__(self, states):
+        self.states = states
+        self.batches = []
+
+    def make_batch_request(self, requests):
+        self.batches.append(requests)
+        responses = []
+        for method, params in requests:
+            condition_id = params[0]['data'][len('getConditionState:'):]
+            if condition_id not in self.states:
+                responses.append({'error': {'code': -32000, 'message': 'reverted'}})
+            else:
+                responses.append({'result': '0x' + format(self.states[condition_id], '064x')})
+        return responses
+
+
+def _condition_manager(states=None):
+    def get_condition_state(condition_id):
+        return SimpleNamespace(
+            _encode_transaction_data=lambda: f'getConditionState:{condition_id}')
+
+    return SimpleNamespace(
+        address=CONDITION_STORE,
+        contract=SimpleNamespace(
+            functions=SimpleNamespace(getConditionState=get_condition_state)),
+        # direct eth_call of the keeper contract
+        get_condition_state=lambda condition_id: (states or {})[condition_id]
+    )
+
+
+def _reader(states, tick=0.1):
+    provider = BatchingProvider(states)
+    batcher = RPCBatcher(SimpleNamespace(providers=[provider]), tick=tick)
+    return ConditionStateReader(_condition_manager(), batcher), provider
+
+
+def test_condition_states_of_one_call_share_a_batch():
+    reader, provider = _reader({'0x01': 2, '0x02': 1, '0x03': 3})
+    assert reader.get_condition_states(['0x01', '0x02', '0x03']) == [2, 1, 3]
+    assert len(provider.batches) == 1
+    assert provider.batches[0][0] == (
+        'eth_call', [{'to': CONDITION_STORE, 'data': 'getConditionState:0x01'}, 'latest'])
+
+
+def test_concurrent_readers_are_fanned_out_from_few_batches():
+    states = {f'0x{i:02x}': i % 4 for i in range(40)}
+    reader, provider = _reader(states, tick=0.2)
+    results = {}
+    barrier = threading.Barrier(40)
+
+    def read(condition_id):
+        barrier.wait()
+        results[condition_id] = reader.get_condition_state(condition_id)
+
+    threads = [threading.Thread(target=read, args=(_id,)) for _id in states]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == states
+    assert len(provider.batches) <= 2
+    assert reader.batcher.num_requests == 40
+
+
+def test_errors_are_raised_to_the_caller_only():
+    reader, provider = _reader({'0x01': 2})
+    good = reader.get_condition_state_async('0x01')
+    bad = reader.get_condition_state_async('0x02')
+    assert good.result() == 2
+    with pytest.raises(ValueError):
+        bad.result()
+    assert len(provider.batches) == 1
+
+
+def test_batch_size_is_bounded():
+    states = {f'0x{i:02x}': 1 for i in range(25)}
+    provider = BatchingProvider(states)
+    batcher = RPCBatcher(SimpleNamespace(providers=[provider]), max_batch_size=10, tick=0.1)
+    reader = ConditionStateReader(_condition_manager(), batcher)
+    assert reader.get_condition_states(list(states)) == [1] * 25
+    assert [len(batch) for batch in provider.batches] == [10, 10, 5]
+
+
+class BrokenProvider(BatchingProvider):
+    def __init__(self, states):
+        super().__init__(states)
+        self.broken = True
+
+    def make_batch_request(self, requests):
+        responses = super().make_batch_request(requests)
+        if self.broken:
+            self.broken = False
+            # malformed responses fail while the futures are resolved
+            return [None] * len(responses)
+        return responses
+
+
+def test_batcher_survives_errors_while_resolving_a_batch():
+    provider = BrokenProvider({'0x01': 2})
+    batcher = RPCBatcher(SimpleNamespace(providers=[provider]), tick=0.05)
+    reader = ConditionStateReader(_condition_manager(), batcher, timeout=5)
+
+    with pytest.raises(TypeError):
+        reader.get_condition_state_async('0x01').result(5)
+    # the sender thread keeps serving the next batches
+    assert reader.get_condition_state('0x01') == 2
+    assert len(provider.batches) == 2
+
+
+def test_missing_responses_fail_their_futures():
+    provider = BatchingProvider({'0x01': 2})
+    provider.make_batch_request = lambda requests: []
+    batcher = RPCBatcher(SimpleNamespace(providers=[provider]), tick=0.05)
+
+    with pytest.raises(ValueError):
+        batcher.submit('eth_call', []).result(5)
+
+
+def test_timed_out_reads_fall_back_to_a_direct_call():
+    release = threading.Event()
+    provider = BatchingProvider({'0x01': 1})
+    make_batch_request = provider.make_batch_request
+
+    def stalled_batch_request(requests):
+        release.wait(5)
+        return make_batch_request(requests)
+
+    provider.make_batch_request = stalled_batch_request
+    batcher = RPCBatcher(SimpleNamespace(providers=[provider]), tick=0.05)
+    reader = ConditionStateReader(_condition_manager({'0x01': 2, '0x02': 3}), batcher,
+                                  timeout=0.2)
+    try:
+        assert reader.get_condition_state('0x01') == 2
+        assert reader.get_condition_states(['0x01', '0x02']) == [2, 3]
+    finally:
+        release.set()
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from ocean_keeper.utils import generate_multi_value_hash
+from ocean_utils.agreements.service_types import ServiceTypes
+
+from ocean_events_handler.event_handlers import event_handlers_map
+from ocean_events_handler.template_registry import build_template_registry
+
+
+def _contract(name, address):
+    return SimpleNamespace(CONTRACT_NAME=name, address=address)
+
+
+def _keeper():
+    return SimpleNamespace(
+        escrow_access_secretstore_template=_contract(
+            'EscrowAccessSecretStoreTemplate', '0x1111111111111111111111111111111111111111'),
+        escrow_compute_execution_template=_contract(
+            'EscrowComputeExecutionTemplate', '0x2222222222222222222222222222222222222222'),
+        lock_reward_condition=_contract('LockRewardCondition', '0x03'),
+        access_secret_store_condition=_contract('AccessSecretStoreCondition', '0x04'),
+        compute_execution_condition=_contract('ComputeExecutionCondition', '0x05'),
+        escrow_reward_condition=_contract('EscrowReward', '0x06'),
+    )
+
+
+def test_lookup_by_address_and_template_id_hash():
+    keeper = _keeper()
+    registry = build_template_registry(keeper)
+
+    compute = registry.get(keeper.escrow_compute_execution_template.address)
+    assert compute.agreement_type == ServiceTypes.CLOUD_COMPUTE
+    assert compute.conditions_order == ['execCompute', 'lockReward', 'escrowReward']
+    assert compute.unfulfilled_conditions == ['lockReward', 'execCompute', 'escrowReward']
+    assert registry.get(generate_multi_value_hash(
+        ['string'], ['EscrowComputeExecutionTemplate'])) is compute
+
+    access = registry.get(keeper.escrow_access_secretstore_template.address)
+    assert access.agreement_type == ServiceTypes.ASSET_ACCESS
+    assert access.handlers == event_handlers_map[ServiceTypes.ASSET_ACCESS]
+    assert access.handlers['lockReward'].fulfills == 'accessSecretStore'
+
+
+def test_unknown_template_defaults_to_access():
+    registry = build_template_registry(_keeper())
+    assert registry.get('0xunknown').agreement_type == ServiceTypes.ASSET_ACCESS
+    assert set(registry.condition_contracts) == {
+        'lockReward', 'accessSecretStore', 'execCompute', 'escrowReward'}
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+
+from ocean_events_handler.traffic_recorder import (
+    RecordingProvider,
+    ReplayProvider,
+    TrafficLog,
+    read_traffic
+)
+
+TEMPLATE = '0x1111111111111111111111111111111111111111'
+CONDITION = '0x2222222222222222222222222222222222222222'
+TOPIC = '0x' + 'aa' * 32
+PROVIDER_TOPIC = '0x' + '00' * 12 + 'bb' * 20
+
+
+def _log(address, block_number, log_index, topics=(TOPIC,)):
+    return {
+        'address': address, 'topics': list(topics), 'data': '0x',
+        'blockNumber': hex(block_number), 'blockHash': '0x' + '%064x' % block_number,
+        'transactionHash': '0x' + '%062x%02x' % (block_number, log_index),
+        'transactionIndex': '0x0', 'logIndex': hex(log_index), 'removed': False,
+    }
+
+
+class FakeNodeProvider:
+    def __init__(self):
+        self.head = 10
+        self.logs = [
+            _log(TEMPLATE, 5, 0, (TOPIC, PROVIDER_TOPIC)),
+            _log(CONDITION, 6, 0),
+            _log(TEMPLATE, 8, 1, (TOPIC, '0x' + '00' * 32)),
+        ]
+
+    def make_request(self, method, params):
+        if method == 'eth_blockNumber':
+            self.head += 1
+            return {'jsonrpc': '2.0', 'id': 1, 'result': hex(self.head)}
+        if method == 'eth_getLogs':
+            return {'jsonrpc': '2.0', 'id': 1, 'result': self.logs}
+        if method == 'eth_getBlockByNumber':
+            return {'jsonrpc': '2.0', 'id': 1,
+                    'result': {'number': params[0], 'hash': '0x' + 'cc' * 32}}
+        return {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'reverted'}}
+
+    def make_batch_request(self, requests):
+        return [self.make_request(method, params) for method, params in requests]
+
+
+class FakeDDO:
+    def __init__(self, text):
+        self.text = text
+
+    def as_text(self):
+        return self.text
+
+
+def _record(path):
+    traffic_log = TrafficLog(path)
+    provider = RecordingProvider(FakeNodeProvider(), traffic_log)
+    provider.make_request('eth_blockNumber', [])
+    provider.make_request('eth_blockNumber', [])
+    provider.make_request('eth_getLogs', [{'fromBlock': '0x0', 'toBlock': '0xa'}])
+    provider.make_batch_request([('eth_getBlockByNumber', ['0x6', False]),
+                                 ('eth_call', [{'to': CONDITION, 'data': '0x'}, 'latest'])])
+    resolve = provider.wrap_ddo_resolver(lambda did: FakeDDO('{"id": "%s"}' % did))
+    assert resolve('did:op:01').text == '{"id": "did:op:01"}'
+    traffic_log.close()
+    return traffic_log
+
+
+@pytest.mark.parametrize('file_name', ['traffic.jsonl', 'traffic.jsonl.gz'])
+def test_record_responses_and_ddos(tmpdir, file_name):
+    path = str(tmpdir.join(file_name))
+    assert _record(path).num_entries == 6
+
+    entries = list(read_traffic(path))
+    assert [entry.get('m') for entry in entries] == [
+        'eth_blockNumber', 'eth_blockNumber', 'eth_getLogs', 'eth_getBlockByNumber',
+        'eth_call', None]
+    assert entries[1]['r'] == '0xc'
+    assert entries[4]['e']['message'] == 'reverted'
+    assert entries[5]['ddo'] == 'did:op:01'
+
+    # recording again appends to the file
+    _record(path)
+    assert len(list(read_traffic(path))) == 12
+
+
+def test_replay_responses_in_recorded_order(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    _record(path)
+    provider = ReplayProvider(path)
+
+    assert provider.make_request('eth_blockNumber', [])['result'] == '0xb'
+    assert provider.make_request('eth_blockNumber', [])['result'] == '0xc'
+    # the chain head stays at the last recorded value
+    assert provider.make_request('eth_blockNumber', [])['result'] == '0xc'
+    assert provider.make_request(
+        'eth_call', [{'to': CONDITION, 'data': '0x'}, 'latest'])['error']['message'] == 'reverted'
+    assert provider.make_batch_request(
+        [('eth_getBlockByNumber', ['0x6', False])])[0]['result']['hash'] == '0x' + 'cc' * 32
+
+    response = provider.make_request('eth_gasPrice', [])
+    assert 'no recorded response' in response['error']['message']
+    assert provider.num_misses == 1
+
+
+def test_replay_filters_recorded_logs_for_any_range(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    _record(path)
+    provider = ReplayProvider(path)
+
+    def get_logs(**log_filter):
+        logs = provider.make_request('eth_getLogs', [log_filter])['result']
+        return [(int(log['blockNumber'], 16), log['address']) for log in logs]
+
+    assert get_logs(fromBlock='0x0', toBlock='0xa') == \
+        [(5, TEMPLATE), (6, CONDITION), (8, TEMPLATE)]
+    assert get_logs(fromBlock='0x6', toBlock='0x7') == [(6, CONDITION)]
+    assert get_logs(fromBlock='0x0', toBlock='0xa', address=['0x' + TEMPLATE[2:].upper()]) \
+        == [(5, TEMPLATE), (8, TEMPLATE)]
+    assert get_logs(fromBlock='0x0', toBlock='0xa', address=TEMPLATE,
+                    topics=[TOPIC, [PROVIDER_TOPIC]]) == [(5, TEMPLATE)]
+    assert get_logs(fromBlock='0x0', toBlock='0xa', topics=[None, '0x' + '00' * 32]) \
+        == [(8, TEMPLATE)]
+
+
+def test_replay_ddos(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    _record(path)
+    resolve = ReplayProvider(path).wrap_ddo_resolver(None)
+
+    assert resolve('did:op:01').did == 'did:op:01'
+    with pytest.raises(ValueError):
+        resolve('did:op:02')
+
+
+def test_replay_at_recorded_speed(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    traffic_log = TrafficLog(path)
+    traffic_log.record_response('eth_blockNumber', [], {'result': '0x1'})
+    time.sleep(0.3)
+    traffic_log.record_response('eth_blockNumber', [], {'result': '0x2'})
+    traffic_log.close()
+
+    start = time.time()
+    fast = ReplayProvider(path)
+    assert [fast.make_request('eth_blockNumber', [])['result'] for _ in range(2)] == \
+        ['0x1', '0x2']
+    assert time.time() - start < 0.2
+
+    start = time.time()
+    recorded_speed = ReplayProvider(path, speed=1)
+    assert [recorded_speed.make_request('eth_blockNumber', [])['result']
+            for _ in range(2)] == ['0x1', '0x2']
+    assert time.time() - start >= 0.25
+
+
+def test_replay_skips_truncated_last_entry(tmpdir):
+    path = str(tmpdir.join('traffic.jsonl'))
+    _record(path)
+    with open(path, 'a') as f:
+        f.write('{"t": 1, "m": "eth_block')
+
+    assert len(list(read_traffic(path))) == 6
@@ -0,0 +1,24 @@
+import os
+
+from ocean_events_handler.util import get_provider_accounts, init_account_envvars
+
+PROVIDER = '0x00Bd138aBD70e2F00903268F3Db08f2D25677C9e'
+OTHER_PROVIDER = '0x068Ed00cF0441e4829D9784fCBe7b9e26D4BD8d0'
+CONSUMER = '0x' + '33' * 20
+
+
+def test_only_mapped_provider_accounts_are_served(monkeypatch):
+    environ = {name: value for name, value in os.environ.items()
+               if not name.startswith(('PROVIDER_', 'PARITY_'))}
+    environ.update({
+        'PROVIDER_ADDRESS': PROVIDER, 'PROVIDER_KEY': '0x01',
+        'PROVIDER_ADDRESS1': OTHER_PROVIDER, 'PROVIDER_KEY1': '0x02',
+        # accounts of the keeper test setup are not provider accounts
+        'PARITY_ADDRESS2': CONSUMER, 'PARITY_PASSWORD2': 'secret',
+    })
+    monkeypatch.setattr(os, 'environ', environ)
+
+    init_account_envvars()
+    assert [account.address for account in get_provider_accounts()] == \
+        [PROVIDER, OTHER_PROVIDER]
+    assert environ['PARITY_KEY1'] == '0x02'